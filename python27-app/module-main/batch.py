@@ -0,0 +1,82 @@
+"""
+Batch endpoint which handles several sub-requests in a single round trip.
+
+Request body:
+  {"concurrent": false,
+   "requests": [{"method": "POST", "path": "/python/memcache",
+                 "headers": {"Content-Type": "..."}, "body": "key=a&value=b"},
+                ...]}
+Binary body can be passed as "body_base64" instead of "body".
+
+Response body:
+  {"responses": [{"status": 200, "headers": {...}, "body": "..."}, ...]}
+"""
+import base64
+import json
+import threading
+
+import webapp2
+
+from rpc_timing import RpcTimingMiddleware
+
+MAX_BATCH_SIZE = 100
+
+
+def encode_body(body):
+  try:
+    return {'body': body.decode('utf-8')}
+  except UnicodeDecodeError:
+    return {'body_base64': base64.b64encode(body)}
+
+
+class BatchHandler(webapp2.RequestHandler):
+  def post(self):
+    payload = json.loads(self.request.body)
+    sub_requests = payload.get('requests') or []
+    if len(sub_requests) > MAX_BATCH_SIZE:
+      self.response.set_status(400)
+      self.response.out.write(
+        'Batch is limited to %d requests' % MAX_BATCH_SIZE)
+      return
+
+    responses = [None] * len(sub_requests)
+    def dispatch(index):
+      responses[index] = self.dispatch_sub_request(sub_requests[index])
+
+    if payload.get('concurrent'):
+      threads = [threading.Thread(target=dispatch, args=(index,))
+                 for index in range(len(sub_requests))]
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+    else:
+      for index in range(len(sub_requests)):
+        dispatch(index)
+
+    # Sub-requests replace webapp2 globals of current thread
+    self.app.set_globals(app=self.app, request=self.request)
+    self.response.headers['Content-Type'] = 'application/json'
+    self.response.out.write(json.dumps({'responses': responses}))
+
+  def dispatch_sub_request(self, sub_request):
+    """ Handles sub-request by routes of this app (in-process). """
+    headers = dict(sub_request.get('headers') or {})
+    headers.pop('Content-Length', None)
+    request = webapp2.Request.blank(
+      sub_request['path'], base_url=self.request.host_url, headers=headers)
+    request.method = str(sub_request.get('method', 'GET')).upper()
+    if 'body_base64' in sub_request:
+      request.body = base64.b64decode(sub_request['body_base64'])
+    elif sub_request.get('body') is not None:
+      request.body = sub_request['body'].encode('utf-8')
+    # Every sub-response reports its own RPC timing
+    response = request.get_response(RpcTimingMiddleware(self.app))
+    result = {'status': response.status_int, 'headers': dict(response.headers)}
+    result.update(encode_body(response.body))
+    return result
+
+
+urls = [
+  ('/python/_batch', BatchHandler),
+]
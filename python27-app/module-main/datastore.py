@@ -1,4 +1,5 @@
 import base64
+import collections
 import datetime
 import json
 import logging
@@ -20,21 +21,48 @@ import utils
 
 SDK_CONSISTENCY_WAIT = .5
 
+# Max number of entities created by a single seed request
+MAX_SEED_COUNT = 10000
 
-def remove_db_entities(query):
-  """ Remove all DB entities that match a given query.
+# Max number of entities per put or delete RPC and number of RPCs in flight
+PUT_BATCH_SIZE = 500
+PUT_RPCS_IN_FLIGHT = 4
+PURGE_BATCH_SIZE = 500
+DELETE_RPCS_IN_FLIGHT = 4
+
+
+def purge_entities(kind, namespace=None, ancestor=None):
+  """ Deletes all entities of a kind.
+
+  Only keys are fetched (with cursor across batches) and batches are
+  deleted concurrently with fetching of the next ones.
 
   Args:
-    query: A DB query object.
+    kind: A string - kind of entities to delete.
+    namespace: A string - namespace of entities or None for default one.
+    ancestor: A datastore.Key - delete only descendants of this key.
+  Returns:
+    An integer - number of deleted entities.
   """
-  batch_size = 200
+  query = datastore.Query(kind, keys_only=True, namespace=namespace)
+  if ancestor is not None:
+    query.Ancestor(ancestor)
+  deleted = 0
+  pending = collections.deque()
+  cursor = None
   while True:
-    entity_batch = query.fetch(batch_size)
-    entities_fetched = len(entity_batch)
-    db.delete(entity_batch)
-    time.sleep(SDK_CONSISTENCY_WAIT)
-    if entities_fetched < batch_size:
+    keys = query.Get(PURGE_BATCH_SIZE, start_cursor=cursor)
+    if keys:
+      if len(pending) >= DELETE_RPCS_IN_FLIGHT:
+        pending.popleft().get_result()
+      pending.append(datastore.DeleteAsync(keys))
+      deleted += len(keys)
+    if len(keys) < PURGE_BATCH_SIZE:
       break
+    cursor = query.GetCursor()
+  while pending:
+    pending.popleft().get_result()
+  return deleted
 
 
 class Project(db.Model):
@@ -217,8 +245,8 @@ class CompositeMultipleFiltersOnPropertyHandler(webapp2.RedirectHandler):
 
 class IndexVersatility(unittest.TestCase):
   def tearDown(self):
-    remove_db_entities(Counter.all())
-    remove_db_entities(CompositeCars.all())
+    purge_entities(Counter.kind())
+    purge_entities(CompositeCars.kind())
 
     keys = NDBCompositeCar.query().fetch(keys_only=True)
     ndb.delete_multi(keys)
@@ -304,7 +332,8 @@ class IndexVersatilityHandler(webapp2.RedirectHandler):
 
 class ZigZagQuery(unittest.TestCase):
   def tearDown(self):
-    remove_db_entities(Cars.all())
+    purge_entities(Cars.kind())
+    time.sleep(SDK_CONSISTENCY_WAIT)
 
   def test_zigzag_query(self):
     non_set_cars = []
@@ -408,7 +437,7 @@ class ProjectHandler(webapp2.RequestHandler):
       json.dumps({ 'success' : True, 'project_id' : project_id }))
 
   def delete(self):
-    db.delete(Project.all())
+    purge_entities(Project.kind())
 
 
 class ModuleHandler(webapp2.RequestHandler):
@@ -444,7 +473,7 @@ class ModuleHandler(webapp2.RequestHandler):
       json.dumps({ 'success' : True, 'module_id' : module_id }))
 
   def delete(self):
-    db.delete(Module.all())
+    purge_entities(Module.kind())
 
 
 class ProjectModuleHandler(webapp2.RequestHandler):
@@ -664,7 +693,7 @@ class TransactionHandler(webapp2.RequestHandler):
     self.response.out.write(json.dumps(status))
 
   def delete(self):
-    db.delete(Counter.all())
+    purge_entities(Counter.kind())
 
 
 """
@@ -731,9 +760,9 @@ class ComplexCursorHandler(webapp2.RequestHandler):
     pn4.put()
 
   def clean_up_data(self):
-    db.delete(Company.all())
-    db.delete(Employee.all())
-    db.delete(PhoneNumber.all())
+    purge_entities(Company.kind())
+    purge_entities(Employee.kind())
+    purge_entities(PhoneNumber.kind())
 
 
 class CountQueryHandler(webapp2.RequestHandler):
@@ -758,7 +787,7 @@ class CountQueryHandler(webapp2.RequestHandler):
       self.response.out.write(json.dumps(status))
       raise
     finally:
-      db.delete(Employee.all())
+      purge_entities(Employee.kind())
 
 
 class Employee(db.Model):
@@ -1252,10 +1281,11 @@ class TestCursorQueries(unittest.TestCase):
     keys = NDBCompositeCar.query().fetch(keys_only=True)
     ndb.delete_multi(keys)
 
-    remove_db_entities(Module.all().ancestor(self.parent))
-    remove_db_entities(Module.all())
+    purge_entities(Module.kind(), ancestor=self.parent.key())
+    purge_entities(Module.kind())
     self.parent.delete()
-    remove_db_entities(CompositeCars.all())
+    purge_entities(CompositeCars.kind())
+    time.sleep(SDK_CONSISTENCY_WAIT)
 
   def fetch_with_db_cursor(self, query, page_size):
     """ Use a cursor to fetch DB entities.
@@ -2118,6 +2148,164 @@ class QueryInTransaction(webapp2.RequestHandler):
     datastore.Put(entity)
 
 
+class PurgeHandler(webapp2.RequestHandler):
+  """ Deletes all entities of kind (see purge_entities). """
+  def delete(self):
+    kind = self.request.get('kind')
+    if not kind:
+      self.response.set_status(400)
+      self.response.write('kind is required')
+      return
+    namespace = self.request.get('namespace') or None
+    deleted = purge_entities(kind, namespace)
+    self.response.headers['Content-Type'] = 'application/json'
+    json.dump({'deleted': deleted}, self.response)
+
+
+def put_pipelined(entities):
+  """ Puts entities in batches keeping several put RPCs in flight.
+
+  Args:
+    entities: A list of datastore.Entity objects.
+  Returns:
+    A list of keys in order of entities.
+  """
+  keys = []
+  pending = collections.deque()
+  for start in range(0, len(entities), PUT_BATCH_SIZE):
+    if len(pending) >= PUT_RPCS_IN_FLIGHT:
+      keys.extend(pending.popleft().get_result())
+    pending.append(datastore.PutAsync(entities[start:start + PUT_BATCH_SIZE]))
+  while pending:
+    keys.extend(pending.popleft().get_result())
+  return keys
+
+
+def make_property_generator(spec):
+  """ Builds function which generates property value for entity index.
+
+  Args:
+    spec: A dict with a single generator: {"randint": [1, 10]},
+      {"choice": [...]}, {"sequence": START}, {"text": LENGTH}
+      or {"uuid": true}. Any other value is used as is.
+  Returns:
+    A function accepting entity index.
+  Raises:
+    ValueError: if generator is unknown.
+  """
+  if not isinstance(spec, dict):
+    return lambda index: spec
+  if len(spec) != 1:
+    raise ValueError('Generator should have exactly one key: {}'.format(spec))
+  name, arg = spec.items()[0]
+  if name == 'randint':
+    return lambda index: random.randint(*arg)
+  if name == 'choice':
+    return lambda index: random.choice(arg)
+  if name == 'sequence':
+    return lambda index: arg + index
+  if name == 'text':
+    return lambda index: ''.join(random.choice(string.letters)
+                                 for _ in range(arg))
+  if name == 'uuid':
+    return lambda index: str(uuid.uuid4())
+  raise ValueError('Unknown generator: {}'.format(name))
+
+
+def seed_key_names(names, count):
+  """ Builds key names of seeded entities.
+
+  Args:
+    names: A list of names, a template with '{index}' or None.
+    count: An integer - number of entities.
+  Returns:
+    A list of key names (None items mean ID should be allocated).
+  """
+  if names is None:
+    return [None] * count
+  if isinstance(names, list):
+    if len(names) != count:
+      raise ValueError('Expected {} names, got {}'.format(count, len(names)))
+    return names
+  return [names.format(index=index) for index in range(count)]
+
+
+class SeedEntities(webapp2.RequestHandler):
+  """ Creates entities server-side, so fixture of any size takes one request.
+
+  Request body:
+    {"kind": "Greeting", "count": 100, "namespace": "",
+     "names": ["a", "b"] or "greeting-{index}" (IDs are allocated if missing),
+     "parent": ["Guestbook", "1"] (path of common ancestor),
+     "ancestors": {"kind": "Guestbook", "count": 10, "names": "gb-{index}",
+                   "create": true} (entities are spread across parents),
+     "properties": {"content": {"text": 16}, "rating": {"randint": [1, 10]}}}
+  Response body:
+    {"keys": [<path>, ...], "ancestorKeys": [<path>, ...]}
+  """
+  def post(self):
+    try:
+      spec = json.loads(self.request.body)
+      namespace = spec.get('namespace') or None
+      names = spec.get('names')
+      count = int(spec.get('count',
+                           len(names) if isinstance(names, list) else 0))
+      if not 0 < count <= MAX_SEED_COUNT:
+        raise ValueError('count should be between 1 and {}'
+                         .format(MAX_SEED_COUNT))
+      names = seed_key_names(names, count)
+      generators = {prop: make_property_generator(generator)
+                    for prop, generator in spec.get('properties', {}).items()}
+      parent = None
+      if spec.get('parent'):
+        parent = datastore.Key.from_path(*spec['parent'], namespace=namespace)
+      ancestor_keys = self.seed_ancestors(spec.get('ancestors'), parent,
+                                          namespace)
+    except (ValueError, KeyError, TypeError) as error:
+      self.response.set_status(400)
+      self.response.write('Invalid seed request: {}'.format(error))
+      return
+
+    parents = ancestor_keys or [parent]
+    entities = []
+    for index, name in enumerate(names):
+      entity = datastore.Entity(spec['kind'],
+                                parent=parents[index % len(parents)],
+                                name=name, namespace=namespace)
+      for prop, generator in generators.items():
+        entity[prop] = generator(index)
+      entities.append(entity)
+    keys = put_pipelined(entities)
+
+    self.response.headers['Content-Type'] = 'application/json'
+    json.dump({'keys': [key.to_path() for key in keys],
+               'ancestorKeys': [key.to_path() for key in ancestor_keys]},
+              self.response)
+
+  def seed_ancestors(self, layout, parent, namespace):
+    """ Creates ancestors which seeded entities are spread across.
+
+    Args:
+      layout: A dict describing ancestors or None.
+      parent: A datastore.Key of common parent or None.
+      namespace: A string - namespace of entities or None.
+    Returns:
+      A list of ancestor keys (empty if layout is None).
+    """
+    if not layout:
+      return []
+    names = seed_key_names(layout.get('names'), int(layout['count']))
+    ancestors = [
+      datastore.Entity(layout['kind'], parent=parent, name=name,
+                       namespace=namespace)
+      for name in names
+    ]
+    if layout.get('create', True):
+      return put_pipelined(ancestors)
+    if None in names:
+      raise ValueError('names are required for ancestors which are not created')
+    return [ancestor.key() for ancestor in ancestors]
+
 urls = [
   ('/python/datastore/project', ProjectHandler),
   ('/python/datastore/module', ModuleHandler),
@@ -2155,5 +2343,7 @@ urls = [
   ('/python/datastore/merge_join_with_key', MergeJoinWithKey),
   ('/python/datastore/batch_query', BatchQuery),
   ('/python/datastore/more_results', CheckMoreResults),
-  ('/python/datastore/query_in_transaction', QueryInTransaction)
+  ('/python/datastore/query_in_transaction', QueryInTransaction),
+  ('/python/datastore/seed', SeedEntities),
+  ('/python/datastore/purge', PurgeHandler)
 ]
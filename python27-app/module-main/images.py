@@ -10,6 +10,8 @@ except ImportError:
 from google.appengine.ext import db, webapp
 import webapp2
 
+from datastore import purge_entities
+
 __author__ = 'hiranya'
 
 class ProjectLogo(db.Model):
@@ -63,7 +65,7 @@ class ProjectLogoHandler(webapp2.RequestHandler):
       json.dumps({ 'success' : True, 'project_id' : project_id }))
 
   def delete(self):
-    db.delete(ProjectLogo.all())
+    purge_entities(ProjectLogo.kind())
 
 urls = [
   ('/python/images/logo', ProjectLogoHandler),
@@ -2,6 +2,7 @@ import webapp2
 
 from app_identity import urls as app_identity_urls
 from async_datastore import urls as async_datastore_urls
+from batch import urls as batch_urls
 from blobstore import urls as blobstore_urls
 from cron import urls as cron_urls
 from datastore import urls as datastore_urls
@@ -11,6 +12,7 @@ from logservice import urls as logservice_urls
 from memcache import urls as memcache_urls
 from module_main import urls as modules_urls
 from ndb import urls as ndb_urls
+from rpc_timing import RpcTimingMiddleware
 from search import urls as search_urls
 from secure_url import urls as secure_url_urls
 from taskqueue import urls as taskqueue_urls
@@ -18,9 +20,10 @@ from urlfetch import urls as urlfetch_urls
 from users import urls as user_urls
 from xmpp import urls as xmpp_urls
 
-app = webapp2.WSGIApplication(
+wsgi_app = webapp2.WSGIApplication(
   app_identity_urls +
   async_datastore_urls +
+  batch_urls +
   blobstore_urls +
   cron_urls +
   datastore_urls +
@@ -37,3 +40,6 @@ app = webapp2.WSGIApplication(
   xmpp_urls +
   search_urls
 )
+
+# Every response reports time spent in API RPCs (see rpc_timing)
+app = RpcTimingMiddleware(wsgi_app)
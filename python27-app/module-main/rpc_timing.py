@@ -0,0 +1,102 @@
+"""
+WSGI middleware which times API RPCs made while handling a request.
+
+RPCs are timed by apiproxy_stub_map pre/post call hooks. Totals are
+returned in response headers, e.g.:
+  Server-Timing: handler;dur=12.5, rpc;dur=8.0, datastore_v3;dur=6.1, memcache;dur=1.9
+  X-Hawkeye-Rpc-Calls: datastore_v3=3, memcache=1
+"""
+import threading
+import time
+
+from google.appengine.api import apiproxy_stub_map
+
+HOOK_KEY = 'hawkeye_rpc_timing'
+
+SERVER_TIMING_HEADER = 'Server-Timing'
+RPC_CALLS_HEADER = 'X-Hawkeye-Rpc-Calls'
+
+_local = threading.local()
+
+
+class RequestStats(object):
+  """ RPC calls and durations of a single request. """
+
+  def __init__(self):
+    self.started = time.time()
+    # Start time of RPCs in flight by id of their response message
+    self.pending = {}
+    self.calls = {}
+    self.durations = {}
+
+  def rpc_started(self, response):
+    self.pending[id(response)] = time.time()
+
+  def rpc_finished(self, service, response):
+    started = self.pending.pop(id(response), None)
+    if started is None:
+      return
+    self.calls[service] = self.calls.get(service, 0) + 1
+    self.durations[service] = (
+      self.durations.get(service, 0) + time.time() - started)
+
+  def headers(self):
+    """ Returns a list of (name, value) response headers with totals. """
+    handler_ms = (time.time() - self.started) * 1000
+    rpc_ms = sum(self.durations.itervalues()) * 1000
+    metrics = ['handler;dur=%.1f' % handler_ms, 'rpc;dur=%.1f' % rpc_ms]
+    metrics += ['%s;dur=%.1f' % (service, duration * 1000)
+                for service, duration in sorted(self.durations.iteritems())]
+    calls = ', '.join('%s=%d' % (service, count)
+                      for service, count in sorted(self.calls.iteritems()))
+    return [(SERVER_TIMING_HEADER, ', '.join(metrics)),
+            (RPC_CALLS_HEADER, calls)]
+
+
+def current_stats():
+  """ Returns RequestStats of request handled by current thread or None. """
+  return getattr(_local, 'stats', None)
+
+
+def _pre_call_hook(service, call, request, response):
+  stats = current_stats()
+  if stats is not None:
+    stats.rpc_started(response)
+
+
+def _post_call_hook(service, call, request, response, rpc, error):
+  # Asynchronous RPC is finished when its result is checked,
+  # so its duration includes time between completion and the check.
+  stats = current_stats()
+  if stats is not None:
+    stats.rpc_finished(service, response)
+
+
+def install_hooks():
+  """ Registers RPC hooks (registering them again does nothing). """
+  apiproxy_stub_map.apiproxy.GetPreCallHooks().Append(
+    HOOK_KEY, _pre_call_hook)
+  apiproxy_stub_map.apiproxy.GetPostCallHooks().Append(
+    HOOK_KEY, _post_call_hook)
+
+
+class RpcTimingMiddleware(object):
+  """ Adds RPC timing headers to responses of wrapped WSGI application. """
+
+  def __init__(self, app):
+    self.app = app
+    install_hooks()
+
+  def __call__(self, environ, start_response):
+    # Requests can be nested (see batch.py), stats of outer one are restored
+    outer_stats = current_stats()
+    stats = RequestStats()
+    _local.stats = stats
+
+    def timed_start_response(status, headers, exc_info=None):
+      return start_response(status, list(headers) + stats.headers(), exc_info)
+
+    try:
+      return self.app(environ, timed_start_response)
+    finally:
+      _local.stats = outer_stats
@@ -13,7 +13,7 @@ from google.appengine.ext import db
 from google.appengine.ext import deferred
 
 import utils
-from datastore import SDK_CONSISTENCY_WAIT
+from datastore import purge_entities
 
 try:
   import json
@@ -139,7 +139,7 @@ class TaskCounterHandler(webapp2.RequestHandler):
     self.response.out.write(json.dumps({ 'status' : True }))
 
   def delete(self):
-    db.delete(utils.TaskCounter.all())
+    purge_entities(utils.TaskCounter.kind())
 
 
 class PullTaskHandler(webapp2.RequestHandler):
@@ -624,18 +624,7 @@ class TaskCounterWorker(webapp2.RequestHandler):
 
 class CleanUpTaskEntities(webapp2.RequestHandler):
   def post(self):
-    batch_size = 200
-    while True:
-      query = TaskEntity.all()
-      entity_batch = query.fetch(batch_size)
-      if not entity_batch:
-        self.response.set_status(200)
-        return
-      entities_fetched = len(entity_batch)
-      db.delete(entity_batch)
-      time.sleep(SDK_CONSISTENCY_WAIT)
-      if entities_fetched < batch_size:
-        break
+    purge_entities(TaskEntity.kind())
     self.response.set_status(200)
 
 
@@ -1,5 +1,44 @@
+import base64
+import json
+import os
+import threading
+import time
+
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.structures import CaseInsensitiveDict
+
+import hawkeye_utils
 from application_versions import AppVersion
-from hawkeye_utils import hawkeye_request
+from hawkeye_utils import check_rpc_budget, hawkeye_request
+
+BATCH_PATH = '/{lang}/_batch'
+
+# Max time fanned out requests wait for each other at start barrier
+BARRIER_TIMEOUT = 30
+
+_fanout = {'executor': None, 'pid': None, 'size': None}
+_fanout_lock = threading.Lock()
+
+
+def fanout_executor():
+  """
+  Returns ThreadPoolExecutor shared by Application.gather of all tests.
+  It has a worker per kept-alive connection of hawkeye_utils.session_pool,
+  so fanned out requests reuse connections and their total number is bounded.
+  """
+  size = hawkeye_utils.session_pool.pool_size
+  with _fanout_lock:
+    # Threads of executor don't survive fork of suite worker process
+    if _fanout['pid'] != os.getpid() or _fanout['size'] != size:
+      if _fanout['executor'] and _fanout['pid'] == os.getpid():
+        # Pool size has changed, idle workers of old executor should exit.
+        # Executor inherited from parent process belongs to the parent
+        _fanout['executor'].shutdown(wait=False)
+      _fanout['executor'] = ThreadPoolExecutor(size)
+      _fanout['pid'] = os.getpid()
+      _fanout['size'] = size
+    return _fanout['executor']
 
 
 class UnknownVersion(Exception):
@@ -10,6 +49,62 @@ class ImproperVersionsList(Exception):
   pass
 
 
+class BarrierTimeout(Exception):
+  pass
+
+
+class StartBarrier(object):
+  """
+  Lets fanned out requests start at the same moment (for race tests).
+  """
+
+  def __init__(self, parties, timeout=BARRIER_TIMEOUT):
+    self.parties = parties
+    self.timeout = timeout
+    self._waiting = 0
+    self._condition = threading.Condition()
+
+  def wait(self):
+    """
+    Blocks until all parties are waiting.
+
+    Raises:
+      BarrierTimeout: if other parties didn't come in timeout seconds.
+    """
+    deadline = time.time() + self.timeout
+    with self._condition:
+      self._waiting += 1
+      if self._waiting >= self.parties:
+        self._condition.notify_all()
+        return
+      while self._waiting < self.parties:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+          raise BarrierTimeout(
+            "Only {} of {} requests reached start barrier in {}s"
+            .format(self._waiting, self.parties, self.timeout))
+        self._condition.wait(remaining)
+
+
+class BatchResponse(object):
+  """
+  Response to a sub-request of batch. It mimics requests.Response,
+  so it can be checked the same way as response to a regular request.
+  """
+
+  def __init__(self, status_code, headers, content):
+    self.status_code = status_code
+    self.headers = CaseInsensitiveDict(headers)
+    self.content = content
+
+  @property
+  def text(self):
+    return self.content.decode('utf-8')
+
+  def json(self):
+    return json.loads(self.content)
+
+
 class Application(object):
   """
   Application objects supposed to be used in test cases for hawkeye tests.
@@ -92,7 +187,7 @@ class Application(object):
     return self.request('delete', path, module, version, https, **kwargs)
 
   def request(self, method, path, module=None, version=None,
-              https=False, **kwargs):
+              https=False, max_rpcs=None, **kwargs):
     """
     Sends request to specified module and version of application.
     If module or version are missed, then default one will be used.
@@ -104,12 +199,202 @@ class Application(object):
       module: A string - identifies which module should be used.
       version: A string - identifies which version of module should be used.
       https: A boolean - determines if https should be used.
+      max_rpcs: A dict {service: max number of API RPCs} handler is
+        expected to make, e.g. {'datastore_v3': 3}. It's checked only if
+        app reports RPC counts (see rpc_timing.py of python27-app).
       kwargs: kwargs to be passed to requests.delete function.
     Returns:
        request.Response object.
+    Raises:
+      RpcBudgetExceeded: if handler made more RPCs than max_rpcs allows.
     """
     url = self.build_url(path, module, version, https)
-    return hawkeye_request(method, url, **kwargs)
+    response = hawkeye_request(method, url, **kwargs)
+    if max_rpcs:
+      check_rpc_budget(response, max_rpcs)
+    return response
+
+  def batch(self, sub_requests, module=None, version=None, https=False,
+            concurrent=False, **kwargs):
+    """
+    Sends several requests to specified module and version of application
+    in a single round trip. Sub-requests are dispatched by the app
+    in-process (see batch.py of python27-app) in order or concurrently.
+    If app doesn't have batch endpoint, sub-requests are sent one by one.
+
+    Args:
+      sub_requests: A list of dicts describing sub-requests, e.g.:
+        {'method': 'POST', 'path': '/{lang}/memcache',
+         'params': {...}, 'data': {...}, 'json': {...}, 'headers': {...}}
+        Only 'path' is required, default method is GET.
+      module: A string - identifies which module should be used.
+      version: A string - identifies which version of module should be used.
+      https: A boolean - determines if https should be used.
+      concurrent: A boolean - whether sub-requests can be handled concurrently.
+      kwargs: kwargs to be passed to requests.post function.
+    Returns:
+      A list of BatchResponse (or requests.Response if sub-requests were
+      sent one by one) in order of sub_requests.
+    """
+    encoded = [self._encode_sub_request(sub_request)
+               for sub_request in sub_requests]
+    response = self.post(BATCH_PATH, module, version, https,
+                         json={'requests': encoded, 'concurrent': concurrent},
+                         **kwargs)
+    if response.status_code == 404:
+      return [
+        self.request(
+          sub_request.get('method', 'GET'), sub_request['path'], module,
+          version, https, params=sub_request.get('params'),
+          data=sub_request.get('data'), json=sub_request.get('json'),
+          headers=sub_request.get('headers'), **kwargs)
+        for sub_request in sub_requests
+      ]
+    response.raise_for_status()
+    return [
+      BatchResponse(
+        item['status'], item['headers'],
+        base64.b64decode(item['body_base64']) if 'body_base64' in item
+        else item['body'].encode('utf-8'))
+      for item in response.json()['responses']
+    ]
+
+  def gather(self, calls, module=None, version=None, https=False,
+             deadline=None, barrier=False, wait=True, **kwargs):
+    """
+    Sends requests concurrently using shared bounded pool of workers
+    (see fanout_executor). Requests are logged (to log file of suite of
+    the calling test), timed, attributed to the calling test and use
+    kept-alive connections like any other request of Application.
+    Requests which start at barrier are sent by dedicated workers
+    (a worker per call), so they never wait for workers of shared pool
+    held by other gathers.
+
+    Args:
+      calls: A list of dicts describing requests, e.g.:
+        {'method': 'POST', 'path': '/{lang}/datastore/tx',
+         'json': {...}, 'delay': 0.5, 'deadline': 10}
+        Default method is GET. 'module', 'version' and 'https' override
+        arguments of gather. 'delay' is number of seconds to wait after
+        start before sending request. 'deadline' overrides deadline of
+        gather. Other items are passed to Application.request
+        (e.g. data, json, params, headers, max_rpcs).
+      module: A string - identifies which module should be used.
+      version: A string - identifies which version of module should be used.
+      https: A boolean - determines if https should be used.
+      deadline: A number - max number of seconds to wait for every response
+        (it's also used as requests timeout if timeout isn't specified).
+      barrier: A boolean - whether requests should wait for each other
+        and start at the same moment.
+      wait: A boolean - whether to wait for responses or return futures.
+      kwargs: kwargs to be passed to Application.request for every call.
+    Returns:
+      A list of requests.Response objects (or futures if wait is False)
+      in order of calls.
+    Raises:
+      concurrent.futures.TimeoutError: if deadline of a call is exceeded.
+      Any exception raised by a request.
+    """
+    start_barrier = None
+    if barrier and calls:
+      executor = ThreadPoolExecutor(len(calls))
+      start_barrier = StartBarrier(len(calls), deadline or BARRIER_TIMEOUT)
+    else:
+      executor = fanout_executor()
+    test_id = hawkeye_utils.get_current_test()
+    suite = hawkeye_utils.get_current_suite()
+
+    started = time.time()
+    futures = []
+    deadlines = []
+    for call in calls:
+      call = dict(kwargs, **call)
+      call.setdefault('module', module)
+      call.setdefault('version', version)
+      call.setdefault('https', https)
+      call_deadline = call.pop('deadline', deadline)
+      if call_deadline is not None:
+        call.setdefault('timeout', call_deadline)
+      deadlines.append(call_deadline)
+      futures.append(executor.submit(self._send_call, call, start_barrier,
+                                     test_id, suite))
+    if start_barrier:
+      # Dedicated workers exit as soon as their calls are finished
+      executor.shutdown(wait=False)
+
+    if not wait:
+      return futures
+    responses = []
+    for future, call_deadline in zip(futures, deadlines):
+      timeout = None
+      if call_deadline is not None:
+        timeout = max(started + call_deadline - time.time(), 0)
+      responses.append(future.result(timeout))
+    return responses
+
+  def map(self, method, path, calls_kwargs, module=None, version=None,
+          https=False, **kwargs):
+    """
+    Sends the same request concurrently with different arguments
+    (see Application.gather).
+
+    Args:
+      method: A string - represents HTTP method.
+      path: A string - path to http method. It can contain '{lang}'.
+      calls_kwargs: A list of dicts with kwargs of every request,
+        e.g. [{'json': {...}}, {'json': {...}}].
+      module: A string - identifies which module should be used.
+      version: A string - identifies which version of module should be used.
+      https: A boolean - determines if https should be used.
+      kwargs: kwargs to be passed to Application.gather.
+    Returns:
+      A list of requests.Response objects (or futures) in order of
+      calls_kwargs.
+    """
+    calls = [dict(call_kwargs, method=method, path=path)
+             for call_kwargs in calls_kwargs]
+    return self.gather(calls, module, version, https, **kwargs)
+
+  def _send_call(self, call, start_barrier, test_id, suite):
+    method = call.pop('method', 'GET')
+    path = call.pop('path')
+    delay = call.pop('delay', 0)
+    # Worker thread is shared by tests, so request is attributed
+    # to the test (and suite) which has called gather
+    hawkeye_utils.set_current_test(test_id)
+    hawkeye_utils.set_current_suite(suite)
+    try:
+      if start_barrier:
+        start_barrier.wait()
+      if delay:
+        time.sleep(delay)
+      return self.request(method, path, **call)
+    finally:
+      hawkeye_utils.set_current_test(None)
+      hawkeye_utils.set_current_suite(None)
+
+  def _encode_sub_request(self, sub_request):
+    """ Encodes sub-request using requests lib (params, form, json). """
+    path = sub_request['path'].format(lang=self.language)
+    prepared = requests.Request(
+      sub_request.get('method', 'GET'), 'http://batch' + path,
+      params=sub_request.get('params'), data=sub_request.get('data'),
+      json=sub_request.get('json'), headers=sub_request.get('headers')
+    ).prepare()
+    encoded = {
+      'method': prepared.method,
+      'path': prepared.path_url,
+      'headers': dict(prepared.headers),
+    }
+    body = prepared.body
+    if body is not None:
+      if isinstance(body, unicode):
+        body = body.encode('utf-8')
+      try:
+        encoded['body'] = body.decode('utf-8')
+      except UnicodeDecodeError:
+        encoded['body_base64'] = base64.b64encode(body)
+    return encoded
 
   def build_url(self, path, module=None, version=None, https=True):
     """
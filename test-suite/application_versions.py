@@ -1,3 +1,6 @@
+import csv
+
+
 class AppVersion(object):
   """
   Container for details about specific version of specific module of
@@ -58,3 +61,27 @@ class AppVersion(object):
     if module:
       return "{m}.{app}".format(m=module, app=app_id)
     return app_id
+
+
+def read_versions_csv(app_id, file_name):
+  """
+  Reads versions CSV file (MODULE,VERSION,HTTP-URL,HTTPS-URL,IS-DEFAULT).
+
+  Args:
+    app_id: A string representing application ID.
+    file_name: A string - path to versions CSV file.
+  Returns:
+    A list of AppVersion objects.
+  """
+  versions = []
+  with open(file_name) as versions_csv:
+    # Skip header line
+    versions_csv.next()
+    for module, version, http, https, is_default in csv.reader(versions_csv):
+      version = AppVersion(
+        app_id=app_id, module=module, version=version,
+        http_url=http, https_url=https,
+        is_default_for_module=is_default.lower() == 'yes'
+      )
+      versions.append(version)
+  return versions
@@ -2,13 +2,17 @@
 """hawkeye.py: Run API fidelity tests on AppScale.
 
 Usage:
-  hawkeye.py --app APP_ID --versions-csv FILE [options]
+  hawkeye.py --app APP_ID --versions-csv FILE [options] [--rerun-failed [<report-csv>]]
+  hawkeye.py --runtimes=RUNTIMES [options]
+  hawkeye.py --merge-shards [options] <shard-csv>...
+  hawkeye.py (--list-suites | --list-tests) [options] [--rerun-failed [<report-csv>]]
   hawkeye.py (-h | --help)
 
 Options:
   -h, --help           # show this help message and exit
   --app=APP_ID         # Application ID to test
   --versions-csv FILE  # File containing http and https URL to app versions
+  --runtimes=RUNTIMES  # Comma separated LANG:VERSIONS_CSV[:APP_ID] runtimes to test concurrently
   -l LANG --lang=LANG  # Language binding to test (python or java) [default: python]
   --user=USER          # Admin username [default: a@a.com]
   --pass=PASSWORD      # Admin password [default: aaaaaa]
@@ -17,92 +21,227 @@ Options:
   --exclude-suites=EXCLUDE_SUITES # A comma separated list of suites to exclude
   --baseline           # Turn on verbose reporting for baseline comparison
   --baseline-file FILE # File for baseline results [default is baseline for lang]
+                       # (not allowed with several --runtimes, each of them
+                       # is compared to hawkeye_baseline_<lang>.csv)
   --log-dir=BASE_DIR   # Directory to store error logs
   --keep-old-logs      # Keep existing hawkeye logs
+  -j N --jobs=N        # Number of worker processes to run suites in [default: 1]
+  --test-threads=N     # Number of threads to run concurrency safe tests of a suite in [default: 1]
+  --pool-size=N        # Max number of kept-alive connections per host [default: 10]
+  --preconnect         # Open connections to all app versions before tests
+  --connect-timeout=SECONDS  # Timeout of connecting to app [default: 10]
+  --read-timeout=SECONDS  # Timeout of reading response from app [default: 60]
+  --test-timeout=SECONDS  # Max duration of a test, 0 - unlimited [default: 300]
+  --suite-timeout=SECONDS  # Max duration of a suite, 0 - unlimited [default: 1800]
+  --precheck-timeout=SECONDS  # Timeout of probing app versions before tests [default: 5]
+  --no-precheck        # Don't probe app versions (and don't skip suites of unreachable modules)
+  --list-suites        # Print names of available suites and exit
+  --list-tests         # Print IDs of tests in selected suites and exit
+  --rerun-failed       # Rerun only tests which failed or did not match baseline
+                       # in <report-csv> [default is hawkeye_output.csv]
+  --history-db=FILE    # SQLite database to append run results to [default: hawkeye_history.sqlite]
+  --no-history         # Don't record run to history database
+  --events-file=FILE   # Stream JSON-lines events (test start, end, ...) to FILE as they occur
+  --capture-file=FILE  # Capture every request with its timing to JSON-lines FILE
+                       # (to be replayed by hawkeye_replay.py)
+  --request-log-verbosity=N  # Details of requests in logs (1 - URL and status,
+                       # 2 - headers, 3 - limited body, 4 - full body) [default: 3]
+  --compress-logs      # Gzip detailed log files
+  --shard-count=N      # Number of shards to split selected tests into [default: 1]
+  --shard-index=I      # Index of shard to run (from 0 to N-1) [default: 0]
+  --durations-file=FILE  # JSON with durations of tests to balance shards by
+                       # (see hawkeye_history.py durations), every shard
+                       # should use the same file
+  --merge-shards       # Merge shard reports into hawkeye_output.csv and compare it to baseline
 """
-import csv
+import importlib
+import json
+import multiprocessing
 import os
+import Queue
 import sys
+import time
+import traceback
+from collections import namedtuple
 
 import docopt
 
 import hawkeye_utils
+from hawkeye_history import HistoryDatabase, RunInfo, file_hash
+from hawkeye_precheck import (format_probes_table, precheck_versions,
+                              unreachable_modules)
 from application import Application, AppURLBuilder
-from application_versions import AppVersion
+from application_versions import read_versions_csv
 from hawkeye_test_runner import HawkeyeSuitesRunner, save_report_dict_to_csv, \
-  DeprecatedHawkeyeTestCase
+  save_timings_to_json, iter_cases, \
+  load_report_dict_from_csv, select_tests_to_rerun, filter_suite, select_shard
 
 if not sys.version_info[:2] > (2, 6):
   raise RuntimeError("Hawkeye will only run with Python 2.7 or newer.")
 
-from tests import (
-  app_identity_tests, datastore_tests, ndb_tests, memcache_tests,
-  taskqueue_tests, blobstore_tests, user_tests, images_tests, secure_url_tests,
-  xmpp_tests, environment_variable_tests, async_datastore_tests, cron_tests,
-  logservice_tests, modules_tests, runtime_tests, urlfetch_tests, warmup_tests,
-  search_tests
-)
-
 SUPPORTED_LANGUAGES = ['java', 'python', 'go', 'php']
 
+Runtime = namedtuple("Runtime", ["language", "versions_csv", "app_id"])
+
+# Seconds between checks if runtime workers are still alive
+WORKER_POLL_INTERVAL = 1
+
+# Registry of suites. Maps suite name to name of module in tests package
+# which provides suite(lang, app) factory. Module is imported only when
+# its suite is selected.
+SUITE_MODULES = {
+  'app_identity': 'app_identity_tests',
+  'blobstore': 'blobstore_tests',
+  'datastore': 'datastore_tests',
+  'async_datastore': 'async_datastore_tests',
+  'env_var': 'environment_variable_tests',
+  'images': 'images_tests',
+  'memcache': 'memcache_tests',
+  'ndb': 'ndb_tests',
+  'secure_url': 'secure_url_tests',
+  'taskqueue': 'taskqueue_tests',
+  'urlfetch': 'urlfetch_tests',
+  'users': 'user_tests',
+  'xmpp': 'xmpp_tests',
+  'cron': 'cron_tests',
+  'logservice': 'logservice_tests',
+  'modules': 'modules_tests',
+  'runtime': 'runtime_tests',
+  'search': 'search_tests',
+}
+
+# Warmup suite is run first unless it's excluded
+WARMUP_SUITE = 'warmup'
+WARMUP_MODULE = 'warmup_tests'
+
+
+def import_suite_module(suite_name):
+  """
+  Imports module of tests package which defines specified suite.
+
+  Args:
+    suite_name: A string - name of suite (key of SUITE_MODULES or 'warmup').
+  Returns:
+    A module with suite(lang, app) function.
+  """
+  module_name = SUITE_MODULES.get(suite_name, WARMUP_MODULE)
+  return importlib.import_module('tests.{}'.format(module_name))
+
 
-def build_suites_list(lang, include, exclude, application):
+def select_suites(include, exclude):
   """
-  Based on language, include and exclude filters, build list of
-  HawkeyeTestSuite objects.
+  Based on include and exclude filters, determines names of suites to run.
 
   Args:
-    lang: A string representing language to test ('python' or 'java').
     include: A list of str - suites to return (use empty list to include all).
     exclude: A list of str - suites to skip
       ('exclude' is ignored if 'include' is specified).
-    application: An Application object - wraps requests library and provides
-      api for access to testing AppEngine application.
 
   Returns:
-    a list of HawkeyeTestSuite for specified language.
+    a list of suite names (warmup suite goes first).
   """
-  defined_suites  = {
-    'app_identity': app_identity_tests.suite(lang, application),
-    'blobstore' : blobstore_tests.suite(lang, application),
-    'datastore' : datastore_tests.suite(lang, application),
-    'async_datastore' : async_datastore_tests.suite(lang, application),
-    'env_var' : environment_variable_tests.suite(lang, application),
-    'images' : images_tests.suite(lang, application),
-    'memcache' : memcache_tests.suite(lang, application),
-    'ndb' : ndb_tests.suite(lang, application),
-    'secure_url' : secure_url_tests.suite(lang, application),
-    'taskqueue' : taskqueue_tests.suite(lang, application),
-    'urlfetch': urlfetch_tests.suite(lang, application),
-    'users' : user_tests.suite(lang, application),
-    'xmpp' : xmpp_tests.suite(lang, application),
-    'cron' : cron_tests.suite(lang, application),
-    'logservice': logservice_tests.suite(lang, application),
-    'modules' : modules_tests.suite(lang, application),
-    'runtime': runtime_tests.suite(lang, application),
-    'search': search_tests.suite(lang, application),
-  }
   # Validation include and exclude lists
   for suite_name in include + exclude:
-    if suite_name not in defined_suites:
+    if suite_name not in SUITE_MODULES:
       print_usage_and_exit("Unknown suite '{}'. Suite can be one of {}"
-                           .format(suite_name, defined_suites.keys()))
+                           .format(suite_name, SUITE_MODULES.keys()))
 
   if include:
-    suites = [suite for suite_name, suite in defined_suites.iteritems()
-              if suite_name in include]
-    if 'warmup' in include and 'warmup' not in exclude:
-      warmup = warmup_tests.suite(lang, application)
-      suites.insert(0, warmup)
+    suite_names = [suite_name for suite_name in SUITE_MODULES
+                   if suite_name in include]
+    if WARMUP_SUITE in include and WARMUP_SUITE not in exclude:
+      suite_names.insert(0, WARMUP_SUITE)
   else:
-    suites = [suite for suite_name, suite in defined_suites.iteritems()
-              if suite_name not in exclude]
-    if 'warmup' not in exclude:
-      warmup = warmup_tests.suite(lang, application)
-      suites.insert(0, warmup)
-  if not suites:
+    suite_names = [suite_name for suite_name in SUITE_MODULES
+                   if suite_name not in exclude]
+    if WARMUP_SUITE not in exclude:
+      suite_names.insert(0, WARMUP_SUITE)
+  if not suite_names:
     print_usage_and_exit('Must specify at least one suite to execute')
-  return suites
+  return suite_names
+
+
+def suites_of_tests(suite_names, test_ids):
+  """
+  Filters suite names leaving only suites which contain specified tests.
+
+  Args:
+    suite_names: A list of str - names of suites.
+    test_ids: A set of test IDs (like 'tests.memcache_tests.MemcacheTest.runTest').
+  Returns:
+    a list of suite names.
+  """
+  test_modules = {test_id.split('.')[1] for test_id in test_ids}
+  return [suite_name for suite_name in suite_names
+          if SUITE_MODULES.get(suite_name, WARMUP_MODULE) in test_modules]
+
+
+def build_suites_list(lang, suite_names, application, test_ids=None):
+  """
+  Imports test modules of selected suites and builds
+  HawkeyeTestSuite objects for specified language.
+
+  Args:
+    lang: A string representing language to test ('python' or 'java').
+    suite_names: A list of str - names of suites to build.
+    application: An Application object - wraps requests library and provides
+      api for access to testing AppEngine application.
+    test_ids: A set of test IDs to keep in suites (with fixtures they depend
+      on) or None if all tests should be kept.
+
+  Returns:
+    a list of HawkeyeTestSuite for specified language.
+  """
+  suites = [import_suite_module(suite_name).suite(lang, application)
+            for suite_name in suite_names]
+  if test_ids is None:
+    return suites
+  filtered = [filter_suite(suite, test_ids) for suite in suites]
+  return [suite for suite in filtered if suite.countTestCases()]
+
+
+def list_suites_and_exit():
+  """
+  Prints names of all available suites and exits.
+  """
+  for suite_name in [WARMUP_SUITE] + sorted(SUITE_MODULES):
+    print(suite_name)
+  exit(0)
+
+
+def selected_test_ids(lang, suite_names, test_ids):
+  """
+  Builds set of IDs of all test cases of selected suites.
+  Test cases are only instantiated, no requests are sent.
+
+  Args:
+    lang: A string representing language to test ('python' or 'java').
+    suite_names: A list of str - names of selected suites.
+    test_ids: A set of test IDs to rerun or None.
+  Returns:
+    A set of test IDs.
+  """
+  app = Application(app_id=None, url_builder=AppURLBuilder([], lang))
+  return {test_case.id()
+          for suite in build_suites_list(lang, suite_names, app, test_ids)
+          for test_case in iter_cases(suite)}
+
+
+def list_tests_and_exit(lang, suite_names, test_ids):
+  """
+  Prints IDs of all test cases of selected suites and exits.
+  Test cases are only instantiated, no requests are sent.
+
+  Args:
+    lang: A string representing language to test ('python' or 'java').
+    suite_names: A list of str - names of suites to list tests of.
+    test_ids: A set of test IDs to rerun or None.
+  """
+  app = Application(app_id=None, url_builder=AppURLBuilder([], lang))
+  for suite in build_suites_list(lang, suite_names, app, test_ids):
+    for test_case in iter_cases(suite):
+      print("{} {}".format(suite.short_name, test_case.id()))
+  exit(0)
 
 
 def print_usage_and_exit(msg):
@@ -124,28 +263,203 @@ class HawkeyeParameters(object):
   """
   def __init__(self):
     self.language = None
+    self.app_id = None
+    self.versions_hash = None
+    self.history_db = None
     self.suites = None
     self.test_result_verbosity = None
     self.baseline_verbosity = None
     self.baseline_file = None
     self.log_dir = None
     self.output_file = None
+    self.timings_file = None
+    self.jobs = None
+    self.test_threads = None
+    self.pool_size = None
+    self.request_timeout = None
+    self.test_budget = None
+    self.suite_budget = None
+    self.precheck_timeout = None
+    self.preconnect_urls = None
+    self.previous_report = None
+    self.events_file = None
+    self.capture_file = None
+    self.versions = None
+    self.request_log_verbosity = None
+    self.compress_logs = None
+
+
+def load_durations_file(file_name):
+  """
+  Loads durations of tests which shards are balanced by.
+
+  Args:
+    file_name: A string - path to JSON file {test_id: seconds} (or None).
+  Returns:
+    A dict {test_id: seconds} (empty if file_name is None, so shards
+    are split by test IDs only).
+  """
+  if not file_name:
+    return {}
+  with open(file_name) as durations_file:
+    return json.load(durations_file)
+
+
+def merge_shards_and_exit(shard_files, language, suite_names, test_ids,
+                          baseline_file, output_file, verbosity):
+  """
+  Merges reports of shards into one report, saves it
+  and prints comparison to baseline. Exits with error if shards
+  didn't report exactly the selected tests.
+
+  Args:
+    shard_files: A list of str - paths to shard reports.
+    language: A string - language binding.
+    suite_names: A list of str - names of selected suites.
+    test_ids: A set of test IDs to rerun or None.
+    baseline_file: A string - path to baseline report.
+    output_file: A string - path to save merged report to.
+    verbosity: An integer - if > 1 details about difference is printed.
+  """
+  merged_report = {}
+  for shard_file in shard_files:
+    shard_report = load_report_dict_from_csv(shard_file)
+    duplicated = set(shard_report) & set(merged_report)
+    if duplicated:
+      print("Warning: {} tests of {} were already reported by other shards"
+            .format(len(duplicated), shard_file))
+    merged_report.update(shard_report)
+
+  selected = selected_test_ids(language, suite_names, test_ids)
+  missing = selected - set(merged_report)
+  unexpected = set(merged_report) - selected
+  if missing or unexpected:
+    for test_id in sorted(missing):
+      print("Not reported by any shard: {}".format(test_id))
+    for test_id in sorted(unexpected):
+      print("Not selected, but reported: {}".format(test_id))
+    print("Shard reports don't match selected tests ({} missing, {} unexpected)"
+          .format(len(missing), len(unexpected)))
+    exit(1)
+
+  test_runner = HawkeyeSuitesRunner(language, None, baseline_file)
+  test_runner.suites_report = merged_report
+  test_runner.print_summary(verbosity)
+  save_report_dict_to_csv(merged_report, output_file)
+  exit(0)
+
+
+def output_file_name(prefix, extension, language=None, shard_index=None):
+  """
+  Builds name of output file of a run.
+
+  Args:
+    prefix: A string (e.g. 'hawkeye_output').
+    extension: A string (e.g. 'csv').
+    language: A string - language if several runtimes are tested.
+    shard_index: An integer - index of shard if tests are sharded.
+  Returns:
+    A string like 'hawkeye_output_python_shard1.csv'.
+  """
+  name = prefix
+  if language:
+    name += "_{}".format(language)
+  if shard_index is not None:
+    name += "_shard{}".format(shard_index)
+  return "{}.{}".format(name, extension)
+
+
+def parse_runtimes(runtimes_opt, default_app_id):
+  """
+  Parses value of --runtimes option.
+
+  Args:
+    runtimes_opt: A string - comma separated LANG:VERSIONS_CSV[:APP_ID] items.
+    default_app_id: A string - value of --app option (or None).
+  Returns:
+    A list of Runtime.
+  """
+  runtimes = []
+  for item in runtimes_opt.split(','):
+    parts = item.split(':')
+    if len(parts) not in (2, 3):
+      print_usage_and_exit("Runtime '{}' should be specified as "
+                           "LANG:VERSIONS_CSV[:APP_ID]".format(item))
+    app_id = parts[2] if len(parts) == 3 else default_app_id
+    if not app_id:
+      print_usage_and_exit("Application ID is missing for runtime '{}'"
+                           .format(item))
+    runtimes.append(Runtime(parts[0], parts[1], app_id))
+  languages = [runtime.language for runtime in runtimes]
+  if len(set(languages)) != len(languages):
+    print_usage_and_exit('Every language can be specified only once')
+  return runtimes
 
 
 def process_command_line_options():
   """
-  Validates and processes command line arguments. Builds HawkeyeParameters.
+  Validates and processes command line arguments. Builds HawkeyeParameters
+  for every runtime to test.
 
   Returns:
-    An instance of HawkeyeParameters with filled attributres.
+    A list of HawkeyeParameters with filled attributres (one per runtime).
   """
   options = docopt.docopt(__doc__)
 
-  # Validate language
-  language = options["--lang"]
-  if language not in SUPPORTED_LANGUAGES:
-    print_usage_and_exit('Unsupported language. Must be one of: {0}'.
-      format(SUPPORTED_LANGUAGES))
+  # Determine runtimes to test
+  if options["--runtimes"]:
+    runtimes = parse_runtimes(options["--runtimes"], options["--app"])
+  else:
+    runtimes = [Runtime(options["--lang"], options["--versions-csv"],
+                        options["--app"])]
+  multiple_runtimes = len(runtimes) > 1
+  if multiple_runtimes and options["--baseline-file"]:
+    print_usage_and_exit('--baseline-file can not be used with several '
+                         'runtimes, hawkeye_baseline_<lang>.csv is used '
+                         'for every runtime')
+
+  # Validate languages
+  for runtime in runtimes:
+    if runtime.language not in SUPPORTED_LANGUAGES:
+      print_usage_and_exit('Unsupported language. Must be one of: {0}'.
+        format(SUPPORTED_LANGUAGES))
+  language = runtimes[0].language
+
+  # Determine suites list
+  include_opt = options["--suites"]
+  include_suites = include_opt.split(',') if include_opt else []
+  exclude_opt = options["--exclude-suites"]
+  exclude_suites = exclude_opt.split(',') if exclude_opt else []
+  suite_names = select_suites(include_suites, exclude_suites)
+
+  baseline_file = (options["--baseline-file"]
+    if options.get("--baseline-file")
+    else "hawkeye_baseline_{}.csv".format(language))
+
+  # Select tests which failed in previous run
+  previous_report = None
+  rerun_test_ids = None
+  if options["<report-csv>"] and not options["--rerun-failed"]:
+    print_usage_and_exit('Report csv can be specified only with --rerun-failed')
+  if options["--rerun-failed"]:
+    previous_report = load_report_dict_from_csv(
+      options["<report-csv>"] or "hawkeye_output.csv")
+    rerun_test_ids = select_tests_to_rerun(
+      previous_report, load_report_dict_from_csv(baseline_file))
+    suite_names = suites_of_tests(suite_names, rerun_test_ids)
+    if not suite_names:
+      print("No failed tests to rerun")
+      exit(0)
+
+  if options["--merge-shards"]:
+    merge_shards_and_exit(options["<shard-csv>"], language, suite_names,
+                          rerun_test_ids, baseline_file, "hawkeye_output.csv",
+                          2 if options["--baseline"] else 1)
+
+  if options["--list-suites"]:
+    list_suites_and_exit()
+  if options["--list-tests"]:
+    list_tests_and_exit(language, suite_names, rerun_test_ids)
 
   # Prepare logs directory
   base_dir = options["--log-dir"] or os.getcwd()
@@ -160,73 +474,299 @@ def process_command_line_options():
       if os.path.isfile(file_path):
         os.unlink(file_path)
 
-  # Set user email and password in user_tests module
-  user_tests.USER_EMAIL = options["--user"]
-  user_tests.USER_PASSWORD = options["--pass"]
-
-  # Initialize Application object
-  app_id = options["--app"]
-  versions = []
-  with open(options["--versions-csv"]) as versions_csv:
-    # Skip header line
-    versions_csv.next()
-    for module, version, http, https, is_default in csv.reader(versions_csv):
-      version = AppVersion(
-        app_id=app_id, module=module, version=version,
-        http_url=http, https_url=https,
-        is_default_for_module=is_default.lower() == 'yes'
-      )
-      versions.append(version)
-
-  url_builder = AppURLBuilder(versions, language)
-  app = Application(app_id, url_builder)
-
-  # Determine suites list
-  include_opt = options["--suites"]
-  include_suites = include_opt.split(',') if include_opt else []
-  exclude_opt = options["--exclude-suites"]
-  exclude_suites = exclude_opt.split(',') if exclude_opt else []
-  suites = build_suites_list(language, include_suites, exclude_suites, app)
+  # Validate number of parallel jobs and threads
+  try:
+    jobs = int(options["--jobs"])
+    test_threads = int(options["--test-threads"])
+    pool_size = int(options["--pool-size"])
+  except ValueError:
+    jobs = test_threads = pool_size = 0
+  if jobs < 1 or test_threads < 1 or pool_size < 1:
+    print_usage_and_exit(
+      '--jobs, --test-threads and --pool-size must be positive integers')
+  try:
+    request_timeout = (float(options["--connect-timeout"]),
+                       float(options["--read-timeout"]))
+    test_budget = float(options["--test-timeout"])
+    suite_budget = float(options["--suite-timeout"])
+    precheck_timeout = float(options["--precheck-timeout"])
+  except ValueError:
+    request_timeout = (0, 0)
+    test_budget = suite_budget = precheck_timeout = -1
+  if min(request_timeout + (precheck_timeout,)) <= 0:
+    print_usage_and_exit(
+      '--connect-timeout, --read-timeout and --precheck-timeout '
+      'must be positive numbers')
+  if test_budget < 0 or suite_budget < 0:
+    print_usage_and_exit(
+      '--test-timeout and --suite-timeout must be non-negative numbers')
+  if options["--no-precheck"]:
+    precheck_timeout = None
+  try:
+    request_log_verbosity = int(options["--request-log-verbosity"])
+  except ValueError:
+    request_log_verbosity = -1
+  if not 0 <= request_log_verbosity <= 4:
+    print_usage_and_exit('--request-log-verbosity should be between 0 and 4')
+
+  # Validate sharding options
+  try:
+    shard_count = int(options["--shard-count"])
+    shard_index = int(options["--shard-index"])
+  except ValueError:
+    shard_count = shard_index = -1
+  if shard_count < 1 or not 0 <= shard_index < shard_count:
+    print_usage_and_exit('--shard-index should be between 0 and --shard-count')
+  history_db = None if options["--no-history"] else options["--history-db"]
+  # Split should depend only on inputs shared by all shards
+  durations = load_durations_file(options["--durations-file"])
+
+  # Events of all runtimes and workers are appended to the same file
+  events_file = options["--events-file"]
+  if events_file:
+    open(events_file, "w").close()
+  capture_file = options["--capture-file"]
+  if capture_file:
+    open(capture_file, "w").close()
 
-  # Prepare summarized hawkeye parameters
-  hawkeye_params = HawkeyeParameters()
-  hawkeye_params.language = language
-  hawkeye_params.suites = suites
-  hawkeye_params.baseline_file = (options["--baseline-file"]
-    if options.get("--baseline-file")
-    else "hawkeye_baseline_{}.csv".format(language))
-  hawkeye_params.test_result_verbosity = 2 if options["--console"] else 1
-  hawkeye_params.baseline_verbosity = 2 if options["--baseline"] else 1
-  hawkeye_params.log_dir = hawkeye_logs
-  hawkeye_params.output_file = "hawkeye_output.csv"
-  return hawkeye_params
+  # Set user email and password in user_tests module
+  if 'users' in suite_names:
+    user_tests = import_suite_module('users')
+    user_tests.USER_EMAIL = options["--user"]
+    user_tests.USER_PASSWORD = options["--pass"]
+
+  all_params = []
+  for runtime in runtimes:
+    # Initialize Application object
+    versions = read_versions_csv(runtime.app_id, runtime.versions_csv)
+    url_builder = AppURLBuilder(versions, runtime.language)
+    app = Application(runtime.app_id, url_builder)
+
+    suites = build_suites_list(runtime.language, suite_names, app,
+                               rerun_test_ids)
+    if shard_count > 1:
+      suites = select_shard(suites, durations, shard_index, shard_count)
+
+    # Prepare summarized hawkeye parameters
+    hawkeye_params = HawkeyeParameters()
+    hawkeye_params.language = runtime.language
+    hawkeye_params.app_id = runtime.app_id
+    hawkeye_params.versions_hash = file_hash(runtime.versions_csv)
+    hawkeye_params.history_db = history_db
+    hawkeye_params.suites = suites
+    hawkeye_params.test_result_verbosity = 2 if options["--console"] else 1
+    hawkeye_params.baseline_verbosity = 2 if options["--baseline"] else 1
+    hawkeye_params.log_dir = hawkeye_logs
+    if multiple_runtimes:
+      hawkeye_params.baseline_file = "hawkeye_baseline_{}.csv".format(
+        runtime.language)
+    else:
+      hawkeye_params.baseline_file = baseline_file
+    output_language = runtime.language if multiple_runtimes else None
+    output_shard = shard_index if shard_count > 1 else None
+    hawkeye_params.output_file = output_file_name(
+      "hawkeye_output", "csv", output_language, output_shard)
+    hawkeye_params.timings_file = output_file_name(
+      "hawkeye_timings", "json", output_language, output_shard)
+    hawkeye_params.jobs = jobs
+    hawkeye_params.test_threads = test_threads
+    hawkeye_params.pool_size = pool_size
+    hawkeye_params.request_timeout = request_timeout
+    hawkeye_params.test_budget = test_budget or None
+    hawkeye_params.suite_budget = suite_budget or None
+    hawkeye_params.precheck_timeout = precheck_timeout
+    if options["--preconnect"]:
+      hawkeye_params.preconnect_urls = sorted(
+        {v.http_url for v in versions} | {v.https_url for v in versions})
+    else:
+      hawkeye_params.preconnect_urls = []
+    hawkeye_params.previous_report = previous_report
+    hawkeye_params.events_file = events_file
+    hawkeye_params.capture_file = capture_file
+    hawkeye_params.versions = versions
+    hawkeye_params.request_log_verbosity = request_log_verbosity
+    hawkeye_params.compress_logs = options["--compress-logs"]
+    all_params.append(hawkeye_params)
+  return all_params
 
 
 def run_hawkeye_tests(params):
   """
   Runs hawkeye tests according to params. Prints summary and saves
-  test results to csv file.
+  test results to csv file and request timings to json file.
+  The run is appended to history database.
 
   Args:
     params: An instance of HawkeyeParameters.
+  Returns:
+    A ReportsDiff - comparison of test results to baseline.
   """
   # Configure logging
-  hawkeye_utils.configure_hawkeye_logging(params.log_dir, params.language)
-
-  DeprecatedHawkeyeTestCase.LANG = params.language
+  hawkeye_utils.configure_hawkeye_logging(params.log_dir, params.language,
+                                          params.compress_logs)
+  hawkeye_utils.REQUEST_LOG_VERBOSITY = params.request_log_verbosity
+  hawkeye_utils.REQUEST_TIMEOUT = params.request_timeout
+
+  # Configure pool of kept-alive HTTP sessions
+  hawkeye_utils.session_pool = hawkeye_utils.SessionPool(params.pool_size)
+  hawkeye_utils.session_pool.preconnect(params.preconnect_urls)
+
+  hawkeye_utils.events = hawkeye_utils.EventsStream(
+    params.events_file, language=params.language)
+  hawkeye_utils.traffic_capture = hawkeye_utils.EventsStream(
+    params.capture_file, language=params.language)
+  # Versions let replay map captured URLs to modules of another deployment
+  captured_versions = [
+    {"module": version.module, "version": version.version,
+     "http_url": version.http_url, "https_url": version.https_url}
+    for version in params.versions
+  ]
+  hawkeye_utils.traffic_capture.emit("versions", app_id=params.app_id,
+                                     versions=captured_versions)
+  started = time.time()
+  hawkeye_utils.events.emit("run_start", app_id=params.app_id,
+                            suites=[suite.short_name for suite in params.suites])
 
   # Prepare and start testing suites
   test_runner = HawkeyeSuitesRunner(
     params.language,
     params.log_dir,
     params.baseline_file,
-    params.test_result_verbosity
+    params.test_result_verbosity,
+    params.test_threads,
+    params.test_budget,
+    params.suite_budget
   )
-  test_runner.run_suites(params.suites)
-  test_runner.print_summary(params.baseline_verbosity)
+  if params.precheck_timeout:
+    # Suites of modules which are down are skipped instead of
+    # spending their polling deadlines
+    probes = precheck_versions(params.versions, params.precheck_timeout)
+    print("\nPrecheck of {} app versions:".format(params.language))
+    print(format_probes_table(probes))
+    hawkeye_utils.events.emit("precheck",
+                              probes=[probe._asdict() for probe in probes])
+    test_runner.unreachable_modules = unreachable_modules(params.versions,
+                                                          probes)
+  test_runner.run_suites(params.suites, params.jobs)
+  finished = time.time()
+  hawkeye_utils.events.emit("run_end", duration=finished - started)
+  hawkeye_utils.events.close()
+  hawkeye_utils.traffic_capture.close()
+  hawkeye_utils.close_logs()
+  run_report = test_runner.suites_report
+  if params.previous_report is not None:
+    # Merge statuses of rerun tests into report of previous run
+    merged_report = dict(params.previous_report)
+    merged_report.update(test_runner.suites_report)
+    test_runner.suites_report = merged_report
+  diff = test_runner.print_summary(params.baseline_verbosity)
+  test_runner.print_connections_summary()
   save_report_dict_to_csv(test_runner.suites_report, params.output_file)
+  save_timings_to_json(hawkeye_utils.request_timings, params.timings_file)
+
+  if params.history_db:
+    history = HistoryDatabase(params.history_db)
+    run_info = RunInfo(params.language, params.app_id, params.versions_hash,
+                       started, finished)
+    history.record_run(run_info, run_report, test_runner.tests_durations,
+                       hawkeye_utils.request_timings.summary())
+    history.close()
+  return diff
+
+
+def run_runtimes_concurrently(all_params):
+  """
+  Runs hawkeye tests of every runtime in a separate worker process.
+  Console output of a runtime is saved to <log_dir>/<lang>-console.log.
+  Prints combined summary when all runtimes are tested.
+
+  Args:
+    all_params: A list of HawkeyeParameters (one per runtime).
+  """
+  outcomes = multiprocessing.Queue()
+  workers = []
+  for params in all_params:
+    console_file = os.path.join(
+      params.log_dir, "{}-console.log".format(params.language))
+    print("Testing {lang} runtime (console output: {file})"
+          .format(lang=params.language, file=console_file))
+    # Workers aren't daemonic, so they can start their own pools (--jobs)
+    worker = multiprocessing.Process(
+      target=_run_runtime, args=(params, console_file, outcomes))
+    worker.start()
+    workers.append((params, console_file, worker))
+
+  # Worker which died without reporting (e.g. killed) is considered failed
+  diffs = {}
+  while len(diffs) < len(workers):
+    try:
+      language, diff = outcomes.get(timeout=WORKER_POLL_INTERVAL)
+      diffs[language] = diff
+      continue
+    except Queue.Empty:
+      pass
+    dead_workers = [(params, worker) for params, _, worker in workers
+                    if params.language not in diffs and not worker.is_alive()]
+    if not dead_workers:
+      continue
+    # Outcomes which were put right before worker exited
+    try:
+      while True:
+        language, diff = outcomes.get_nowait()
+        diffs[language] = diff
+    except Queue.Empty:
+      pass
+    for params, worker in dead_workers:
+      if params.language not in diffs:
+        print("Worker of {lang} runtime exited with code {code} "
+              "without reporting results"
+              .format(lang=params.language, code=worker.exitcode))
+        diffs[params.language] = None
+  for _, _, worker in workers:
+    worker.join()
+
+  print("\nCombined summary:")
+  for params, console_file, worker in workers:
+    diff = diffs.get(params.language)
+    if diff is None:
+      print(" {lang:<7} failed (exit code {code}), see {file}"
+            .format(lang=params.language, code=worker.exitcode,
+                    file=console_file))
+      continue
+    print(" {lang:<7} {match:<4} matched baseline, {different:<4} did not match,"
+          " {missed_in_baseline:<4} not in baseline, {missed_in_suites:<4} not ran"
+          "  ({output})".format(
+            lang=params.language, match=len(diff.match),
+            different=len(diff.do_not_match),
+            missed_in_baseline=len(diff.missed_in_first),
+            missed_in_suites=len(diff.missed_in_second),
+            output=params.output_file))
+
+
+def _run_runtime(params, console_file, outcomes):
+  """
+  Entry point of runtime worker process.
+
+  Args:
+    params: An instance of HawkeyeParameters.
+    console_file: A string - path to file to redirect console output to.
+    outcomes: A multiprocessing.Queue to put (language, diff) tuple to.
+      diff is None if tests couldn't be run.
+  """
+  diff = None
+  try:
+    sys.stdout = sys.stderr = open(console_file, "w")
+    diff = run_hawkeye_tests(params)
+  except Exception:
+    traceback.print_exc()
+  finally:
+    sys.stdout.flush()
+    outcomes.put((params.language, diff))
 
 
 if __name__ == '__main__':
   hawkeye_parameters = process_command_line_options()
-  run_hawkeye_tests(hawkeye_parameters)
+  if len(hawkeye_parameters) == 1:
+    run_hawkeye_tests(hawkeye_parameters[0])
+  else:
+    run_runtimes_concurrently(hawkeye_parameters)
@@ -0,0 +1,1245 @@
+#!/usr/bin/python2.7
+"""hawkeye_bench.py: Measure throughput and latency of application endpoint.
+
+By default the endpoint is run with closed-loop concurrency levels
+1, 2, 4, ... N: every worker sends next request as soon as previous
+response is received.
+
+With --rate the endpoint is run in open loop: requests are scheduled
+at constant arrival rate (or as Poisson process with --poisson) regardless
+of how fast server responds. Latency is measured from the time request was
+scheduled to be sent, so queueing delay isn't hidden when server slows down
+(coordinated omission). Latencies are recorded to log-bucketed histograms
+which are merged across --processes.
+
+With --find-saturation offered open-loop load is increased step by step
+(and then bisected) until SLO is breached. Maximum sustainable throughput
+with confidence bounds is saved to <capacity-dir>/<api>-<lang>.json.
+
+With --scenario a mix of weighted operations described in JSON (or YAML)
+file is run by virtual users at target rate (see Scenario for format).
+Latency is reported per operation and in aggregate.
+
+Throughput, latency percentiles and error rate are printed
+as a table and saved to JSON file.
+
+Path and body are templates. Besides '{lang}' they can contain:
+  {uuid}    - random UUID (hex),
+  {n}       - sequence number of request,
+  {worker}  - index of worker which sends request,
+  {random}  - random integer from 0 to 999999.
+
+Usage:
+  hawkeye_bench.py --app APP_ID --versions-csv FILE --path PATH [options]
+  hawkeye_bench.py --app APP_ID --versions-csv FILE --scenario FILE [options]
+  hawkeye_bench.py (-h | --help)
+
+Options:
+  -h, --help             # show this help message and exit
+  --app=APP_ID           # Application ID to benchmark
+  --versions-csv FILE    # File containing http and https URL to app versions
+  -l LANG --lang=LANG    # Language binding to benchmark [default: python]
+  --path=PATH            # Path template (e.g. /{lang}/memcache?key={uuid})
+  --scenario=FILE        # JSON or YAML file describing mixed workload
+  --method=METHOD        # HTTP method [default: GET]
+  --data=TEMPLATE        # Body template (e.g. key={uuid}&value={n})
+  --json                 # Send rendered body as JSON
+  --module=MODULE        # Module to send requests to [default is default module]
+  --version=VERSION      # Version of module [default is default version]
+  --https                # Use HTTPS
+  --max-concurrency=N    # Max number of concurrent workers
+                         # (per process in open loop) [default: 32]
+  --rate=RPS             # Run open loop with this total arrival rate
+                         # (overrides rate of scenario)
+  --poisson              # Schedule open-loop requests as Poisson process
+  --processes=N          # Number of open-loop processes [default: 1]
+  --find-saturation      # Ramp open-loop rate until SLO is breached
+  --slo-percentile=P     # Latency percentile limited by SLO [default: 99]
+  --slo-latency=MS       # Max latency of the percentile [default: 200]
+  --slo-errors=PERCENT   # Max percent of failed requests [default: 0.1]
+  --start-rate=RPS       # Rate of the first saturation step [default: 10]
+  --max-rate=RPS         # Saturation search stops at this rate [default: 10000]
+  --ramp-factor=X        # Rate multiplier between ramp steps [default: 1.5]
+  --refine-steps=N       # Bisection steps after SLO breach [default: 3]
+  --api=NAME             # API name in capacity results [default is path]
+  --release=LABEL        # Release label in capacity results
+  --capacity-dir=DIR     # Directory for capacity results [default: hawkeye-capacity]
+  --duration=SECONDS     # Measurement time of every level [default: 10]
+  --warmup=SECONDS       # Time to warm up every level before measuring [default: 2]
+  --timeout=SECONDS      # Request timeout [default: 30]
+  --output=FILE          # JSON file to save results to [default: hawkeye_bench.json]
+"""
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import string
+import threading
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+
+# YAML scenarios are supported if PyYAML is installed.
+try:
+  import yaml
+except ImportError:
+  yaml = None
+
+import hawkeye_utils
+from application import Application, AppURLBuilder, UnknownVersion
+from application_versions import read_versions_csv
+from hawkeye_utils import RequestTimings, endpoint_template
+
+# Two-sided 95% normal quantile
+CONFIDENCE_Z = 1.96
+
+
+class Endpoint(object):
+  """
+  Endpoint of tested application with templates of path and body.
+  """
+
+  def __init__(self, app, method, path, data=None, json_body=False,
+               module=None, version=None, https=False, timeout=None,
+               generators=None):
+    """
+    Args:
+      app: An Application object.
+      method: A string - HTTP method.
+      path: A string - path template.
+      data: A string - body template, a dict or a list with templates
+        in string values (form fields or JSON document) or None.
+      json_body: A boolean - whether rendered body is JSON.
+      module: A string - module name or None for default module.
+      version: A string - version name or None for default version.
+      https: A boolean - whether HTTPS should be used.
+      timeout: A number - request timeout in seconds.
+      generators: A dict {placeholder: callable} with generators of
+        additional placeholder values.
+    """
+    self.app = app
+    self.method = method.upper()
+    self.path = path
+    self.data = data
+    self.json_body = json_body
+    self.module = module
+    self.version = version
+    self.https = https
+    self.timeout = timeout
+    self.generators = generators or {}
+    self.sequence = itertools.count()
+
+  def send(self, worker=0):
+    """
+    Renders templates and sends request. Timing of request is
+    recorded to hawkeye_utils.request_timings (even if request fails).
+
+    Args:
+      worker: An integer - index of worker which sends request.
+    Returns:
+      A requests.Response object.
+    """
+    context = {
+      "uuid": uuid.uuid4().hex,
+      "n": next(self.sequence),
+      "worker": worker,
+      "random": random.randint(0, 999999),
+    }
+    for name, generator in self.generators.iteritems():
+      context[name] = generator()
+    kwargs = {"verbosity": 0, "timeout": self.timeout}
+    if self.data is not None:
+      body = render_template(self.data, context)
+      if self.json_body and isinstance(body, basestring):
+        kwargs["json"] = json.loads(body)
+      elif self.json_body:
+        kwargs["json"] = body
+      else:
+        kwargs["data"] = body
+    return self.app.request(
+      self.method, render_template(self.path, context), self.module,
+      self.version, self.https, **kwargs)
+
+  def describe(self):
+    return {"method": self.method, "path": self.path, "data": self.data,
+            "module": self.module, "version": self.version,
+            "https": self.https}
+
+
+def render_template(template, context):
+  """
+  Renders path or body template. '{lang}' is kept to be
+  substituted by Application.
+
+  Args:
+    template: A string with placeholders or a dict/list
+      with templates in string values.
+    context: A dict with values of placeholders.
+  Returns:
+    A rendered string (or dict/list).
+  """
+  if isinstance(template, dict):
+    return {key: render_template(value, context)
+            for key, value in template.iteritems()}
+  if isinstance(template, list):
+    return [render_template(value, context) for value in template]
+  if isinstance(template, basestring):
+    return template.format(lang="{lang}", **context)
+  return template
+
+
+def make_generator(spec):
+  """
+  Builds generator of placeholder values from its description:
+    {"choice": [...]}       - random item of the list,
+    {"randint": [LOW, HIGH]} - random integer from LOW to HIGH,
+    {"sequence": START}     - sequential integers from START,
+    {"text": LENGTH}        - random lowercase word of LENGTH letters,
+    {"uuid": true}          - random UUID (hex).
+
+  Args:
+    spec: A dict with a single item describing generator.
+  Returns:
+    A callable without arguments.
+  Raises:
+    ValueError: if generator is unknown.
+  """
+  if not isinstance(spec, dict) or len(spec) != 1:
+    raise ValueError("Generator must be a dict with single item: {}"
+                     .format(spec))
+  kind, argument = spec.items()[0]
+  if kind == "choice":
+    return lambda: random.choice(argument)
+  if kind == "randint":
+    low, high = argument
+    return lambda: random.randint(low, high)
+  if kind == "sequence":
+    counter = itertools.count(argument)
+    return lambda: next(counter)
+  if kind == "text":
+    return lambda: "".join(random.choice(string.ascii_lowercase)
+                           for _ in range(argument))
+  if kind == "uuid":
+    return lambda: uuid.uuid4().hex
+  raise ValueError("Unknown generator '{}'".format(kind))
+
+
+def concurrency_levels(max_concurrency):
+  """
+  Args:
+    max_concurrency: An integer.
+  Returns:
+    A list of levels: 1, 2, 4, ... max_concurrency.
+  """
+  levels = []
+  level = 1
+  while level < max_concurrency:
+    levels.append(level)
+    level *= 2
+  levels.append(max_concurrency)
+  return levels
+
+
+class LatencyHistogram(object):
+  """
+  Compact histogram of latencies with logarithmic buckets.
+  Bucket i counts values from MIN_VALUE * GROWTH**i to
+  MIN_VALUE * GROWTH**(i+1), so percentiles are reported with relative
+  error below GROWTH - 1 regardless of latency range. Histograms are
+  merged by adding bucket counts.
+  """
+
+  MIN_VALUE = 0.0001    # 0.1ms
+  GROWTH = 1.02
+
+  def __init__(self):
+    self.buckets = {}
+    self.count = 0
+    self.max = 0.0
+
+  def record(self, value):
+    """
+    Args:
+      value: A number - latency in seconds.
+    """
+    if value > self.MIN_VALUE:
+      bucket = int(math.log(value / self.MIN_VALUE) / math.log(self.GROWTH))
+    else:
+      bucket = 0
+    self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+    self.count += 1
+    self.max = max(self.max, value)
+
+  def merge(self, other):
+    """
+    Adds counts of other histogram to this one.
+
+    Args:
+      other: A LatencyHistogram object.
+    """
+    for bucket, count in other.buckets.iteritems():
+      self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+    self.count += other.count
+    self.max = max(self.max, other.max)
+
+  def percentile(self, percentile):
+    """
+    Args:
+      percentile: A number from 0 to 100.
+    Returns:
+      Upper bound of bucket containing nearest-rank percentile
+      (not greater than max recorded value) or None if histogram is empty.
+    """
+    if not self.count:
+      return None
+    return self._value_at_rank(int(math.ceil(percentile / 100.0 * self.count)))
+
+  def percentile_bounds(self, percentile, z=CONFIDENCE_Z):
+    """
+    Computes distribution-free confidence interval of percentile
+    using ranks of order statistics (normal approximation of binomial).
+
+    Args:
+      percentile: A number from 0 to 100.
+      z: A number - normal quantile of confidence level.
+    Returns:
+      A tuple (lower, upper) or None if histogram is empty.
+    """
+    if not self.count:
+      return None
+    quantile = percentile / 100.0
+    spread = z * math.sqrt(self.count * quantile * (1 - quantile))
+    lower_rank = int(math.floor(self.count * quantile - spread))
+    upper_rank = int(math.ceil(self.count * quantile + spread)) + 1
+    return self._value_at_rank(lower_rank), self._value_at_rank(upper_rank)
+
+  def _value_at_rank(self, rank):
+    """
+    Returns:
+      Upper bound of bucket containing value of given rank (1-based,
+      clipped to [1, count]), not greater than max recorded value.
+    """
+    rank = min(max(rank, 1), self.count)
+    seen = 0
+    for bucket in sorted(self.buckets):
+      seen += self.buckets[bucket]
+      if seen >= rank:
+        return min(self.MIN_VALUE * self.GROWTH ** (bucket + 1), self.max)
+    return self.max
+
+  def distribution(self):
+    """
+    Returns:
+      A dict in format of RequestTimings distributions (p50, ..., max)
+      or None if histogram is empty.
+    """
+    if not self.count:
+      return None
+    distribution = {
+      "p{}".format(percentile): self.percentile(percentile)
+      for percentile in RequestTimings.PERCENTILES
+    }
+    distribution["max"] = self.max
+    return distribution
+
+  def to_dict(self):
+    return {
+      "min_value": self.MIN_VALUE,
+      "growth": self.GROWTH,
+      "buckets": {str(bucket): count
+                  for bucket, count in self.buckets.iteritems()},
+      "count": self.count,
+      "max": self.max,
+    }
+
+  @classmethod
+  def from_dict(cls, histogram_dict):
+    """
+    Args:
+      histogram_dict: A dict returned by to_dict.
+    Returns:
+      A LatencyHistogram object.
+    Raises:
+      ValueError: if histogram has different bucket layout.
+    """
+    if (histogram_dict["min_value"] != cls.MIN_VALUE
+        or histogram_dict["growth"] != cls.GROWTH):
+      raise ValueError("Histogram has incompatible buckets")
+    histogram = cls()
+    histogram.buckets = {int(bucket): count for bucket, count
+                         in histogram_dict["buckets"].iteritems()}
+    histogram.count = histogram_dict["count"]
+    histogram.max = histogram_dict["max"]
+    return histogram
+
+
+def level_stats(concurrency, records, elapsed):
+  """
+  Summarizes requests sent at a closed-loop load level.
+
+  Args:
+    concurrency: An integer - number of workers.
+    records: A list of RequestTiming.
+    elapsed: A number - measurement time in seconds.
+  Returns:
+    A dict with throughput, latency percentiles (ms) and error rate.
+  """
+  aggregated = RequestTimings.aggregate(records)
+  wall_time = aggregated["wall_time"] or {}
+  requests = aggregated["count"]
+  return {
+    "concurrency": concurrency,
+    "rate": None,
+    "duration": elapsed,
+    "requests": requests,
+    "errors": aggregated["errors"],
+    "error_rate": float(aggregated["errors"]) / requests if requests else 0.0,
+    "throughput": requests / elapsed if elapsed else 0.0,
+    "latency_ms": {key: value * 1000 for key, value in wall_time.iteritems()},
+  }
+
+
+def open_loop_stats(rate, outcome, duration):
+  """
+  Summarizes requests sent at an open-loop load level.
+
+  Args:
+    rate: A number - target arrival rate.
+    outcome: A dict returned by run_open_loop (or merged outcome).
+    duration: A number - measurement time in seconds.
+  Returns:
+    A dict with throughput, latency percentiles (ms), error rate
+    and serialized latency histogram.
+  """
+  histogram = outcome["histogram"]
+  latency = histogram.distribution() or {}
+  requests = histogram.count
+  return {
+    "concurrency": None,
+    "rate": rate,
+    "duration": duration,
+    "requests": requests,
+    "errors": outcome["errors"],
+    "error_rate": float(outcome["errors"]) / requests if requests else 0.0,
+    "throughput": requests / duration if duration else 0.0,
+    "latency_ms": {key: value * 1000 for key, value in latency.iteritems()},
+    "max_send_lag_ms": outcome["max_send_lag"] * 1000,
+    "histogram": histogram.to_dict(),
+  }
+
+
+def _closed_loop_worker(endpoint, worker, stop_event):
+  while not stop_event.is_set():
+    try:
+      endpoint.send(worker)
+    except Exception:
+      # Failed request is already recorded by hawkeye_request
+      pass
+
+
+def run_closed_loop_level(endpoint, concurrency, duration, warmup):
+  """
+  Runs endpoint with fixed number of closed-loop workers.
+
+  Args:
+    endpoint: An Endpoint object.
+    concurrency: An integer - number of workers.
+    duration: A number - measurement time in seconds.
+    warmup: A number - time in seconds before measurement starts.
+  Returns:
+    A dict returned by level_stats.
+  """
+  stop_event = threading.Event()
+  workers = [
+    threading.Thread(target=_closed_loop_worker,
+                     args=(endpoint, worker, stop_event))
+    for worker in range(concurrency)
+  ]
+  for worker in workers:
+    worker.daemon = True
+    worker.start()
+  try:
+    time.sleep(warmup)
+    hawkeye_utils.request_timings.drain()
+    started = time.time()
+    time.sleep(duration)
+    # Requests which are still in flight are not counted
+    records = hawkeye_utils.request_timings.drain()
+    elapsed = time.time() - started
+  finally:
+    stop_event.set()
+    for worker in workers:
+      worker.join()
+    hawkeye_utils.request_timings.drain()
+  return level_stats(concurrency, records, elapsed)
+
+
+class LatencyRecorder(object):
+  """
+  Collects latencies and errors of requests sent by concurrent threads.
+  """
+
+  def __init__(self):
+    self.histogram = LatencyHistogram()
+    self.errors = 0
+    self.max_send_lag = 0.0
+    self.lock = threading.Lock()
+
+  def add(self, latency, failed, send_lag=0.0):
+    """
+    Args:
+      latency: A number - seconds from intended send time to response.
+      failed: A boolean - whether request failed.
+      send_lag: A number - seconds request was sent later than intended.
+    """
+    with self.lock:
+      self.histogram.record(latency)
+      if failed:
+        self.errors += 1
+      self.max_send_lag = max(self.max_send_lag, send_lag)
+
+
+def _send_scheduled(endpoint, worker, intended, recorder, measured):
+  send_lag = time.time() - intended
+  try:
+    failed = endpoint.send(worker).status_code >= 500
+  except Exception:
+    failed = True
+  # Latency includes time request waited for its turn to be sent
+  latency = time.time() - intended
+  if measured:
+    recorder.add(latency, failed, send_lag)
+
+
+def run_open_loop(endpoint, rate, duration, warmup, max_concurrency,
+                  poisson=False, start_at=None, worker=0):
+  """
+  Sends requests at a fixed arrival rate (or as Poisson process)
+  regardless of how fast they are served. Every request has intended send
+  time and its latency is measured from that time, so if all pool threads
+  are busy, time request waits for a free thread is counted as well.
+  Requests scheduled within measurement window are awaited and recorded.
+
+  Args:
+    endpoint: An Endpoint object.
+    rate: A number - requests per second.
+    duration: A number - measurement time in seconds.
+    warmup: A number - time in seconds before measurement starts.
+    max_concurrency: An integer - max number of requests in flight.
+    poisson: A boolean - whether intervals between requests
+      are exponentially distributed.
+    start_at: A timestamp of the first request (now by default).
+    worker: An integer - index of sending process.
+  Returns:
+    A dict with latency histogram, number of errors and max lag
+    of actual send time behind intended time.
+  """
+  recorder = LatencyRecorder()
+  executor = ThreadPoolExecutor(max_concurrency)
+  intended = start_at or time.time()
+  measure_from = intended + warmup
+  stop_at = measure_from + duration
+  try:
+    while intended < stop_at:
+      delay = intended - time.time()
+      if delay > 0:
+        time.sleep(delay)
+      executor.submit(_send_scheduled, endpoint, worker, intended, recorder,
+                      intended >= measure_from)
+      if poisson:
+        intended += random.expovariate(rate)
+      else:
+        intended += 1.0 / rate
+  finally:
+    executor.shutdown(wait=True)
+    hawkeye_utils.request_timings.drain()
+  return {
+    "histogram": recorder.histogram,
+    "errors": recorder.errors,
+    "max_send_lag": recorder.max_send_lag,
+  }
+
+
+# Open-loop processes are forked and inherit endpoint and load parameters.
+_PROCESS_STATE = {}
+
+
+def _run_open_loop_process(index):
+  state = _PROCESS_STATE
+  processes = state["processes"]
+  endpoint = state["endpoint"]
+  hawkeye_utils.session_pool = hawkeye_utils.SessionPool(
+    state["max_concurrency"])
+  # Every process sends its own share of sequence numbers
+  endpoint.sequence = itertools.count(index, processes)
+  rate = float(state["rate"]) / processes
+  # Constant-rate processes are shifted to interleave their requests
+  start_at = state["start_at"]
+  if not state["poisson"]:
+    start_at += index / float(state["rate"])
+  outcome = run_open_loop(
+    endpoint, rate, state["duration"], state["warmup"],
+    state["max_concurrency"], state["poisson"], start_at, index)
+  outcome["histogram"] = outcome["histogram"].to_dict()
+  return outcome
+
+
+def run_open_loop_processes(endpoint, rate, duration, warmup, max_concurrency,
+                            poisson=False, processes=1):
+  """
+  Runs open loop in several processes which share total arrival rate.
+  Histograms of processes are merged.
+
+  Args:
+    endpoint: An Endpoint object.
+    rate: A number - total requests per second.
+    duration: A number - measurement time in seconds.
+    warmup: A number - time in seconds before measurement starts.
+    max_concurrency: An integer - max number of requests in flight
+      per process.
+    poisson: A boolean - whether arrivals are Poisson process.
+    processes: An integer - number of processes.
+  Returns:
+    A dict in format returned by run_open_loop.
+  """
+  if processes == 1:
+    return run_open_loop(endpoint, rate, duration, warmup, max_concurrency,
+                         poisson)
+  _PROCESS_STATE.update({
+    "endpoint": endpoint, "rate": rate, "duration": duration,
+    "warmup": warmup, "max_concurrency": max_concurrency,
+    "poisson": poisson, "processes": processes,
+    # Leave time for processes to start, so they share the same schedule
+    "start_at": time.time() + 1.0,
+  })
+  pool = multiprocessing.Pool(processes)
+  try:
+    outcomes = pool.map(_run_open_loop_process, range(processes))
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+    _PROCESS_STATE.clear()
+  merged = {"histogram": LatencyHistogram(), "errors": 0, "max_send_lag": 0.0}
+  for outcome in outcomes:
+    merged["histogram"].merge(LatencyHistogram.from_dict(outcome["histogram"]))
+    merged["errors"] += outcome["errors"]
+    merged["max_send_lag"] = max(merged["max_send_lag"],
+                                 outcome["max_send_lag"])
+  return merged
+
+
+class SLO(object):
+  """
+  Service level objective: limit of latency percentile and of error rate.
+  """
+
+  def __init__(self, percentile, latency, error_rate):
+    """
+    Args:
+      percentile: A number - latency percentile (e.g. 99).
+      latency: A number - max latency of the percentile in seconds.
+      error_rate: A number - max fraction of failed requests (e.g. 0.001).
+    """
+    self.percentile = percentile
+    self.latency = latency
+    self.error_rate = error_rate
+
+  def check(self, histogram, errors):
+    """
+    Args:
+      histogram: A LatencyHistogram object.
+      errors: An integer - number of failed requests.
+    Returns:
+      A tuple (met, confidently_met). SLO is confidently met if upper
+      confidence bound of the percentile is within the limit as well.
+    """
+    if not histogram.count:
+      return False, False
+    if float(errors) / histogram.count > self.error_rate:
+      return False, False
+    met = histogram.percentile(self.percentile) <= self.latency
+    upper_bound = histogram.percentile_bounds(self.percentile)[1]
+    return met, met and upper_bound <= self.latency
+
+  def to_dict(self):
+    return {
+      "percentile": self.percentile,
+      "latency_ms": self.latency * 1000,
+      "error_rate": self.error_rate,
+    }
+
+
+def find_saturation(endpoint, slo, start_rate, max_rate, ramp_factor,
+                    refine_steps, duration, warmup, max_concurrency,
+                    poisson=False, processes=1):
+  """
+  Increases open-loop rate geometrically until SLO is breached, then
+  bisects rate between the last passed and the first breached step.
+
+  Max sustainable rate is the highest offered rate where SLO is met
+  (throughput achieved at it is reported as well). Its bounds are offered
+  rates too: the lower bound is the highest rate where SLO is met with upper
+  confidence bound of latency percentile, the upper bound is the lowest
+  rate where SLO is breached (None if it wasn't breached up to max_rate).
+
+  Args:
+    endpoint: An Endpoint object.
+    slo: An SLO object.
+    start_rate: A number - rate of the first step.
+    max_rate: A number - the highest rate to try.
+    ramp_factor: A number - rate multiplier between ramp steps.
+    refine_steps: An integer - number of bisection steps.
+    duration, warmup, max_concurrency, poisson, processes:
+      see run_open_loop_processes.
+  Returns:
+    A tuple (steps, capacity): list of dicts returned by open_loop_stats
+    (with "slo_met" and "slo_confidently_met" fields) and
+    a dict with max sustainable rate, its throughput and bounds.
+  """
+  steps = []
+
+  def run_step(rate):
+    print("Sending {:g} req/s in open loop...".format(rate))
+    outcome = run_open_loop_processes(
+      endpoint, rate, duration, warmup, max_concurrency, poisson, processes)
+    stats = open_loop_stats(rate, outcome, duration)
+    stats["slo_met"], stats["slo_confidently_met"] = slo.check(
+      outcome["histogram"], outcome["errors"])
+    steps.append(stats)
+    return stats["slo_met"]
+
+  passed_rate, breached_rate = None, None
+  rate = start_rate
+  while rate <= max_rate:
+    if not run_step(rate):
+      breached_rate = rate
+      break
+    passed_rate = rate
+    rate *= ramp_factor
+
+  if breached_rate is not None:
+    low = passed_rate or 0.0
+    for _ in range(refine_steps):
+      rate = (low + breached_rate) / 2.0
+      if run_step(rate):
+        low = rate
+      else:
+        breached_rate = rate
+
+  passed = [step for step in steps if step["slo_met"]]
+  confident = [step for step in steps if step["slo_confidently_met"]]
+  best = max(passed, key=lambda step: step["rate"]) if passed else None
+  capacity = {
+    "slo": slo.to_dict(),
+    "max_sustainable_rate": best["rate"] if best else 0.0,
+    "max_sustainable_throughput": best["throughput"] if best else 0.0,
+    "lower_bound": max(step["rate"] for step in confident)
+                   if confident else 0.0,
+    "upper_bound": breached_rate,
+  }
+  return steps, capacity
+
+
+def capacity_file_name(capacity_dir, api, language, release=None):
+  """
+  Args:
+    capacity_dir: A string - directory for capacity results.
+    api: A string - API name (e.g. memcache) or endpoint path.
+    language: A string - language binding.
+    release: A string - release label or None.
+  Returns:
+    A string - path to JSON file with capacity of API.
+  """
+  name = re.sub(r"[^\w.-]+", "_", api).strip("_") or "root"
+  parts = [name, language] + ([release] if release else [])
+  return os.path.join(capacity_dir, "-".join(parts) + ".json")
+
+
+class Operation(object):
+  """
+  Operation of scenario: endpoint with relative weight
+  and think time of virtual user after the operation.
+  """
+
+  def __init__(self, name, endpoint, weight=1, think_time=0):
+    """
+    Args:
+      name: A string - operation name used in report.
+      endpoint: An Endpoint object.
+      weight: A number - relative frequency of operation.
+      think_time: A number or a list [MIN, MAX] - seconds virtual user
+        waits after operation.
+    """
+    self.name = name
+    self.endpoint = endpoint
+    self.weight = weight
+    if isinstance(think_time, (list, tuple)):
+      self.think_time = tuple(think_time)
+    else:
+      self.think_time = (think_time, think_time)
+
+  def think(self):
+    """
+    Returns:
+      A number - seconds virtual user has been thinking.
+    """
+    low, high = self.think_time
+    if high <= 0:
+      return 0.0
+    think_time = random.uniform(low, high)
+    time.sleep(think_time)
+    return think_time
+
+
+class Scenario(object):
+  """
+  Mixed workload: weighted operations run by virtual users. Every user
+  repeatedly picks an operation according to weights, sends it and waits
+  its think time. If rate is set, users also take send times from a shared
+  schedule at that rate and latency is measured from scheduled time
+  (as in open loop), so lack of free users isn't hidden. Slot which
+  passed while user was thinking is postponed by think time, so think
+  time isn't counted as latency.
+
+  Scenario file format (JSON or YAML):
+    {
+      "name": "datastore-memcache-mix",
+      "rate": 50,                       # optional, requests per second
+      "users": 32,                      # optional, number of virtual users
+      "operations": [
+        {
+          "name": "project-post",
+          "weight": 1,
+          "method": "POST",             # GET by default
+          "path": "/{lang}/datastore/project",
+          "data": {"name": "bench-{uuid}", "rating": "{rating}"},
+          "json": false,                # send data as JSON document
+          "module": null, "version": null, "https": false,
+          "think_time": [0.1, 0.5],     # or a number of seconds
+          "generators": {"rating": {"randint": [1, 10]}}
+        },
+        ...
+      ]
+    }
+  See make_generator for generators which can be used in path and data
+  templates besides {lang}, {uuid}, {n}, {worker} and {random}.
+  """
+
+  def __init__(self, name, operations, rate=None, users=None):
+    """
+    Args:
+      name: A string - scenario name.
+      operations: A list of Operation objects.
+      rate: A number - target rate of requests or None.
+      users: An integer - number of virtual users or None.
+    """
+    self.name = name
+    self.operations = operations
+    self.rate = rate
+    self.users = users
+    self._cumulative_weights = list(
+      _accumulate([operation.weight for operation in operations]))
+
+  def pick(self):
+    """
+    Returns:
+      An Operation chosen according to weights.
+    """
+    point = random.uniform(0, self._cumulative_weights[-1])
+    for operation, cumulative in zip(self.operations,
+                                     self._cumulative_weights):
+      if point <= cumulative:
+        return operation
+    return self.operations[-1]
+
+  @classmethod
+  def load(cls, file_name, app, timeout=None):
+    """
+    Reads scenario file.
+
+    Args:
+      file_name: A string - path to JSON or YAML file.
+      app: An Application object.
+      timeout: A number - request timeout in seconds.
+    Returns:
+      A Scenario object.
+    Raises:
+      ValueError: if scenario is invalid.
+    """
+    with open(file_name) as scenario_file:
+      if file_name.endswith((".yaml", ".yml")):
+        if yaml is None:
+          raise ValueError("PyYAML is required to read {}".format(file_name))
+        description = yaml.safe_load(scenario_file)
+      else:
+        description = json.load(scenario_file)
+    operations = []
+    for index, item in enumerate(description.get("operations") or []):
+      if "path" not in item:
+        raise ValueError("Operation #{} has no path".format(index))
+      generators = {
+        placeholder: make_generator(spec)
+        for placeholder, spec in (item.get("generators") or {}).iteritems()
+      }
+      endpoint = Endpoint(
+        app, item.get("method", "GET"), item["path"], item.get("data"),
+        item.get("json", False), item.get("module"), item.get("version"),
+        item.get("https", False), timeout, generators)
+      name = item.get("name") or "{} {}".format(endpoint.method, item["path"])
+      operations.append(Operation(name, endpoint, item.get("weight", 1),
+                                  item.get("think_time", 0)))
+    if not operations:
+      raise ValueError("Scenario {} has no operations".format(file_name))
+    if any(operation.weight <= 0 for operation in operations):
+      raise ValueError("Weights of operations must be positive")
+    names = [operation.name for operation in operations]
+    if len(set(names)) != len(names):
+      raise ValueError("Names of operations must be unique")
+    return cls(description.get("name", file_name), operations,
+               description.get("rate"), description.get("users"))
+
+
+def _accumulate(values):
+  total = 0
+  for value in values:
+    total += value
+    yield total
+
+
+class _SendSchedule(object):
+  """
+  Shared schedule of send times at a fixed rate.
+  """
+
+  def __init__(self, start_at, rate):
+    self._next = start_at
+    self._interval = 1.0 / rate
+    self._lock = threading.Lock()
+
+  def next_slot(self):
+    with self._lock:
+      slot = self._next
+      self._next += self._interval
+    return slot
+
+
+def _virtual_user(scenario, worker, schedule, recorders, window, stop_event):
+  measure_from, stop_at = window
+  think_time = 0.0
+  while not stop_event.is_set():
+    operation = scenario.pick()
+    if schedule:
+      slot = schedule.next_slot()
+      # Part of slot lag which elapsed while user was thinking is excluded,
+      # only time user was busy with previous request is counted
+      ready_at = time.time()
+      intended = max(slot, min(slot + think_time, ready_at))
+      delay = intended - time.time()
+      if delay > 0:
+        time.sleep(delay)
+    else:
+      intended = time.time()
+    if intended >= stop_at:
+      return
+    send_lag = time.time() - intended
+    try:
+      failed = operation.endpoint.send(worker).status_code >= 500
+    except Exception:
+      failed = True
+    latency = time.time() - intended
+    if intended >= measure_from:
+      recorders[operation.name].add(latency, failed, send_lag)
+    think_time = operation.think()
+
+
+def run_scenario(scenario, duration, warmup, rate=None, users=None):
+  """
+  Runs scenario by virtual users.
+
+  Args:
+    scenario: A Scenario object.
+    duration: A number - measurement time in seconds.
+    warmup: A number - time in seconds before measurement starts.
+    rate: A number - target rate (scenario rate is used if None).
+    users: An integer - number of virtual users
+      (scenario users are used if None).
+  Returns:
+    A dict {operation name: outcome in format returned by run_open_loop}.
+  """
+  rate = rate or scenario.rate
+  users = users or scenario.users
+  recorders = {operation.name: LatencyRecorder()
+               for operation in scenario.operations}
+  start_at = time.time()
+  window = (start_at + warmup, start_at + warmup + duration)
+  schedule = _SendSchedule(start_at, rate) if rate else None
+  stop_event = threading.Event()
+  threads = [
+    threading.Thread(target=_virtual_user, args=(
+      scenario, worker, schedule, recorders, window, stop_event))
+    for worker in range(users)
+  ]
+  for thread in threads:
+    thread.daemon = True
+    thread.start()
+  try:
+    time.sleep(max(window[1] - time.time(), 0))
+  finally:
+    # Requests which are in flight are awaited, users don't start new ones
+    stop_event.set()
+    for thread in threads:
+      thread.join()
+    hawkeye_utils.request_timings.drain()
+  return {
+    name: {
+      "histogram": recorder.histogram,
+      "errors": recorder.errors,
+      "max_send_lag": recorder.max_send_lag,
+    }
+    for name, recorder in recorders.iteritems()
+  }
+
+
+def scenario_stats(scenario, outcomes, rate, duration):
+  """
+  Args:
+    scenario: A Scenario object.
+    outcomes: A dict returned by run_scenario.
+    rate: A number - target rate or None.
+    duration: A number - measurement time in seconds.
+  Returns:
+    A list of dicts returned by open_loop_stats (with "operation" field):
+    one per operation and aggregate as the last one.
+  """
+  levels = []
+  total = {"histogram": LatencyHistogram(), "errors": 0, "max_send_lag": 0.0}
+  for operation in scenario.operations:
+    outcome = outcomes[operation.name]
+    total["histogram"].merge(outcome["histogram"])
+    total["errors"] += outcome["errors"]
+    total["max_send_lag"] = max(total["max_send_lag"], outcome["max_send_lag"])
+    stats = open_loop_stats(None, outcome, duration)
+    stats["operation"] = operation.name
+    levels.append(stats)
+  stats = open_loop_stats(rate, total, duration)
+  stats["operation"] = "total"
+  levels.append(stats)
+  return levels
+
+
+def _load_label(level):
+  if level.get("operation"):
+    return level["operation"]
+  if level["rate"] is not None:
+    return "{:g} req/s".format(level["rate"])
+  return "{} workers".format(level["concurrency"])
+
+
+def format_levels_table(levels):
+  """
+  Args:
+    levels: A list of dicts returned by level_stats.
+  Returns:
+    A string - table with a row for every level.
+  """
+  percentiles = ["p{}".format(p) for p in RequestTimings.PERCENTILES] + ["max"]
+  header = "{:>20} {:>9} {:>9} {:>8} ".format(
+    "load", "requests", "req/s", "errors")
+  header += " ".join("{:>9}".format(p + " ms") for p in percentiles)
+  rows = [header]
+  for level in levels:
+    row = "{:>20} {:>9} {:>9.1f} {:>7.2f}% ".format(
+      _load_label(level), level["requests"], level["throughput"],
+      level["error_rate"] * 100)
+    row += " ".join("{:>9.1f}".format(level["latency_ms"].get(p, 0))
+                    for p in percentiles)
+    rows.append(row)
+  return "\n".join(rows)
+
+
+def build_application(options, pool_size):
+  """
+  Builds Application and configures session pool according to
+  command line options.
+
+  Args:
+    options: A dict returned by docopt.
+    pool_size: An integer - max number of concurrent requests.
+  Returns:
+    An Application object.
+  """
+  versions = read_versions_csv(options["--app"], options["--versions-csv"])
+  hawkeye_utils.session_pool = hawkeye_utils.SessionPool(pool_size)
+  return Application(options["--app"],
+                     AppURLBuilder(versions, options["--lang"]))
+
+
+def build_endpoint(options, pool_size):
+  """
+  Builds Endpoint and configures session pool according to
+  command line options (shared by load modes).
+
+  Args:
+    options: A dict returned by docopt.
+    pool_size: An integer - max number of concurrent requests.
+  Returns:
+    An Endpoint object.
+  """
+  app = build_application(options, pool_size)
+  # Fail fast on unknown module or version rather than count it as errors
+  app.build_url("/", options["--module"], options["--version"],
+                options["--https"])
+  return Endpoint(
+    app, options["--method"], options["--path"], options["--data"],
+    options["--json"], options["--module"], options["--version"],
+    options["--https"], float(options["--timeout"]))
+
+
+def run_scenario_and_exit(options, rate, duration, warmup, max_concurrency):
+  """
+  Runs scenario described in --scenario file, prints and saves
+  per-operation and aggregate results.
+
+  Args:
+    options: A dict returned by docopt.
+    rate: A number - target rate (overrides scenario rate) or None.
+    duration: A number - measurement time in seconds.
+    warmup: A number - time in seconds before measurement starts.
+    max_concurrency: An integer - number of users if scenario
+      doesn't specify it.
+  """
+  app = build_application(options, max_concurrency)
+  try:
+    scenario = Scenario.load(options["--scenario"], app,
+                             float(options["--timeout"]))
+    # Fail fast on unknown modules or versions
+    for operation in scenario.operations:
+      app.build_url("/", operation.endpoint.module,
+                    operation.endpoint.version, operation.endpoint.https)
+  except (ValueError, UnknownVersion) as error:
+    print(error)
+    exit(1)
+  rate = rate or scenario.rate
+  users = scenario.users or max_concurrency
+  hawkeye_utils.session_pool = hawkeye_utils.SessionPool(users)
+  print("Running scenario '{}' by {} users{}...".format(
+    scenario.name, users, " at {:g} req/s".format(rate) if rate else ""))
+  outcomes = run_scenario(scenario, duration, warmup, rate, users)
+  levels = scenario_stats(scenario, outcomes, rate, duration)
+  print(format_levels_table(levels))
+  with open(options["--output"], "w") as json_file:
+    json.dump({
+      "app_id": options["--app"],
+      "lang": options["--lang"],
+      "mode": "scenario",
+      "scenario": scenario.name,
+      "rate": rate,
+      "users": users,
+      "levels": levels,
+    }, json_file, indent=2, sort_keys=True)
+  exit(0)
+
+
+if __name__ == "__main__":
+  import docopt
+  options = docopt.docopt(__doc__)
+  try:
+    max_concurrency = int(options["--max-concurrency"])
+    duration = float(options["--duration"])
+    warmup = float(options["--warmup"])
+    float(options["--timeout"])
+    rate = float(options["--rate"]) if options["--rate"] else None
+    processes = int(options["--processes"])
+    slo = SLO(float(options["--slo-percentile"]),
+              float(options["--slo-latency"]) / 1000,
+              float(options["--slo-errors"]) / 100)
+    start_rate = float(options["--start-rate"])
+    max_rate = float(options["--max-rate"])
+    ramp_factor = float(options["--ramp-factor"])
+    refine_steps = int(options["--refine-steps"])
+  except ValueError:
+    print("Numeric options must be numbers")
+    exit(1)
+  if ramp_factor <= 1:
+    print("--ramp-factor must be greater than 1")
+    exit(1)
+  if not 0 < start_rate <= max_rate:
+    print("--start-rate must be positive and not greater than --max-rate")
+    exit(1)
+  if rate is not None and rate <= 0:
+    print("--rate must be positive")
+    exit(1)
+  if duration <= 0:
+    print("--duration must be positive")
+    exit(1)
+  if processes < 1:
+    print("--processes must be at least 1")
+    exit(1)
+  if max_concurrency < 1:
+    print("--max-concurrency must be at least 1")
+    exit(1)
+
+  if options["--scenario"]:
+    run_scenario_and_exit(options, rate, duration, warmup, max_concurrency)
+
+  endpoint = build_endpoint(options, max_concurrency)
+  levels = []
+  capacity = None
+  if options["--find-saturation"]:
+    levels, capacity = find_saturation(
+      endpoint, slo, start_rate, max_rate, ramp_factor, refine_steps,
+      duration, warmup, max_concurrency, options["--poisson"], processes)
+    levels.sort(key=lambda level: level["rate"])
+  elif rate:
+    print("Sending {:g} req/s in open loop...".format(rate))
+    outcome = run_open_loop_processes(
+      endpoint, rate, duration, warmup, max_concurrency, options["--poisson"],
+      processes)
+    levels.append(open_loop_stats(rate, outcome, duration))
+  else:
+    for concurrency in concurrency_levels(max_concurrency):
+      print("Running {} closed-loop workers...".format(concurrency))
+      levels.append(
+        run_closed_loop_level(endpoint, concurrency, duration, warmup))
+  print(format_levels_table(levels))
+
+  open_loop = bool(rate or capacity)
+  results = {
+    "app_id": options["--app"],
+    "lang": options["--lang"],
+    "endpoint": endpoint.describe(),
+    "mode": "open-loop" if open_loop else "closed-loop",
+    "poisson": open_loop and options["--poisson"],
+    "processes": processes if open_loop else 1,
+    "levels": levels,
+  }
+  with open(options["--output"], "w") as json_file:
+    json.dump(results, json_file, indent=2, sort_keys=True)
+
+  if capacity:
+    api = options["--api"] or endpoint_template(
+      options["--path"].replace("/{lang}", ""))
+    print("Max sustainable rate: {:.1f} req/s (bounds: {:.1f} - {}), "
+          "throughput at it: {:.1f} req/s"
+          .format(capacity["max_sustainable_rate"],
+                  capacity["lower_bound"],
+                  "{:.1f}".format(capacity["upper_bound"])
+                  if capacity["upper_bound"] else "not reached",
+                  capacity["max_sustainable_throughput"]))
+    if not os.path.exists(options["--capacity-dir"]):
+      os.makedirs(options["--capacity-dir"])
+    capacity_file = capacity_file_name(
+      options["--capacity-dir"], api, options["--lang"], options["--release"])
+    results.update(capacity)
+    results.update({"api": api, "release": options["--release"],
+                    "time": time.time()})
+    with open(capacity_file, "w") as json_file:
+      json.dump(results, json_file, indent=2, sort_keys=True)
+    print("Capacity is saved to {}".format(capacity_file))
@@ -0,0 +1,334 @@
+#!/usr/bin/python2.7
+"""hawkeye_history.py: Explore history of hawkeye runs.
+
+Every hawkeye.py run is appended to a local SQLite database
+(see --history-db option of hawkeye.py). This command reports
+the slowest tests, tests which duration regressed against their rolling
+median and tests which status flips between runs. It also exports median
+durations of tests which shards of hawkeye.py are balanced by
+(see --durations-file option of hawkeye.py).
+
+Usage:
+  hawkeye_history.py slowest [options]
+  hawkeye_history.py regressions [options]
+  hawkeye_history.py flaky [options]
+  hawkeye_history.py durations --output FILE [options]
+  hawkeye_history.py (-h | --help)
+
+Options:
+  -h, --help           # show this help message and exit
+  --db=FILE            # History database [default: hawkeye_history.sqlite]
+  -l LANG --lang=LANG  # Language binding to report on [default: python]
+  --app=APP_ID         # Report only on runs against this application
+  --window=N           # Number of recent runs to analyze [default: 10]
+  --limit=N            # Max number of tests to list [default: 20]
+  --threshold=RATIO    # Duration is regressed if it exceeds rolling median
+                       # by this ratio [default: 1.5]
+  --min-delta=SECONDS  # Ignore regressions smaller than this [default: 0.5]
+  --output=FILE        # JSON file to save median durations of tests to
+"""
+import hashlib
+import json
+import sqlite3
+from collections import namedtuple
+
+DEFAULT_HISTORY_DB = "hawkeye_history.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  language TEXT NOT NULL,
+  app_id TEXT,
+  versions_hash TEXT,
+  started REAL NOT NULL,
+  finished REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS test_results (
+  run_id INTEGER NOT NULL REFERENCES runs(id),
+  test_id TEXT NOT NULL,
+  status TEXT NOT NULL,
+  duration REAL
+);
+CREATE INDEX IF NOT EXISTS test_results_by_test
+  ON test_results (test_id, run_id);
+CREATE TABLE IF NOT EXISTS endpoint_timings (
+  run_id INTEGER NOT NULL REFERENCES runs(id),
+  endpoint TEXT NOT NULL,
+  requests INTEGER NOT NULL,
+  errors INTEGER NOT NULL,
+  wall_p50 REAL,
+  wall_p90 REAL,
+  wall_p99 REAL,
+  wall_max REAL
+);
+"""
+
+RunInfo = namedtuple("RunInfo", [
+  "language",        # language binding which was tested
+  "app_id",          # application ID
+  "versions_hash",   # sha1 of versions CSV file
+  "started",         # unix timestamp of run start
+  "finished",        # unix timestamp of run end
+])
+
+TestDuration = namedtuple("TestDuration", [
+  "test_id", "median", "latest", "runs"
+])
+
+StatusFlips = namedtuple("StatusFlips", [
+  "test_id", "flips", "statuses"
+])
+
+
+def file_hash(file_name):
+  """
+  Computes sha1 of file content (e.g. versions CSV).
+
+  Args:
+    file_name: A string - path to file.
+  Returns:
+    A hex string.
+  """
+  with open(file_name, "rb") as hashed_file:
+    return hashlib.sha1(hashed_file.read()).hexdigest()
+
+
+def median(values):
+  """
+  Args:
+    values: A non-empty list of numbers.
+  Returns:
+    A median of values.
+  """
+  values = sorted(values)
+  middle = len(values) // 2
+  if len(values) % 2:
+    return values[middle]
+  return (values[middle - 1] + values[middle]) / 2.0
+
+
+class HistoryDatabase(object):
+  """
+  SQLite database with results and timings of hawkeye runs.
+  """
+
+  def __init__(self, file_name=DEFAULT_HISTORY_DB):
+    """
+    Args:
+      file_name: A string - path to SQLite database (created if missing).
+    """
+    self._connection = sqlite3.connect(file_name)
+    self._connection.executescript(SCHEMA)
+
+  def close(self):
+    self._connection.close()
+
+  def record_run(self, run_info, report_dict, durations, timings_summary):
+    """
+    Appends run to history.
+
+    Args:
+      run_info: A RunInfo object.
+      report_dict: A dict with statuses of tests (<test_id>: <status>).
+      durations: A dict with durations of tests (<test_id>: <seconds>).
+      timings_summary: A dict returned by RequestTimings.summary().
+    Returns:
+      An integer - ID of recorded run.
+    """
+    with self._connection:
+      cursor = self._connection.execute(
+        "INSERT INTO runs (language, app_id, versions_hash, started, finished) "
+        "VALUES (?, ?, ?, ?, ?)", run_info)
+      run_id = cursor.lastrowid
+      self._connection.executemany(
+        "INSERT INTO test_results (run_id, test_id, status, duration) "
+        "VALUES (?, ?, ?, ?)",
+        [(run_id, test_id, status, durations.get(test_id))
+         for test_id, status in report_dict.iteritems()])
+      endpoint_rows = []
+      for endpoint, stats in timings_summary["endpoints"].iteritems():
+        wall_time = stats["wall_time"] or {}
+        endpoint_rows.append((
+          run_id, endpoint, stats["count"], stats["errors"],
+          wall_time.get("p50"), wall_time.get("p90"), wall_time.get("p99"),
+          wall_time.get("max")
+        ))
+      self._connection.executemany(
+        "INSERT INTO endpoint_timings (run_id, endpoint, requests, errors, "
+        "wall_p50, wall_p90, wall_p99, wall_max) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", endpoint_rows)
+    return run_id
+
+  def recent_runs(self, language, window, app_id=None):
+    """
+    Args:
+      language: A string - language binding.
+      window: An integer - max number of runs to return.
+      app_id: A string - application ID or None to consider all runs.
+    Returns:
+      A list of run IDs ordered from oldest to latest.
+    """
+    query = "SELECT id FROM runs WHERE language = ?"
+    args = [language]
+    if app_id:
+      query += " AND app_id = ?"
+      args.append(app_id)
+    query += " ORDER BY id DESC LIMIT ?"
+    args.append(window)
+    return sorted(row[0] for row in self._connection.execute(query, args))
+
+  def _results_by_test(self, run_ids):
+    """
+    Returns:
+      A dict {test_id: [(run_id, status, duration), ...]} ordered by run.
+    """
+    if not run_ids:
+      return {}
+    placeholders = ", ".join("?" * len(run_ids))
+    rows = self._connection.execute(
+      "SELECT test_id, run_id, status, duration FROM test_results "
+      "WHERE run_id IN ({}) ORDER BY run_id".format(placeholders), run_ids)
+    results = {}
+    for test_id, run_id, status, duration in rows:
+      results.setdefault(test_id, []).append((run_id, status, duration))
+    return results
+
+  def median_durations(self, run_ids):
+    """
+    Computes median duration of every test across runs.
+
+    Args:
+      run_ids: A list of run IDs to analyze.
+    Returns:
+      A dict {test_id: median duration in seconds}.
+    """
+    medians = {}
+    for test_id, results in self._results_by_test(run_ids).iteritems():
+      durations = [duration for _, _, duration in results
+                   if duration is not None]
+      if durations:
+        medians[test_id] = median(durations)
+    return medians
+
+  def slowest_tests(self, run_ids, limit):
+    """
+    Lists tests with the greatest median duration across runs.
+
+    Args:
+      run_ids: A list of run IDs to analyze.
+      limit: An integer - max number of tests to return.
+    Returns:
+      A list of TestDuration.
+    """
+    slowest = []
+    for test_id, results in self._results_by_test(run_ids).iteritems():
+      durations = [duration for _, _, duration in results
+                   if duration is not None]
+      if durations:
+        slowest.append(TestDuration(test_id, median(durations), durations[-1],
+                                    len(durations)))
+    slowest.sort(key=lambda item: item.median, reverse=True)
+    return slowest[:limit]
+
+  def duration_regressions(self, run_ids, threshold, min_delta):
+    """
+    Lists tests which duration in the latest run exceeds median of
+    their durations in previous runs.
+
+    Args:
+      run_ids: A list of run IDs to analyze (the last one is the latest).
+      threshold: A float - ratio to median which is considered a regression.
+      min_delta: A float - min difference (in seconds) to median
+        which is considered a regression.
+    Returns:
+      A list of TestDuration ordered by regression ratio.
+    """
+    if not run_ids:
+      return []
+    latest_run = run_ids[-1]
+    regressions = []
+    for test_id, results in self._results_by_test(run_ids).iteritems():
+      previous = [duration for run_id, _, duration in results
+                  if run_id != latest_run and duration is not None]
+      latest = [duration for run_id, _, duration in results
+                if run_id == latest_run and duration is not None]
+      if not previous or not latest:
+        continue
+      rolling_median = median(previous)
+      if (latest[0] > rolling_median * threshold and
+          latest[0] - rolling_median > min_delta):
+        regressions.append(TestDuration(test_id, rolling_median, latest[0],
+                                        len(previous) + 1))
+    regressions.sort(key=lambda item: item.latest / max(item.median, 1e-3),
+                     reverse=True)
+    return regressions
+
+  def status_flips(self, run_ids):
+    """
+    Lists tests which status changed between consecutive runs.
+
+    Args:
+      run_ids: A list of run IDs to analyze.
+    Returns:
+      A list of StatusFlips ordered by number of flips.
+    """
+    flaky = []
+    for test_id, results in self._results_by_test(run_ids).iteritems():
+      statuses = [status for _, status, _ in results]
+      flips = sum(1 for previous, current in zip(statuses, statuses[1:])
+                  if previous != current)
+      if flips:
+        flaky.append(StatusFlips(test_id, flips, statuses))
+    flaky.sort(key=lambda item: (-item.flips, item.test_id))
+    return flaky
+
+
+def print_durations(title, durations):
+  print(title)
+  for item in durations:
+    print("  {median:8.2f}s median {latest:8.2f}s latest ({runs} runs)  {test}"
+          .format(median=item.median, latest=item.latest, runs=item.runs,
+                  test=item.test_id))
+
+
+def print_flips(flips):
+  print("Tests which status flipped between runs:")
+  for item in flips:
+    print("  {flips:3} flips  {test}  [{statuses}]"
+          .format(flips=item.flips, test=item.test_id,
+                  statuses=" ".join(item.statuses)))
+
+
+if __name__ == "__main__":
+  import docopt
+  options = docopt.docopt(__doc__)
+  try:
+    window = int(options["--window"])
+    limit = int(options["--limit"])
+    threshold = float(options["--threshold"])
+    min_delta = float(options["--min-delta"])
+  except ValueError:
+    print("--window, --limit, --threshold and --min-delta must be numbers")
+    exit(1)
+
+  history = HistoryDatabase(options["--db"])
+  runs = history.recent_runs(options["--lang"], window, options["--app"])
+  if not runs:
+    print("No runs recorded for '{}'".format(options["--lang"]))
+  elif options["slowest"]:
+    print_durations("Slowest tests (last {} runs):".format(len(runs)),
+                    history.slowest_tests(runs, limit))
+  elif options["regressions"]:
+    print_durations(
+      "Tests slower than their rolling median (last {} runs):"
+      .format(len(runs)),
+      history.duration_regressions(runs, threshold, min_delta)[:limit])
+  elif options["flaky"]:
+    print_flips(history.status_flips(runs)[:limit])
+  elif options["durations"]:
+    with open(options["--output"], "w") as durations_file:
+      json.dump(history.median_durations(runs), durations_file, indent=2,
+                sort_keys=True)
+    print("Median durations of tests (last {} runs) are saved to {}"
+          .format(len(runs), options["--output"]))
+  history.close()
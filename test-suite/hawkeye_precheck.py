@@ -0,0 +1,120 @@
+"""
+Health precheck of app versions which is run before suites start.
+Every version is probed over HTTP and HTTPS concurrently, so a broken
+deployment is detected in seconds instead of suites spending their
+polling deadlines on modules which are down.
+"""
+from collections import namedtuple
+
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+VersionProbe = namedtuple("VersionProbe", [
+  "module",     # module name
+  "version",    # version name
+  "scheme",     # "http" or "https"
+  "url",        # probed base URL
+  "reachable",  # whether version responded with non-5xx status
+  "status",     # HTTP status or None if request failed
+  "ttfb",       # seconds until response headers were received (or None)
+  "error",      # error summary if request failed (or None)
+])
+
+# Max number of versions probed at the same time
+PRECHECK_CONCURRENCY = 16
+
+
+def probe_url(module, version, scheme, url, timeout):
+  """
+  Sends GET request to base URL of version and measures first-byte latency.
+  Any response except 5xx (e.g. 404 for missing handler of "/") means
+  the version is up.
+
+  Args:
+    module: A string - module name.
+    version: A string - version name.
+    scheme: A string - "http" or "https".
+    url: A string - base URL of version.
+    timeout: A number - connect and read timeout in seconds.
+  Returns:
+    A VersionProbe object.
+  """
+  try:
+    # Body isn't needed, so it's not downloaded
+    response = requests.get(url, timeout=timeout, verify=False,
+                            allow_redirects=False, stream=True)
+    response.close()
+  except requests.RequestException as err:
+    return VersionProbe(module, version, scheme, url, False, None, None,
+                        "{}: {}".format(type(err).__name__, err))
+  return VersionProbe(module, version, scheme, url,
+                      response.status_code < 500, response.status_code,
+                      response.elapsed.total_seconds(), None)
+
+
+def precheck_versions(app_versions, timeout):
+  """
+  Probes every version over HTTP and HTTPS concurrently.
+
+  Args:
+    app_versions: A list of AppVersion objects.
+    timeout: A number - timeout of every probe in seconds.
+  Returns:
+    A list of VersionProbe objects ordered by module, version and scheme.
+  """
+  unique_versions = {version.full_name: version for version in app_versions}
+  targets = []
+  for version in unique_versions.values():
+    targets.append((version.module, version.version, "http",
+                    version.http_url))
+    targets.append((version.module, version.version, "https",
+                    version.https_url))
+  if not targets:
+    return []
+  executor = ThreadPoolExecutor(min(len(targets), PRECHECK_CONCURRENCY))
+  try:
+    futures = [executor.submit(probe_url, module, version, scheme, url,
+                               timeout)
+               for module, version, scheme, url in targets]
+    probes = [future.result() for future in futures]
+  finally:
+    executor.shutdown()
+  return sorted(probes, key=lambda probe: probe[:3])
+
+
+def unreachable_modules(app_versions, probes):
+  """
+  Determines modules which default version didn't respond
+  neither over HTTP nor over HTTPS.
+
+  Args:
+    app_versions: A list of AppVersion objects.
+    probes: A list of VersionProbe objects.
+  Returns:
+    A set of module names.
+  """
+  reachable = {(probe.module, probe.version)
+               for probe in probes if probe.reachable}
+  return {
+    version.module for version in app_versions
+    if version.is_default_for_module
+    and (version.module, version.version) not in reachable
+  }
+
+
+def format_probes_table(probes):
+  """
+  Args:
+    probes: A list of VersionProbe objects.
+  Returns:
+    A string - table with reachability and first-byte latency of versions.
+  """
+  rows = ["{:<20} {:<12} {:<6} {:>6} {:>9}  {}".format(
+    "module", "version", "scheme", "status", "ttfb ms", "error")]
+  for probe in probes:
+    rows.append("{:<20} {:<12} {:<6} {:>6} {:>9}  {}".format(
+      probe.module[:20], probe.version[:12], probe.scheme,
+      probe.status or "-",
+      "{:.1f}".format(probe.ttfb * 1000) if probe.ttfb is not None else "-",
+      (probe.error or "")[:80]))
+  return "\n".join(rows)
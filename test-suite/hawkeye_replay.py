@@ -0,0 +1,338 @@
+#!/usr/bin/python2.7
+"""hawkeye_replay.py: Replay traffic captured by hawkeye.py.
+
+Requests captured by `hawkeye.py --capture-file FILE` are replayed against
+a deployment with original timing scaled by --speed (e.g. 10 replays ten
+times faster). Requests are sent in open loop: every request is scheduled
+at its scaled original time and latency is measured from that time, so
+queueing delay isn't hidden if deployment can't keep up.
+Latency profile of replay is compared with the original run per endpoint.
+
+Usage:
+  hawkeye_replay.py --capture FILE --app APP_ID --versions-csv FILE [options]
+  hawkeye_replay.py (-h | --help)
+
+Options:
+  -h, --help             # show this help message and exit
+  --capture=FILE         # Traffic captured by hawkeye.py --capture-file
+  --app=APP_ID           # Application ID to replay traffic against
+  --versions-csv FILE    # File containing http and https URL to app versions
+  -l LANG --lang=LANG    # Language binding which traffic to replay [default: python]
+  --speed=X              # Replay speed relative to original timing [default: 1]
+  --concurrency=N        # Max number of requests in flight [default: 32]
+  --timeout=SECONDS      # Request timeout [default: 30]
+  --output=FILE          # JSON file to save comparison to [default: hawkeye_replay.json]
+"""
+import base64
+import json
+import threading
+import time
+from collections import namedtuple
+
+from concurrent.futures import ThreadPoolExecutor
+
+import hawkeye_utils
+from application import Application, AppURLBuilder, UnknownVersion
+from application_versions import read_versions_csv
+from hawkeye_bench import LatencyHistogram, LatencyRecorder
+from hawkeye_utils import endpoint_template, hawkeye_request
+
+CapturedRequest = namedtuple("CapturedRequest", [
+  "started",     # timestamp when request was sent originally
+  "method",      # HTTP method
+  "module",      # module of app version which received request
+  "version",     # version name
+  "https",       # whether HTTPS was used
+  "path",        # path with query string
+  "headers",     # dict with request headers
+  "body",        # str body or None
+  "status",      # original response status
+  "wall_time",   # original latency in seconds
+])
+
+# Headers which are set for target deployment by requests lib
+_REPLACED_HEADERS = {"host", "content-length", "connection"}
+
+
+def _find_version(url, versions):
+  """
+  Finds version which base URL is the longest prefix of url.
+
+  Args:
+    url: A string - captured URL.
+    versions: A list of dicts captured by hawkeye.py (module, version,
+      http_url, https_url).
+  Returns:
+    A tuple (version dict, https, path) or None if URL doesn't
+    belong to any version.
+  """
+  best = None
+  for version in versions:
+    for https, base_url in ((False, version["http_url"]),
+                            (True, version["https_url"])):
+      base_url = base_url.rstrip("/")
+      if not url.startswith(base_url):
+        continue
+      path = url[len(base_url):]
+      if path and not path.startswith(("/", "?")):
+        continue
+      if best is None or len(base_url) > best[0]:
+        best = (len(base_url), version, https, path or "/")
+  if best is None:
+    return None
+  return best[1:]
+
+
+def load_trace(file_name, language):
+  """
+  Reads requests captured for language binding.
+
+  Args:
+    file_name: A string - path to capture file.
+    language: A string - language binding.
+  Returns:
+    A tuple (trace, skipped): list of CapturedRequest ordered by
+    original send time and number of requests which can't be replayed
+    (unknown version or body which wasn't captured).
+  """
+  versions = []
+  trace = []
+  skipped = 0
+  with open(file_name) as capture_file:
+    records = [json.loads(line) for line in capture_file if line.strip()]
+  for record in records:
+    if record.get("language") == language and record["event"] == "versions":
+      versions.extend(record["versions"])
+  for record in records:
+    if record.get("language") != language or record["event"] != "request":
+      continue
+    found = _find_version(record["url"], versions)
+    if found is None or record.get("body_omitted"):
+      skipped += 1
+      continue
+    version, https, path = found
+    if "body_base64" in record:
+      body = base64.b64decode(record["body_base64"])
+    elif record.get("body") is not None:
+      body = record["body"].encode("utf-8")
+    else:
+      body = None
+    headers = {name: value for name, value in record["headers"].iteritems()
+               if name.lower() not in _REPLACED_HEADERS}
+    trace.append(CapturedRequest(
+      record["started"], record["method"], version["module"],
+      version["version"], https, path, headers, body, record["status"],
+      record["wall_time"]))
+  trace.sort(key=lambda request: request.started)
+  return trace, skipped
+
+
+class TraceReplay(object):
+  """
+  Replays trace against application keeping scaled original timing.
+  """
+
+  def __init__(self, app, trace, speed=1.0, concurrency=32, timeout=None):
+    """
+    Args:
+      app: An Application object of target deployment.
+      trace: A list of CapturedRequest ordered by send time.
+      speed: A number - replay speed relative to original timing.
+      concurrency: An integer - max number of requests in flight.
+      timeout: A number - request timeout in seconds.
+    """
+    self.app = app
+    self.trace = trace
+    self.speed = speed
+    self.concurrency = concurrency
+    self.timeout = timeout
+    self.recorders = {
+      endpoint_template(request.path): LatencyRecorder() for request in trace
+    }
+    self.status_mismatches = 0
+    self._lock = threading.Lock()
+    self._base_urls = {}
+
+  def base_url(self, request):
+    """
+    Returns:
+      A string - base URL of request version in target deployment.
+    Raises:
+      UnknownVersion: if deployment doesn't have the version.
+    """
+    key = (request.module, request.version, request.https)
+    if key not in self._base_urls:
+      self._base_urls[key] = self.app.build_url(
+        "/", request.module, request.version, request.https).rstrip("/")
+    return self._base_urls[key]
+
+  def run(self):
+    """
+    Sends every request of the trace at its scaled time.
+
+    Returns:
+      A dict {endpoint: LatencyRecorder} with replay latencies.
+    """
+    first_started = self.trace[0].started
+    replay_started = time.time()
+    executor = ThreadPoolExecutor(self.concurrency)
+    try:
+      for request in self.trace:
+        intended = (replay_started +
+                    (request.started - first_started) / self.speed)
+        delay = intended - time.time()
+        if delay > 0:
+          time.sleep(delay)
+        executor.submit(self._send, request, intended)
+    finally:
+      executor.shutdown(wait=True)
+      hawkeye_utils.request_timings.drain()
+    return self.recorders
+
+  def _send(self, request, intended):
+    send_lag = time.time() - intended
+    status = None
+    try:
+      status = hawkeye_request(
+        request.method, self.base_url(request) + request.path,
+        headers=request.headers, data=request.body, verbosity=0,
+        timeout=self.timeout
+      ).status_code
+    except Exception:
+      pass
+    latency = time.time() - intended
+    recorder = self.recorders[endpoint_template(request.path)]
+    recorder.add(latency, status is None or status >= 500, send_lag)
+    if status != request.status:
+      with self._lock:
+        self.status_mismatches += 1
+
+
+def original_profile(trace):
+  """
+  Args:
+    trace: A list of CapturedRequest.
+  Returns:
+    A dict {endpoint: LatencyHistogram} of original latencies.
+  """
+  profile = {}
+  for request in trace:
+    endpoint = endpoint_template(request.path)
+    profile.setdefault(endpoint, LatencyHistogram()).record(request.wall_time)
+  return profile
+
+
+def compare_profiles(original, replayed):
+  """
+  Compares latency percentiles of original run and replay.
+
+  Args:
+    original: A dict {endpoint: LatencyHistogram}.
+    replayed: A dict {endpoint: LatencyRecorder}.
+  Returns:
+    A list of dicts (one per endpoint and "total" as the last one)
+    with original and replay distributions (in ms) and errors.
+  """
+  comparison = []
+  total_original = LatencyHistogram()
+  total_replayed = LatencyRecorder()
+  for endpoint in sorted(original):
+    recorder = replayed.get(endpoint, LatencyRecorder())
+    total_original.merge(original[endpoint])
+    total_replayed.histogram.merge(recorder.histogram)
+    total_replayed.errors += recorder.errors
+    comparison.append(
+      _compare_endpoint(endpoint, original[endpoint], recorder))
+  comparison.append(_compare_endpoint("total", total_original, total_replayed))
+  return comparison
+
+
+def _compare_endpoint(endpoint, original, recorder):
+  def to_ms(distribution):
+    return {key: value * 1000
+            for key, value in (distribution or {}).iteritems()}
+  return {
+    "endpoint": endpoint,
+    "requests": original.count,
+    "replay_errors": recorder.errors,
+    "original_ms": to_ms(original.distribution()),
+    "replay_ms": to_ms(recorder.histogram.distribution()),
+  }
+
+
+def format_comparison_table(comparison):
+  """
+  Args:
+    comparison: A list of dicts returned by compare_profiles.
+  Returns:
+    A string - table with original and replay percentiles of every endpoint.
+  """
+  rows = ["{:<48} {:>8} {:>7} {:>10} {:>10} {:>10} {:>10}".format(
+    "endpoint", "requests", "errors", "orig p50", "replay p50",
+    "orig p99", "replay p99")]
+  for item in comparison:
+    rows.append(
+      "{:<48} {:>8} {:>7} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+        item["endpoint"][:48], item["requests"], item["replay_errors"],
+        item["original_ms"].get("p50", 0), item["replay_ms"].get("p50", 0),
+        item["original_ms"].get("p99", 0), item["replay_ms"].get("p99", 0)))
+  return "\n".join(rows)
+
+
+if __name__ == "__main__":
+  import docopt
+  options = docopt.docopt(__doc__)
+  try:
+    speed = float(options["--speed"])
+    concurrency = int(options["--concurrency"])
+    timeout = float(options["--timeout"])
+  except ValueError:
+    print("--speed, --concurrency and --timeout must be numbers")
+    exit(1)
+  if speed <= 0:
+    print("--speed must be positive")
+    exit(1)
+
+  trace, skipped = load_trace(options["--capture"], options["--lang"])
+  if not trace:
+    print("No replayable requests of '{}' in {}"
+          .format(options["--lang"], options["--capture"]))
+    exit(1)
+  versions = read_versions_csv(options["--app"], options["--versions-csv"])
+  app = Application(options["--app"],
+                    AppURLBuilder(versions, options["--lang"]))
+  hawkeye_utils.session_pool = hawkeye_utils.SessionPool(concurrency)
+  replay = TraceReplay(app, trace, speed, concurrency, timeout)
+  try:
+    # Fail fast if target deployment lacks some of captured versions
+    for request in trace:
+      replay.base_url(request)
+  except UnknownVersion as error:
+    print(error)
+    exit(1)
+
+  original_duration = trace[-1].started - trace[0].started
+  print("Replaying {count} requests ({skipped} skipped) captured in {secs:.1f}s "
+        "at {speed:g}x speed...".format(count=len(trace), skipped=skipped,
+                                        secs=original_duration, speed=speed))
+  started = time.time()
+  replayed = replay.run()
+  comparison = compare_profiles(original_profile(trace), replayed)
+  print(format_comparison_table(comparison))
+  print("Responses with status different from original: {}"
+        .format(replay.status_mismatches))
+
+  with open(options["--output"], "w") as json_file:
+    json.dump({
+      "app_id": options["--app"],
+      "lang": options["--lang"],
+      "capture": options["--capture"],
+      "speed": speed,
+      "concurrency": concurrency,
+      "requests": len(trace),
+      "skipped": skipped,
+      "status_mismatches": replay.status_mismatches,
+      "original_duration": original_duration,
+      "replay_duration": time.time() - started,
+      "endpoints": comparison,
+    }, json_file, indent=2, sort_keys=True)
@@ -1,9 +1,18 @@
 import csv
+import functools
 import inspect
 import json
+import multiprocessing
+import random
 import sys
+import threading
+import time
 import traceback
 import unittest
+from collections import namedtuple
+from StringIO import StringIO
+
+from concurrent.futures import ThreadPoolExecutor
 
 # We want to proceed nicely on systems that don't have termcolor installed.
 try:
@@ -21,15 +30,94 @@ except ImportError:
     """
     print(msg)
 
-from hawkeye_utils import logger, ResponseInfo
+import hawkeye_utils
+from hawkeye_utils import logger, ResponseInfo, ConditionTiming
+
+
+Backoff = namedtuple("Backoff", [
+  "initial",   # delay (in seconds) after the first failed check
+  "maximum",   # max delay between checks
+  "factor",    # multiplier of delay after every failed check
+  "jitter",    # max random fraction added to or removed from delay
+])
+
+DEFAULT_BACKOFF = Backoff(initial=0.1, maximum=2.0, factor=2.0, jitter=0.2)
+
+
+class TestTimeout(Exception):
+  """
+  Reported as error of test which didn't finish in its budget.
+  """
+  pass
+
+
+class ConditionTimeout(AssertionError):
+  """
+  Raised when condition passed to wait_until is not met before deadline.
+  It's an AssertionError, so test which waited is reported as failed.
+  """
+  pass
+
+
+def wait_until(predicate, timeout, message, backoff=DEFAULT_BACKOFF):
+  """
+  Calls predicate until it returns truthy value, sleeping between calls
+  with exponential backoff and jitter. Time it took for the condition to
+  become true is recorded to hawkeye_utils.request_timings.
+
+  Args:
+    predicate: A callable without arguments. Exceptions raised by predicate
+      (e.g. failed assertions) are not caught.
+    timeout: A number - max number of seconds to wait.
+    message: A string - short description of condition (e.g.
+      "memcache key expired"). Used in error message and timings report.
+    backoff: A Backoff object.
+  Returns:
+    The truthy value returned by predicate.
+  Raises:
+    ConditionTimeout: if condition is not met in timeout seconds.
+  """
+  started = time.time()
+  deadline = started + timeout
+  delay = backoff.initial
+  attempts = 0
+  while True:
+    attempts += 1
+    value = predicate()
+    now = time.time()
+    if value:
+      hawkeye_utils.request_timings.add(ConditionTiming(
+        hawkeye_utils.get_current_test(), message, now - started, attempts,
+        satisfied=True))
+      return value
+    if now >= deadline:
+      hawkeye_utils.request_timings.add(ConditionTiming(
+        hawkeye_utils.get_current_test(), message, now - started, attempts,
+        satisfied=False))
+      raise ConditionTimeout(
+        "Condition '{message}' was not met in {timeout}s ({attempts} checks). "
+        "Last value: {value!r}".format(message=message, timeout=timeout,
+                                       attempts=attempts, value=value))
+    jittered = delay * (1 + random.uniform(-backoff.jitter, backoff.jitter))
+    time.sleep(max(0, min(jittered, deadline - now)))
+    delay = min(delay * backoff.factor, backoff.maximum)
 
 
 class HawkeyeTestCase(unittest.TestCase):
   """
   Extension of unittest.TestCase. It has `app` attribute for easy access to the
   tested application.
+
+  Test classes which share no state with other tests of the suite can set
+  CONCURRENCY_SAFE to True, so they are run concurrently with other tests
+  when suite is run with multiple threads. Concurrency safe classes which
+  still share something with each other (e.g. entity kind) should set
+  the same CONCURRENCY_KEY, so they are run one after another.
   """
 
+  CONCURRENCY_SAFE = False
+  CONCURRENCY_KEY = None
+
   def __init__(self, methodName, application):
     """
     Args:
@@ -39,6 +127,20 @@ class HawkeyeTestCase(unittest.TestCase):
     super(HawkeyeTestCase, self).__init__(methodName)
     self.app = application
 
+  def wait_until(self, predicate, timeout, message, backoff=DEFAULT_BACKOFF):
+    """
+    Waits until predicate returns truthy value. See module-level wait_until.
+
+    Args:
+      predicate: A callable without arguments.
+      timeout: A number - max number of seconds to wait.
+      message: A string - short description of condition.
+      backoff: A Backoff object.
+    Returns:
+      The truthy value returned by predicate.
+    """
+    return wait_until(predicate, timeout, message, backoff)
+
   @classmethod
   def all_cases(cls, app):
     """
@@ -67,7 +169,8 @@ class HawkeyeTestSuite(unittest.TestSuite):
   Usual TestSuite but with name and short_name which are used by hawkeye
   """
 
-  def __init__(self, name, short_name, **kwargs):
+  def __init__(self, name, short_name, serial_group=None,
+               required_modules=("default",), **kwargs):
     """
     Args:
       name: A descriptive name for the test suite.
@@ -75,11 +178,155 @@ class HawkeyeTestSuite(unittest.TestSuite):
         Should be ideally just one word. This short name is used to name
         log files and other command line options related to this
         test suite.
+      serial_group: A string naming state shared with other suites
+        (e.g. datastore kinds or task queues). Suites with the same
+        serial_group are never run in parallel with each other.
+      required_modules: A tuple of names of app modules tests send
+        requests to. Suite is skipped if any of them is unreachable.
       kwargs: keyword arguments to be passed to super __init__.
     """
     super(HawkeyeTestSuite, self).__init__(**kwargs)
     self.name = name
     self.short_name = short_name
+    self.serial_group = serial_group
+    self.required_modules = required_modules
+    self.threads = 1
+
+  def run(self, result, debug=False):
+    """
+    Runs tests of the suite. If self.threads is greater than 1,
+    concurrency safe test cases are run in thread pool concurrently with
+    lane of regular test cases which are still run one after another.
+    If result has test or suite budget, every test case is run under
+    watchdog of result (see HawkeyeTestResult.run_test) and only class
+    fixtures are handled (module fixtures are supported only by usual
+    TestSuite.run which is used without budgets).
+
+    Args:
+      result: A HawkeyeTestResult object.
+      debug: A boolean - passed to TestSuite.run.
+    Returns:
+      The result object.
+    """
+    if debug:
+      return super(HawkeyeTestSuite, self).run(result, debug)
+    if self.threads < 2 and not result.has_budget():
+      return super(HawkeyeTestSuite, self).run(result)
+    if self.threads < 2:
+      _run_cases(list(iter_cases(self)), result)
+      return result
+
+    lanes = group_cases_to_lanes(self)
+    executor = ThreadPoolExecutor(self.threads)
+    try:
+      futures = [executor.submit(_run_cases, lane, result) for lane in lanes]
+      for future in futures:
+        future.result()
+    finally:
+      executor.shutdown()
+    return result
+
+
+def _run_cases(test_cases, result):
+  """
+  Runs test cases one after another until result asks to stop.
+  setUpClass and tearDownClass are called around every sequence of
+  test cases of the same class. Test cases of class which setUpClass
+  failed aren't run.
+
+  Args:
+    test_cases: A list of TestCase objects.
+    result: A HawkeyeTestResult object.
+  """
+  # Class fixtures of a lane are run in thread of the lane
+  if result.suite_short_name:
+    hawkeye_utils.set_current_suite(result.suite_short_name)
+  current_class = None
+  class_ready = False
+  for test in test_cases:
+    if result.shouldStop:
+      break
+    if type(test) is not current_class:
+      if class_ready:
+        _call_class_fixture(current_class, "tearDownClass", result)
+      current_class = type(test)
+      class_ready = _call_class_fixture(current_class, "setUpClass", result)
+    if class_ready:
+      result.run_test(test)
+  if class_ready:
+    _call_class_fixture(current_class, "tearDownClass", result)
+
+
+def _call_class_fixture(test_class, fixture_name, result):
+  """
+  Calls class fixture and reports its error like TestSuite.run does.
+
+  Args:
+    test_class: A TestCase subclass.
+    fixture_name: A string - "setUpClass" or "tearDownClass".
+    result: A HawkeyeTestResult object.
+  Returns:
+    A boolean - whether fixture succeeded (or there is nothing to call).
+  """
+  fixture = getattr(test_class, fixture_name, None)
+  if fixture is None or getattr(test_class, "__unittest_skip__", False):
+    return True
+  try:
+    fixture()
+  except Exception as err:
+    holder = unittest.suite._ErrorHolder("{fixture} ({cls})".format(
+      fixture=fixture_name, cls=unittest.util.strclass(test_class)))
+    if isinstance(err, unittest.SkipTest):
+      result.addSkip(holder, str(err))
+    else:
+      result.addError(holder, sys.exc_info())
+    return False
+  return True
+
+
+def iter_cases(test):
+  """
+  Iterates through test cases of a (possibly nested) test suite.
+
+  Args:
+    test: A TestSuite or TestCase object.
+  Yields:
+    TestCase objects.
+  """
+  if isinstance(test, unittest.TestSuite):
+    for child in test:
+      for test_case in iter_cases(child):
+        yield test_case
+  else:
+    yield test
+
+
+def group_cases_to_lanes(suite):
+  """
+  Splits test cases of the suite to lanes which can be run concurrently.
+  The first lane contains all test cases which are not concurrency safe
+  (in original order). Concurrency safe test cases are grouped by
+  CONCURRENCY_KEY (or by class if key isn't specified).
+
+  Args:
+    suite: A TestSuite object.
+  Returns:
+    A list of lists of TestCase objects.
+  """
+  serial_lane = []
+  concurrent_lanes = []
+  lanes_by_key = {}
+  for test_case in iter_cases(suite):
+    if not getattr(test_case, "CONCURRENCY_SAFE", False):
+      serial_lane.append(test_case)
+      continue
+    key = test_case.CONCURRENCY_KEY or type(test_case)
+    if key not in lanes_by_key:
+      lanes_by_key[key] = []
+      concurrent_lanes.append(lanes_by_key[key])
+    lanes_by_key[key].append(test_case)
+  lanes = [serial_lane] if serial_lane else []
+  return lanes + concurrent_lanes
 
 
 class HawkeyeTestResult(unittest.TextTestResult):
@@ -101,57 +348,200 @@ class HawkeyeTestResult(unittest.TextTestResult):
   SKIP = "skip"
   EXPECTED_FAILURE = "expected-failure"
   UNEXPECTED_SUCCESS = "unexpected-success"
+  UNREACHABLE = "unreachable"
 
-  def __init__(self, stream, descriptions, verbosity):
+  def __init__(self, stream, descriptions, verbosity, test_budget=None,
+               suite_budget=None, suite_short_name=None):
+    """
+    Args:
+      stream: A file-like object to write test progress to.
+      descriptions: A boolean - passed to TextTestResult.
+      verbosity: An integer - passed to TextTestResult.
+      test_budget: A number - max duration of a test in seconds (or None).
+      suite_budget: A number - max duration of all tests of the suite
+        in seconds (or None). It's counted from creation of the result.
+      suite_short_name: A string - short name of suite which logs
+        of tests are written to (whichever thread runs them).
+    """
     super(HawkeyeTestResult, self).__init__(stream, descriptions, verbosity)
     self.verbosity = verbosity
+    self.suite_short_name = suite_short_name
+    self.test_budget = test_budget
+    self.suite_budget = suite_budget
+    self._suite_deadline = time.time() + suite_budget if suite_budget else None
     self.report_dict = {}
     """
     Item of self.report_dict is pair of test IDs ('<class_name>.<method_name>')
      and test status (one of 'ERROR', 'ok', ...)
     """
+    self.durations = {}
+    """ Item of self.durations is pair of test ID and its duration in seconds """
+    self._started = {}
+    self._error_summaries = {}
+    # IDs of tests which exceeded budget, but their threads are still running
+    self._abandoned = set()
+    # Tests of a suite can be run concurrently (see HawkeyeTestSuite.run)
+    self._lock = threading.RLock()
+
+  def run_test(self, test):
+    """
+    Runs test case. If there is test or suite budget, the test is run in
+    a separate thread watched by the calling one. Test which doesn't finish
+    in budget is reported as ERROR with stack of its thread and is
+    abandoned, so the run moves on. Tests which are started after suite
+    budget is exhausted are skipped.
+
+    Args:
+      test: A TestCase object.
+    """
+    budget, reason = self._remaining_budget()
+    if budget is None:
+      test(self)
+      return
+    if budget <= 0:
+      self.startTest(test)
+      self.addSkip(test, reason)
+      self.stopTest(test)
+      return
+    thread = threading.Thread(target=test, args=(self,),
+                              name="test {}".format(test.id()))
+    # Abandoned thread shouldn't prevent process from exiting
+    thread.daemon = True
+    thread.start()
+    thread.join(budget)
+    if thread.is_alive():
+      self._abandon(test, thread, reason)
+
+  def has_budget(self):
+    """
+    Returns:
+      A boolean - whether tests are run under watchdog (see run_test).
+    """
+    return bool(self.test_budget or self._suite_deadline)
+
+  def _remaining_budget(self):
+    """
+    Returns:
+      A tuple (seconds, reason) - time left for the next test and
+      description of budget which limits it, or (None, None).
+    """
+    budgets = []
+    if self.test_budget:
+      budgets.append((self.test_budget, "Test exceeded budget of {}s"
+                                        .format(self.test_budget)))
+    if self._suite_deadline:
+      budgets.append((self._suite_deadline - time.time(),
+                      "Suite exceeded budget of {}s".format(self.suite_budget)))
+    if not budgets:
+      return None, None
+    return min(budgets)
+
+  def _abandon(self, test, thread, reason):
+    """
+    Reports test which is still running in thread as ERROR with stack
+    of the thread. Results reported by the thread later are ignored
+    (every add* method checks and records under the same lock).
+
+    Args:
+      test: A TestCase object.
+      thread: A threading.Thread object running the test.
+      reason: A string - description of exceeded budget.
+    """
+    frame = sys._current_frames().get(thread.ident)
+    stack = "".join(traceback.format_stack(frame)) if frame else ""
+    error = TestTimeout("{reason}. Stack of the test thread:\n{stack}"
+                        .format(reason=reason, stack=stack))
+    with self._lock:
+      if test.id() not in self._started:
+        # Test has just finished
+        return
+      self.addError(test, (TestTimeout, error, None))
+      self.stopTest(test)
+      self._abandoned.add(test.id())
 
   def startTest(self, test):
-    super(HawkeyeTestResult, self).startTest(test)
+    with self._lock:
+      super(HawkeyeTestResult, self).startTest(test)
+      self._started[test.id()] = time.time()
+    if self.suite_short_name:
+      hawkeye_utils.set_current_suite(self.suite_short_name)
+    hawkeye_utils.set_current_test(test.id())
+    hawkeye_utils.events.emit("test_start", test_id=test.id())
     logger.info(
       "==========================================\n"
       "Starting {test_id}".format(test_id=test.id())
     )
 
+  def stopTest(self, test):
+    with self._lock:
+      if test.id() in self._abandoned:
+        return
+      super(HawkeyeTestResult, self).stopTest(test)
+      started = self._started.pop(test.id(), None)
+      if started is not None:
+        self.durations[test.id()] = time.time() - started
+      status = self.report_dict.get(test.id())
+      duration = self.durations.get(test.id())
+      error = self._error_summaries.pop(test.id(), None)
+    hawkeye_utils.set_current_test(None)
+    hawkeye_utils.events.emit("test_end", test_id=test.id(), status=status,
+                              duration=duration, error=error)
+
   def addError(self, test, err):
-    super(HawkeyeTestResult, self).addError(test, err)
-    self.report_dict[test.id()] = self.ERROR
-    logger.error("{test_id} - failed with error:\n{trace}"
-                 .format(test_id=test.id(),
-                         trace=self._render_cut_traceback(test, err)))
+    with self._lock:
+      if test.id() in self._abandoned:
+        return
+      super(HawkeyeTestResult, self).addError(test, err)
+      self.report_dict[test.id()] = self.ERROR
+      self._error_summaries[test.id()] = self._summarize_error(err)
+      logger.error("{test_id} - failed with error:\n{trace}"
+                   .format(test_id=test.id(),
+                           trace=self._render_cut_traceback(test, err)))
 
   def addFailure(self, test, err):
-    super(HawkeyeTestResult, self).addFailure(test, err)
-    self.report_dict[test.id()] = self.FAILURE
-    logger.error("{test_id} - failed with error:\n{trace}"
-                 .format(test_id=test.id(),
-                         trace=self._render_cut_traceback(test, err)))
+    with self._lock:
+      if test.id() in self._abandoned:
+        return
+      super(HawkeyeTestResult, self).addFailure(test, err)
+      self.report_dict[test.id()] = self.FAILURE
+      self._error_summaries[test.id()] = self._summarize_error(err)
+      logger.error("{test_id} - failed with error:\n{trace}"
+                   .format(test_id=test.id(),
+                           trace=self._render_cut_traceback(test, err)))
 
   def addSuccess(self, test):
-    super(HawkeyeTestResult, self).addSuccess(test)
-    self.report_dict[test.id()] = self.SUCCESS
-    logger.debug("{test_id} - succeeded".format(test_id=test.id()))
+    with self._lock:
+      if test.id() in self._abandoned:
+        return
+      super(HawkeyeTestResult, self).addSuccess(test)
+      self.report_dict[test.id()] = self.SUCCESS
+      logger.debug("{test_id} - succeeded".format(test_id=test.id()))
 
   def addSkip(self, test, reason):
-    super(HawkeyeTestResult, self).addSkip(test, reason)
-    self.report_dict[test.id()] = self.SKIP
-    logger.debug("{test_id} - skipped".format(test_id=test.id()))
+    with self._lock:
+      if test.id() in self._abandoned:
+        return
+      super(HawkeyeTestResult, self).addSkip(test, reason)
+      self.report_dict[test.id()] = self.SKIP
+      self._error_summaries[test.id()] = reason
+      logger.debug("{test_id} - skipped".format(test_id=test.id()))
 
   def addExpectedFailure(self, test, err):
-    super(HawkeyeTestResult, self).addExpectedFailure(test, err)
-    self.report_dict[test.id()] = self.EXPECTED_FAILURE
-    logger.info("{test_id} - failed as expected".format(test_id=test.id()))
+    with self._lock:
+      if test.id() in self._abandoned:
+        return
+      super(HawkeyeTestResult, self).addExpectedFailure(test, err)
+      self.report_dict[test.id()] = self.EXPECTED_FAILURE
+      logger.info("{test_id} - failed as expected".format(test_id=test.id()))
 
   def addUnexpectedSuccess(self, test):
-    super(HawkeyeTestResult, self).addUnexpectedSuccess(test)
-    self.report_dict[test.id()] = self.UNEXPECTED_SUCCESS
-    logger.warn("{test_id} - unexpectedly succeeded"
-                .format(test_id=test.id()))
+    with self._lock:
+      if test.id() in self._abandoned:
+        return
+      super(HawkeyeTestResult, self).addUnexpectedSuccess(test)
+      self.report_dict[test.id()] = self.UNEXPECTED_SUCCESS
+      logger.warn("{test_id} - unexpectedly succeeded"
+                  .format(test_id=test.id()))
 
   def printErrors(self):
     if self.verbosity > 1:
@@ -159,6 +549,17 @@ class HawkeyeTestResult(unittest.TextTestResult):
     else:
       self.stream.write("\n")
 
+  @staticmethod
+  def _summarize_error(err):
+    """
+    Args:
+      err: A tuple (exctype, value, tb).
+    Returns:
+      A string - the last line of formatted exception.
+    """
+    exctype, value, _ = err
+    return traceback.format_exception_only(exctype, value)[-1].strip()
+
   def _render_cut_traceback(self, test, err):
     """
     Simplified modification of
@@ -213,6 +614,18 @@ def load_report_dict_from_csv(file_name):
     return {test_id: result.rstrip() for test_id, result in csv.reader(csv_file)}
 
 
+def save_timings_to_json(request_timings, file_name):
+  """
+  Persists summary of request timings to json file.
+
+  Args:
+    request_timings: A hawkeye_utils.RequestTimings object.
+    file_name: A string - name of json file where summary should be saved.
+  """
+  with open(file_name, "w") as json_file:
+    json.dump(request_timings.summary(), json_file, indent=2, sort_keys=True)
+
+
 class ReportsDiff(object):
   """
   Util class which defines structure for storing
@@ -262,9 +675,71 @@ def compare_test_reports(first_report_dict, second_report_dict):
   return diff
 
 
+def select_tests_to_rerun(previous_report_dict, baseline_report_dict):
+  """
+  Selects tests which failed in previous run or
+  which results did not match baseline.
+
+  Args:
+    previous_report_dict: A dict with statuses of tests of previous run.
+    baseline_report_dict: A dict with baseline statuses of tests.
+  Returns:
+    A set of test IDs.
+  """
+  failed = (HawkeyeTestResult.FAILURE, HawkeyeTestResult.ERROR)
+  return {
+    test_id for test_id, status in previous_report_dict.iteritems()
+    if status in failed or status != baseline_report_dict.get(test_id, status)
+  }
+
+
+def filter_suite(suite, test_ids):
+  """
+  Builds a copy of suite with specified test cases and fixtures
+  they depend on. Deprecated test cases share state through module globals
+  and rely on order of tests in suite, so all test cases which precede
+  selected DeprecatedHawkeyeTestCase are kept as well.
+
+  Args:
+    suite: A HawkeyeTestSuite object.
+    test_ids: A set of IDs of test cases to keep.
+  Returns:
+    A HawkeyeTestSuite object (it's empty if suite has none of test_ids).
+  """
+  test_cases = list(iter_cases(suite))
+  chain_end = max([
+    index for index, test_case in enumerate(test_cases)
+    if test_case.id() in test_ids
+    and isinstance(test_case, DeprecatedHawkeyeTestCase)
+  ] or [-1])
+  kept_ids = {
+    test_case.id() for index, test_case in enumerate(test_cases)
+    if index <= chain_end or test_case.id() in test_ids
+  }
+  return suite_subset(suite, kept_ids)
+
+
+def suite_subset(suite, test_ids):
+  """
+  Builds a copy of suite with specified test cases only (in original order).
+
+  Args:
+    suite: A HawkeyeTestSuite object.
+    test_ids: A set of IDs of test cases to keep.
+  Returns:
+    A HawkeyeTestSuite object (it's empty if suite has none of test_ids).
+  """
+  subset = HawkeyeTestSuite(suite.name, suite.short_name, suite.serial_group,
+                            suite.required_modules)
+  subset.addTests(test_case for test_case in iter_cases(suite)
+                  if test_case.id() in test_ids)
+  return subset
+
+
 class HawkeyeSuitesRunner(object):
 
-  def __init__(self, language, logs_dir, baseline_file, verbosity=1):
+  def __init__(self, language, logs_dir, baseline_file, verbosity=1,
+               test_threads=1, test_budget=None, suite_budget=None):
     """
     Args:
       language: A string ('python' or 'java').
@@ -272,14 +747,24 @@ class HawkeyeSuitesRunner(object):
       baseline_file: A string representing name of baseline file.
       verbosity: A flag. Is passed to TextTestRunner and HawkeyeTestResult.
         Defines how many details will be written to stdout.
+      test_threads: An integer - number of threads to run concurrency safe
+        test cases of a suite in.
+      test_budget: A number - max duration of a test in seconds (or None).
+      suite_budget: A number - max duration of a suite in seconds (or None).
     """
     self.language = language
     self.logs_dir = logs_dir
     self.baseline_file = baseline_file
     self.verbosity = verbosity
+    self.test_threads = test_threads
+    self.test_budget = test_budget
+    self.suite_budget = suite_budget
+    # Modules which failed precheck (see hawkeye_precheck.py)
+    self.unreachable_modules = set()
     self.suites_report = {}
+    self.tests_durations = {}
 
-  def run_suites(self, hawkeye_suites):
+  def run_suites(self, hawkeye_suites, jobs=1):
     """
     Iterates through hawkeye_suites and executes containing tests.
     For each failed suite file with error details is saved.
@@ -287,19 +772,138 @@ class HawkeyeSuitesRunner(object):
 
     Args:
       hawkeye_suites: A list of HawkeyeTestSuite objects.
+      jobs: An integer - number of worker processes to run suites in.
+        If it's greater than 1, independent suites are run in parallel.
     """
+    if jobs > 1 and len(hawkeye_suites) > 1:
+      self._run_suites_in_pool(hawkeye_suites, jobs)
+      return
+
     for suite in hawkeye_suites:
-      print("\n{}".format(suite.name))
-      print("=" * len(suite.name))
-      test_runner = unittest.TextTestRunner(resultclass=HawkeyeTestResult,
-                                            verbosity=self.verbosity,
-                                            stream=sys.stdout)
+      result = self._run_suite(suite, sys.stdout)
+      self.suites_report.update(result.report_dict)
+      self.tests_durations.update(result.durations)
+
+  def _run_suite(self, suite, stream):
+    """
+    Runs a single suite writing its progress to stream.
+    If the suite has failed tests, file with error details is saved.
+
+    Args:
+      suite: A HawkeyeTestSuite object.
+      stream: A file-like object to write test progress to.
+    Returns:
+      A HawkeyeTestResult object.
+    """
+    stream.write("\n{}\n".format(suite.name))
+    stream.write("{}\n".format("=" * len(suite.name)))
+    unreachable = sorted(set(suite.required_modules) & self.unreachable_modules)
+    if unreachable:
+      return self._skip_unreachable_suite(suite, unreachable, stream)
+    hawkeye_utils.events.emit("suite_start", suite=suite.short_name)
+    hawkeye_utils.start_suite_logs(suite.short_name)
+    suite.threads = self.test_threads
+    resultclass = functools.partial(HawkeyeTestResult,
+                                    test_budget=self.test_budget,
+                                    suite_budget=self.suite_budget,
+                                    suite_short_name=suite.short_name)
+    test_runner = unittest.TextTestRunner(resultclass=resultclass,
+                                          verbosity=self.verbosity,
+                                          stream=stream)
+    try:
       result = test_runner.run(suite)
       """:type result: HawkeyeTestResult """
+    finally:
+      hawkeye_utils.finish_suite_logs(suite.short_name)
 
-      self.suites_report.update(result.report_dict)
-      if result.errors or result.failures:
-        self._save_error_details(suite.short_name, result)
+    if result.errors or result.failures:
+      self._save_error_details(suite.short_name, result)
+    hawkeye_utils.events.emit(
+      "suite_end", suite=suite.short_name, tests=result.testsRun,
+      failures=len(result.failures), errors=len(result.errors))
+    return result
+
+  def _skip_unreachable_suite(self, suite, modules, stream):
+    """
+    Reports every test of the suite as UNREACHABLE without running it.
+
+    Args:
+      suite: A HawkeyeTestSuite object.
+      modules: A list of names of unreachable modules required by suite.
+      stream: A file-like object to write progress to.
+    Returns:
+      A HawkeyeTestResult object.
+    """
+    reason = "unreachable module(s): {}".format(", ".join(modules))
+    stream.write("Skipped, {}\n".format(reason))
+    logger.error("Suite {suite} is skipped, {reason}"
+                 .format(suite=suite.short_name, reason=reason))
+    result = HawkeyeTestResult(stream, True, self.verbosity)
+    for test in iter_cases(suite):
+      result.report_dict[test.id()] = HawkeyeTestResult.UNREACHABLE
+    hawkeye_utils.events.emit("suite_skipped", suite=suite.short_name,
+                              reason=reason,
+                              tests=len(result.report_dict))
+    return result
+
+  def _run_suites_in_pool(self, hawkeye_suites, jobs):
+    """
+    Runs suites in a pool of worker processes. Suites sharing
+    serial_group are run one after another in the same worker.
+    Every worker saves report fragment for each suite it ran,
+    fragments are merged into self.suites_report as workers finish.
+
+    Args:
+      hawkeye_suites: A list of HawkeyeTestSuite objects.
+      jobs: An integer - number of worker processes.
+    """
+    lanes = group_suites_to_lanes(hawkeye_suites)
+    # Worker processes are forked, so they inherit runner and suites
+    # without pickling test cases and Application objects.
+    _POOL_STATE["runner"] = self
+    _POOL_STATE["lanes"] = lanes
+    pool = multiprocessing.Pool(min(jobs, len(lanes)))
+    try:
+      lanes_outcome = pool.imap_unordered(_run_lane, range(len(lanes)))
+      for suites_outcome, connections in lanes_outcome:
+        for output, fragment_file, durations, timings in suites_outcome:
+          sys.stdout.write(output)
+          sys.stdout.flush()
+          self.suites_report.update(load_report_dict_from_csv(fragment_file))
+          self.tests_durations.update(durations)
+          hawkeye_utils.request_timings.extend(timings)
+        hawkeye_utils.session_pool.stats.merge(*connections)
+      pool.close()
+    except:
+      pool.terminate()
+      raise
+    finally:
+      pool.join()
+      _POOL_STATE.clear()
+
+  def _run_suite_to_fragment(self, suite):
+    """
+    Runs a single suite in worker process. Test progress is buffered
+    so output of parallel suites isn't mixed. Test statuses are saved
+    to report fragment file in logs directory.
+
+    Args:
+      suite: A HawkeyeTestSuite object.
+    Returns:
+      A tuple (output, fragment_file, durations, timings) where durations
+      is a dict with durations of tests and timings is a list of
+      RequestTiming records of requests sent by the suite.
+    """
+    stream = StringIO()
+    result = self._run_suite(suite, stream)
+    fragment_file = "{logs_dir}/{suite}-{lang}-report.csv".format(
+      logs_dir=self.logs_dir, suite=suite.short_name, lang=self.language)
+    save_report_dict_to_csv(result.report_dict, fragment_file)
+    timings = hawkeye_utils.request_timings.drain()
+    # Worker process exits without stopping threads
+    hawkeye_utils.events.flush()
+    hawkeye_utils.traffic_capture.flush()
+    return stream.getvalue(), fragment_file, result.durations, timings
 
   ERR_TEMPLATE = (
     "======================================================================\n"
@@ -335,6 +939,8 @@ class HawkeyeSuitesRunner(object):
 
     Args:
       verbosity: An integer - if > 1 details about difference is printed.
+    Returns:
+      A ReportsDiff - comparison of self.suites_report to baseline.
     """
     baseline_report = load_report_dict_from_csv(self.baseline_file)
     diff = compare_test_reports(baseline_report, self.suites_report)
@@ -381,6 +987,130 @@ class HawkeyeSuitesRunner(object):
         for test_id, expected in diff.missed_in_second
       ))
       cprint("    " + missed_in_suites)
+    return diff
+
+  def print_connections_summary(self):
+    """
+    Prints how many HTTP connections were opened and reused.
+    """
+    connections = hawkeye_utils.session_pool.stats
+    cprint("\nHTTP connections: {opened} opened, {reused} reused"
+           .format(opened=connections.opened, reused=connections.reused))
+
+
+# Runner and suite lanes which are shared with forked worker processes.
+_POOL_STATE = {}
+
+
+def _run_lane(lane_index):
+  """
+  Entry point of worker process. Runs every suite of the lane.
+
+  Args:
+    lane_index: An integer - index of lane in _POOL_STATE["lanes"].
+  Returns:
+    A tuple (suites_outcome, connections) where suites_outcome is a list
+    of tuples (output, fragment_file, durations, timings) - one for each suite,
+    and connections
+    is a tuple (opened, reused) with HTTP connections stats of the worker.
+  """
+  runner = _POOL_STATE["runner"]
+  lane = _POOL_STATE["lanes"][lane_index]
+  suites_outcome = [runner._run_suite_to_fragment(suite) for suite in lane]
+  # Worker can run several lanes, so only not yet reported stats are sent
+  stats = hawkeye_utils.session_pool.stats
+  reported_opened, reported_reused = _POOL_STATE.get("reported", (0, 0))
+  connections = (stats.opened - reported_opened, stats.reused - reported_reused)
+  _POOL_STATE["reported"] = (stats.opened, stats.reused)
+  return suites_outcome, connections
+
+
+def group_suites_to_lanes(hawkeye_suites):
+  """
+  Splits suites to lanes which can be run in parallel. Suites with the
+  same serial_group are put to the same lane (keeping original order),
+  every other suite gets its own lane.
+
+  Args:
+    hawkeye_suites: A list of HawkeyeTestSuite objects.
+  Returns:
+    A list of lists of HawkeyeTestSuite objects.
+  """
+  lanes = []
+  group_lanes = {}
+  for suite in hawkeye_suites:
+    if suite.serial_group is None:
+      lanes.append([suite])
+    elif suite.serial_group in group_lanes:
+      group_lanes[suite.serial_group].append(suite)
+    else:
+      lane = [suite]
+      group_lanes[suite.serial_group] = lane
+      lanes.append(lane)
+  return lanes
+
+
+def split_to_shards(hawkeye_suites, durations, shard_count):
+  """
+  Deterministically splits test cases of suites to shards with balanced
+  total duration. Test cases which can't be run concurrently with each other
+  stay in one shard: suites sharing serial_group go together and a suite is
+  split only to lanes built by group_cases_to_lanes (so ordered chains of
+  deprecated test cases are never split).
+
+  Args:
+    hawkeye_suites: A list of HawkeyeTestSuite objects.
+    durations: A dict with historical durations of tests
+      (<test_id>: <seconds>). Unknown tests are assumed to take
+      median of known durations.
+    shard_count: An integer - number of shards.
+  Returns:
+    A list of sets of test IDs (one set per shard).
+  """
+  units = []
+  for lane in group_suites_to_lanes(hawkeye_suites):
+    if len(lane) > 1:
+      units.append([test_case for suite in lane
+                    for test_case in iter_cases(suite)])
+    else:
+      units.extend(group_cases_to_lanes(lane[0]))
+
+  known = sorted(durations.itervalues())
+  default_duration = known[len(known) // 2] if known else 1.0
+
+  def unit_duration(unit):
+    return sum(durations.get(test_case.id(), default_duration)
+               for test_case in unit)
+
+  # Longest units are assigned first to the least loaded shard
+  weighted_units = sorted(
+    ((unit_duration(unit), unit[0].id(), unit) for unit in units if unit),
+    key=lambda item: (-item[0], item[1])
+  )
+  shards = [set() for _ in range(shard_count)]
+  loads = [0.0] * shard_count
+  for duration, _, unit in weighted_units:
+    shard_index = loads.index(min(loads))
+    loads[shard_index] += duration
+    shards[shard_index].update(test_case.id() for test_case in unit)
+  return shards
+
+
+def select_shard(hawkeye_suites, durations, shard_index, shard_count):
+  """
+  Builds suites containing only test cases of specified shard.
+
+  Args:
+    hawkeye_suites: A list of HawkeyeTestSuite objects.
+    durations: A dict with historical durations of tests.
+    shard_index: An integer - index of shard to select (starting from 0).
+    shard_count: An integer - number of shards.
+  Returns:
+    A list of non-empty HawkeyeTestSuite objects.
+  """
+  test_ids = split_to_shards(hawkeye_suites, durations, shard_count)[shard_index]
+  subsets = [suite_subset(suite, test_ids) for suite in hawkeye_suites]
+  return [subset for subset in subsets if subset.countTestCases()]
 
 
 class DeprecatedHawkeyeTestCase(HawkeyeTestCase):
@@ -390,9 +1120,16 @@ class DeprecatedHawkeyeTestCase(HawkeyeTestCase):
   be extended by providing an implementation for the runTest
   method. Use the http_* methods to perform HTTP calls on backend
   endpoints. All the HTTP calls performed via these methods are
-  traced and logged to hawkeye-logs/<lang>-detailed <datetime>.log.
+  traced and logged to hawkeye-logs/<suite>-<lang>-detailed <datetime>.log.
   """
-  LANG = None
+
+  @property
+  def LANG(self):
+    """
+    Language of application under test. It's taken from application object,
+    so test cases for different runtimes can coexist.
+    """
+    return self.app.language
 
   def __init__(self, methodName, application):
     """
@@ -425,7 +1162,7 @@ class DeprecatedHawkeyeTestCase(HawkeyeTestCase):
     Args:
       path: A URL path fragment (eg: /foo).
       headers: A dictionary to be sent as HTTP headers.
-      prepend_lang: If True the value of hawkeye_utils.LANG will be
+      prepend_lang: If True the value of self.LANG will be
         prepended to the provided URL path. Default is : .
       use_ssl: If True use HTTPS to make the connection. Defaults to False.
 
@@ -445,7 +1182,7 @@ class DeprecatedHawkeyeTestCase(HawkeyeTestCase):
       path: A URL path fragment (eg: /foo).
       payload: A string payload to be sent POSTed.
       headers: A dictionary of headers.
-      prepend_lang: If True the value of hawkeye_utils.LANG will be
+      prepend_lang: If True the value of self.LANG will be
         prepended to the provided URL path. Default is True.
 
     Returns:
@@ -468,7 +1205,7 @@ class DeprecatedHawkeyeTestCase(HawkeyeTestCase):
       path: A URL path fragment (eg: /foo).
       payload: A string payload to be sent POSTed.
       headers: A dictionary of headers.
-      prepend_lang: If True the value of hawkeye_utils.LANG will be
+      prepend_lang: If True the value of self.LANG will be
         prepended to the provided URL path. Default is True.
 
     Returns:
@@ -488,7 +1225,7 @@ class DeprecatedHawkeyeTestCase(HawkeyeTestCase):
 
     Args:
       path: A URL path fragment (eg: /foo).
-      prepend_lang: If True the value of hawkeye_utils.LANG will be
+      prepend_lang: If True the value of self.LANG will be
         prepended to the provided URL path. Default is True.
 
     Returns:
@@ -497,7 +1234,7 @@ class DeprecatedHawkeyeTestCase(HawkeyeTestCase):
     return self.__make_request(
       'DELETE', path, prepend_lang=prepend_lang, **kwargs)
 
-  def assert_and_get_list(self, path):
+  def assert_and_get_list(self, path, max_rpcs=None):
     """
     Executes a HTTP GET on the specified URL path and parse the output
     payload into a list of entities. Semantics of the GET request are
@@ -507,14 +1244,17 @@ class DeprecatedHawkeyeTestCase(HawkeyeTestCase):
 
     Args:
       path: A URL path.
+      max_rpcs: A dict {service: max number of API RPCs} handler
+        is expected to make (see Application.request).
 
     Returns:
       A list of entities.
 
     Raises:
-      AssertionError  If the resulting list is empty.
+      AssertionError  If the resulting list is empty or RPC budget
+        is exceeded.
     """
-    response = self.http_get(path)
+    response = self.http_get(path, max_rpcs=max_rpcs)
     self.assertEquals(response.status, 200)
     list = json.loads(response.payload)
     self.assertTrue(len(list) > 0)
@@ -524,14 +1264,15 @@ class DeprecatedHawkeyeTestCase(HawkeyeTestCase):
                      prepend_lang=True, use_ssl=False, **kwargs):
     """
     Make a HTTP call using the provided arguments. HTTP request and response
-    are traced and logged to hawkeye-logs/<lang>-detailed <datetime>.log.
+    are traced and logged to
+    hawkeye-logs/<suite>-<lang>-detailed <datetime>.log.
 
     Args:
       method: HTTP method (eg: GET, POST).
       path: URL path to execute on.
       payload: Payload to be sent. Only used if the method is POST or PUT.
       headers: Any HTTP headers to be sent as a dictionary.
-      prepend_lang: If True the value of hawkeye_utils.LANG will be prepended
+      prepend_lang: If True the value of self.LANG will be prepended
         to the URL.
       use_ssl: If True use HTTPS to make the connection. Defaults to False.
 
@@ -1,13 +1,37 @@
+import base64
+import cookielib
+import gzip
 import json
 import logging
+import math
 import os
+import Queue
+import re
+import sys
+import threading
+import time
+import urlparse
+from collections import namedtuple
 from datetime import datetime
 
 import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connectionpool import (
+  HTTPConnectionPool, HTTPSConnectionPool
+)
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 
 LIMITED_BODY_LENGTH = 2000
 
+# Default verbosity of request logs (see hawkeye_request)
+REQUEST_LOG_VERBOSITY = 3
+
+# Max number of kept-alive connections per scheme and host
+DEFAULT_POOL_SIZE = 10
+
+# Default (connect, read) timeouts of requests in seconds (see hawkeye_request)
+REQUEST_TIMEOUT = (10, 60)
+
 
 class ResponseInfo:
   """
@@ -35,12 +59,606 @@ class HawkeyeConstants:
   MOD_NHTTP = 'NHTTP'
 
 
-def hawkeye_request(method, url, params=None, verbosity=3, verify=False,
+class ConnectionStats(object):
+  """
+  Thread-safe counters of HTTP connections opened and reused by SessionPool.
+  """
+
+  def __init__(self):
+    self.opened = 0
+    self.reused = 0
+    self._lock = threading.Lock()
+
+  def count(self, reused):
+    """
+    Args:
+      reused: A boolean - whether kept-alive connection was taken from pool.
+    """
+    with self._lock:
+      if reused:
+        self.reused += 1
+      else:
+        self.opened += 1
+
+  def merge(self, opened, reused):
+    """
+    Adds counters collected somewhere else (e.g. in worker process).
+
+    Args:
+      opened: An integer - number of opened connections.
+      reused: An integer - number of reused connections.
+    """
+    with self._lock:
+      self.opened += opened
+      self.reused += reused
+
+
+class _CountingPoolMixin(object):
+  """
+  Connection pool which reports every connection it hands out to
+  ConnectionStats. Connection which already has socket is a reused one.
+  """
+  stats = None
+
+  def _get_conn(self, timeout=None):
+    conn = super(_CountingPoolMixin, self)._get_conn(timeout)
+    if self.stats is not None:
+      self.stats.count(reused=getattr(conn, "sock", None) is not None)
+    return conn
+
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+  pass
+
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+  pass
+
+
+class _BlockAllCookiesPolicy(cookielib.DefaultCookiePolicy):
+  """
+  Shared session must not remember cookies between tests,
+  cookies should be sent only if test specifies them explicitly.
+  """
+
+  def set_ok(self, cookie, request):
+    return False
+
+
+class SessionPool(object):
+  """
+  Thread-safe pool of keep-alive requests.Session objects.
+  There is a session for every scheme and host, so connections to
+  app versions are reused across requests instead of being opened
+  for every request.
+  """
+
+  def __init__(self, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Args:
+      pool_size: An integer - max number of connections kept alive
+        per scheme and host.
+    """
+    self.pool_size = pool_size
+    self._stats = ConnectionStats()
+    self._sessions = {}
+    self._preconnect_urls = []
+    self._lock = threading.Lock()
+    self._pid = os.getpid()
+
+  @property
+  def stats(self):
+    """ ConnectionStats of the current process. """
+    self._reset_if_forked()
+    return self._stats
+
+  def get_session(self, url):
+    """
+    Returns session for scheme and host of url (creates it if needed).
+
+    Args:
+      url: A string URL.
+    Returns:
+      A requests.Session object.
+    """
+    self._reset_if_forked()
+    parsed = urlparse.urlparse(url)
+    key = (parsed.scheme, parsed.netloc)
+    session = self._sessions.get(key)
+    if session is None:
+      with self._lock:
+        session = self._sessions.get(key)
+        if session is None:
+          session = self._new_session()
+          self._sessions[key] = session
+    return session
+
+  def preconnect(self, urls):
+    """
+    Opens a connection to every URL, so first requests of tests
+    don't need to wait for TCP/TLS handshake.
+    URLs are remembered to be preconnected again in forked processes.
+
+    Args:
+      urls: A list of strings - base URLs of app versions.
+    """
+    self._preconnect_urls = list(urls)
+    for url in self._preconnect_urls:
+      try:
+        adapter = self.get_session(url).get_adapter(url)
+        pool = adapter.get_connection(url)
+        adapter.cert_verify(pool, url, verify=False, cert=None)
+        conn = pool._get_conn()
+        conn.connect()
+        pool._put_conn(conn)
+      except Exception as err:
+        logger.warn("Failed to preconnect to {url}: {err}"
+                    .format(url=url, err=err))
+
+  def close(self):
+    """ Closes all sessions and their kept-alive connections. """
+    with self._lock:
+      for session in self._sessions.values():
+        session.close()
+      self._sessions = {}
+
+  def _new_session(self):
+    session = requests.Session()
+    session.cookies.set_policy(_BlockAllCookiesPolicy())
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+    stats = self._stats
+    adapter.poolmanager.pool_classes_by_scheme = {
+      "http": type("HTTPConnectionPool", (_CountingHTTPConnectionPool,),
+                   {"stats": stats}),
+      "https": type("HTTPSConnectionPool", (_CountingHTTPSConnectionPool,),
+                    {"stats": stats}),
+    }
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+  def _reset_if_forked(self):
+    """
+    Connections must not be shared with parent process, so worker
+    process drops inherited sessions and starts counting from zero.
+    """
+    if self._pid == os.getpid():
+      return
+    with self._lock:
+      if self._pid == os.getpid():
+        return
+      self._sessions = {}
+      self._stats = ConnectionStats()
+      self._pid = os.getpid()
+    if self._preconnect_urls:
+      self.preconnect(self._preconnect_urls)
+
+
+RequestTiming = namedtuple("RequestTiming", [
+  "test_id",         # ID of test which sent the request (or None)
+  "method",          # HTTP method
+  "endpoint",        # path template, e.g. "/python/blobstore/download/{key}"
+  "status",          # response status code (None if request failed)
+  "wall_time",       # seconds from sending request to reading whole body
+  "ttfb",            # seconds from sending request to parsed headers
+  "request_bytes",   # length of request body
+  "response_bytes",  # length of response body
+  "handler_time",    # seconds app spent handling request (None if unknown)
+  "rpc_time",        # seconds handler spent in API RPCs (None if unknown)
+  "rpc_calls",       # dict {service: number of API RPCs} (None if unknown)
+])
+
+# Headers of responses reporting server-side timing (see rpc_timing.py of
+# python27-app), e.g.:
+#   Server-Timing: handler;dur=12.5, rpc;dur=8.0, datastore_v3;dur=6.1
+#   X-Hawkeye-Rpc-Calls: datastore_v3=3
+SERVER_TIMING_HEADER = "Server-Timing"
+RPC_CALLS_HEADER = "X-Hawkeye-Rpc-Calls"
+
+ConditionTiming = namedtuple("ConditionTiming", [
+  "test_id",         # ID of test which waited for condition (or None)
+  "condition",       # description of condition
+  "elapsed",         # seconds it took condition to become true (or timeout)
+  "attempts",        # number of checks
+  "satisfied",       # False if deadline was exceeded
+])
+
+# Path segments which are replaced by placeholders in endpoint templates
+_NUMBER_SEGMENT = re.compile(r"^\d+$")
+_UUID_SEGMENT = re.compile(
+  r"^[0-9a-fA-F]{8}-?([0-9a-fA-F]{4}-?){3}[0-9a-fA-F]{12}$")
+_LONG_SEGMENT_LENGTH = 32
+
+_SERVER_TIMING_DURATION = re.compile(r"^\s*dur\s*=\s*([0-9.]+)\s*$")
+
+_current_test = threading.local()
+
+
+def set_current_test(test_id):
+  """
+  Remembers which test is running in the current thread, so requests
+  sent by the thread are attributed to the test.
+
+  Args:
+    test_id: A string - ID of test (or None when test is finished).
+  """
+  _current_test.test_id = test_id
+
+
+def get_current_test():
+  """
+  Returns:
+    A string - ID of test running in the current thread (or None).
+  """
+  return getattr(_current_test, "test_id", None)
+
+
+def endpoint_template(url):
+  """
+  Converts URL to path template which groups requests to the same
+  endpoint. Query string is dropped, numeric IDs, UUIDs and long
+  keys in the path are replaced with placeholders.
+
+  Args:
+    url: A string URL.
+  Returns:
+    A string, e.g. "/python/blobstore/download/{key}".
+  """
+  segments = []
+  for segment in urlparse.urlparse(url).path.split("/"):
+    if _NUMBER_SEGMENT.match(segment):
+      segment = "{id}"
+    elif _UUID_SEGMENT.match(segment):
+      segment = "{uuid}"
+    elif len(segment) >= _LONG_SEGMENT_LENGTH:
+      segment = "{key}"
+    segments.append(segment)
+  return "/".join(segments) or "/"
+
+
+def parse_server_timing(headers):
+  """
+  Parses server-side timing headers of response.
+
+  Args:
+    headers: A dict-like object with response headers.
+  Returns:
+    A tuple (handler_time, rpc_time, rpc_calls): seconds spent by
+    handler, seconds spent in API RPCs and a dict {service: number of
+    calls}. All items are None if response doesn't report timing.
+  """
+  server_timing = headers.get(SERVER_TIMING_HEADER)
+  if not server_timing:
+    return None, None, None
+  durations = {}
+  for metric in server_timing.split(","):
+    params = metric.split(";")
+    for param in params[1:]:
+      match = _SERVER_TIMING_DURATION.match(param)
+      if match:
+        durations[params[0].strip()] = float(match.group(1)) / 1000
+  if "handler" not in durations:
+    return None, None, None
+  rpc_calls = {}
+  for item in (headers.get(RPC_CALLS_HEADER) or "").split(","):
+    service, _, count = item.partition("=")
+    if count.strip().isdigit():
+      rpc_calls[service.strip()] = int(count)
+  return durations["handler"], durations.get("rpc", 0.0), rpc_calls
+
+
+class RpcBudgetExceeded(AssertionError):
+  """ Raised when handler made more API RPCs than test expected. """
+  pass
+
+
+def check_rpc_budget(resp, max_rpcs):
+  """
+  Verifies that handler didn't make more API RPCs per service than
+  allowed. The check is skipped if app doesn't report RPC counts.
+
+  Args:
+    resp: A requests.Response object.
+    max_rpcs: A dict {service: max number of RPCs},
+      e.g. {'datastore_v3': 3}.
+  Raises:
+    RpcBudgetExceeded: if any service was called more times than allowed.
+  """
+  _, _, rpc_calls = parse_server_timing(resp.headers)
+  if rpc_calls is None:
+    return
+  exceeded = [
+    "{service}: {calls} > {budget}".format(
+      service=service, calls=rpc_calls[service], budget=budget)
+    for service, budget in sorted(max_rpcs.iteritems())
+    if rpc_calls.get(service, 0) > budget
+  ]
+  if exceeded:
+    raise RpcBudgetExceeded(
+      "{method} {url} exceeded RPC budget ({exceeded})".format(
+        method=resp.request.method, url=resp.request.url,
+        exceeded=", ".join(exceeded)))
+
+
+def _body_length(body):
+  if isinstance(body, basestring):
+    return len(body)
+  return 0
+
+
+class RequestTimings(object):
+  """
+  Thread-safe collection of RequestTiming records of all requests
+  sent by hawkeye_request and ConditionTiming records of conditions
+  tests waited for.
+  """
+
+  PERCENTILES = (50, 90, 99)
+
+  def __init__(self):
+    self._records = []
+    self._lock = threading.Lock()
+
+  def add(self, record):
+    with self._lock:
+      self._records.append(record)
+
+  def extend(self, records):
+    """
+    Adds records collected somewhere else (e.g. in worker process).
+
+    Args:
+      records: A list of RequestTiming and ConditionTiming.
+    """
+    with self._lock:
+      self._records.extend(records)
+
+  def drain(self):
+    """
+    Removes and returns all collected records.
+
+    Returns:
+      A list of RequestTiming and ConditionTiming.
+    """
+    with self._lock:
+      records, self._records = self._records, []
+    return records
+
+  def summary(self):
+    """
+    Aggregates collected request records per endpoint and per test,
+    and condition records per condition.
+
+    Returns:
+      A dict like:
+      {
+        "requests": 250,
+        "endpoints": {
+          "GET /python/memcache": {
+            "count": 44, "errors": 0,
+            "request_bytes": 0, "response_bytes": 2860,
+            "wall_time": {"p50": 0.012, "p90": 0.02, "p99": 0.05, "max": 0.06},
+            "ttfb": {"p50": 0.011, ...},
+            "network_time": {...}, "handler_cpu_time": {...},
+            "rpc_time": {...}, "rpc_calls": {"memcache": 44}
+          },
+          ...
+        },
+        "tests": {"tests.memcache_tests.MemcacheAddTest.runTest": {...}, ...},
+        "conditions": {
+          "memcache key expired": {
+            "count": 2, "timeouts": 0, "max_attempts": 7,
+            "elapsed": {"p50": 6.1, "p90": 6.3, "p99": 6.3, "max": 6.3}
+          },
+          ...
+        }
+      }
+    """
+    with self._lock:
+      records = [r for r in self._records if isinstance(r, RequestTiming)]
+      conditions = [r for r in self._records
+                    if isinstance(r, ConditionTiming)]
+    by_endpoint = {}
+    by_test = {}
+    by_condition = {}
+    for condition in conditions:
+      by_condition.setdefault(condition.condition, []).append(condition)
+    for record in records:
+      endpoint = "{} {}".format(record.method.upper(), record.endpoint)
+      by_endpoint.setdefault(endpoint, []).append(record)
+      by_test.setdefault(record.test_id or "<no test>", []).append(record)
+    return {
+      "requests": len(records),
+      "endpoints": {key: self.aggregate(group)
+                    for key, group in by_endpoint.iteritems()},
+      "tests": {key: self.aggregate(group)
+                for key, group in by_test.iteritems()},
+      "conditions": {key: self._aggregate_conditions(group)
+                     for key, group in by_condition.iteritems()},
+    }
+
+  @classmethod
+  def aggregate(cls, records):
+    """
+    Aggregates request records (e.g. records of one endpoint).
+
+    Args:
+      records: A list of RequestTiming.
+    Returns:
+      A dict with count, errors, bytes and wall_time/ttfb distributions.
+      If server reported timing, wall time is also broken down into
+      network_time (outside of handler), handler_cpu_time (in handler
+      but not in API RPCs) and rpc_time, and API RPCs are counted
+      per service in rpc_calls.
+    """
+    timed = [r for r in records if r.handler_time is not None]
+    rpc_calls = {}
+    for record in timed:
+      for service, count in record.rpc_calls.iteritems():
+        rpc_calls[service] = rpc_calls.get(service, 0) + count
+    return {
+      "count": len(records),
+      "errors": sum(1 for r in records if r.status is None or r.status >= 500),
+      "request_bytes": sum(r.request_bytes for r in records),
+      "response_bytes": sum(r.response_bytes for r in records),
+      "wall_time": cls._distribution([r.wall_time for r in records]),
+      "ttfb": cls._distribution(
+        [r.ttfb for r in records if r.ttfb is not None]),
+      "network_time": cls._distribution(
+        [max(r.wall_time - r.handler_time, 0) for r in timed]),
+      "handler_cpu_time": cls._distribution(
+        [max(r.handler_time - r.rpc_time, 0) for r in timed]),
+      "rpc_time": cls._distribution([r.rpc_time for r in timed]),
+      "rpc_calls": rpc_calls,
+    }
+
+  @classmethod
+  def _aggregate_conditions(cls, conditions):
+    return {
+      "count": len(conditions),
+      "timeouts": sum(1 for c in conditions if not c.satisfied),
+      "max_attempts": max(c.attempts for c in conditions),
+      "elapsed": cls._distribution(
+        [c.elapsed for c in conditions if c.satisfied]),
+    }
+
+  @classmethod
+  def _distribution(cls, values):
+    if not values:
+      return None
+    values = sorted(values)
+    distribution = {
+      "p{}".format(percentile): cls._percentile(values, percentile)
+      for percentile in cls.PERCENTILES
+    }
+    distribution["max"] = values[-1]
+    return distribution
+
+  @staticmethod
+  def _percentile(sorted_values, percentile):
+    """ Nearest-rank percentile of sorted list. """
+    rank = int(math.ceil(percentile / 100.0 * len(sorted_values))) - 1
+    return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+
+class EventsStream(object):
+  """
+  Stream of JSON-lines events (test started, test finished, ...) written to
+  file as they occur. Events are put to a queue and written by background
+  thread, so emitting an event doesn't block test. The file is opened in
+  append mode, so forked worker processes can write to the same stream
+  (every process gets its own writer thread).
+  """
+
+  # Sentinel which stops writer thread
+  _STOP = object()
+
+  def __init__(self, file_name=None, **common_fields):
+    """
+    Args:
+      file_name: A string - path to events file or None to drop events.
+      common_fields: fields to add to every event (e.g. language).
+    """
+    self.file_name = file_name
+    self.common_fields = common_fields
+    self._queue = None
+    self._writer = None
+    self._pid = None
+    self._lock = threading.Lock()
+
+  def emit(self, event, **fields):
+    """
+    Puts event to the stream.
+
+    Args:
+      event: A string - type of event (e.g. 'test_start').
+      fields: fields of the event.
+    """
+    if not self.file_name:
+      return
+    record = {"event": event, "time": time.time(), "pid": os.getpid()}
+    record.update(self.common_fields)
+    record.update(fields)
+    self._ensure_writer().put(record)
+
+  def flush(self):
+    """
+    Blocks until all emitted events are written to file.
+    """
+    if self._queue is not None and self._pid == os.getpid():
+      self._queue.join()
+
+  def close(self):
+    """
+    Writes all emitted events and stops writer thread.
+    """
+    if self._writer is None or self._pid != os.getpid():
+      return
+    self._queue.put(self._STOP)
+    self._writer.join()
+    self._writer = None
+    self._queue = None
+
+  def _ensure_writer(self):
+    """
+    Starts writer thread if it's not started in current process yet.
+
+    Returns:
+      A Queue.Queue to put events to.
+    """
+    if self._pid != os.getpid():
+      with self._lock:
+        if self._pid != os.getpid():
+          self._queue = Queue.Queue()
+          self._writer = threading.Thread(target=self._write_events,
+                                          args=(self._queue,))
+          self._writer.daemon = True
+          self._writer.start()
+          self._pid = os.getpid()
+    return self._queue
+
+  def _write_events(self, events_queue):
+    """
+    Writer thread. Writes events to file in batches - everything which
+    was queued since previous write is written with a single write call,
+    so lines of different processes are not interleaved.
+
+    Args:
+      events_queue: A Queue.Queue with events.
+    """
+    fd = os.open(self.file_name, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+    try:
+      stop = False
+      while not stop:
+        batch = [events_queue.get()]
+        while True:
+          try:
+            batch.append(events_queue.get_nowait())
+          except Queue.Empty:
+            break
+        lines = []
+        for record in batch:
+          if record is self._STOP:
+            stop = True
+          else:
+            lines.append(json.dumps(record, sort_keys=True) + "\n")
+        if lines:
+          os.write(fd, "".join(lines))
+        for _ in batch:
+          events_queue.task_done()
+    finally:
+      os.close(fd)
+
+
+def hawkeye_request(method, url, params=None, verbosity=None, verify=False,
                     allow_redirects=False, **kwargs):
   """
   Wrapper of requests.request. It writes logs about request sent and
   response received. It also sets default value of `verify` and `allow_redirects`
-  to False.
+  to False. Request is sent using kept-alive session from session_pool
+  with REQUEST_TIMEOUT unless timeout is specified.
+  Timing of every request is recorded to request_timings
+  (and captured to traffic_capture if it's enabled).
 
   Args:
     method: A string name of http method.
@@ -51,23 +669,38 @@ def hawkeye_request(method, url, params=None, verbosity=3, verify=False,
       2 - log request and response without body
       3 - add limited body
       4 - write full request and response with full body
+      (REQUEST_LOG_VERBOSITY is used by default).
     verify: A boolean, determines if server's certificate should be verified.
     allow_redirects: A boolean, determines if redirects should be
       automatically followed.
-    kwargs: other keyword arguments to be passed to requests.request.
+    kwargs: other keyword arguments to be passed to Session.request.
 
   Returns:
     an instance of requests.Response.
   """
+  if verbosity is None:
+    verbosity = REQUEST_LOG_VERBOSITY
+  # Wedged server shouldn't hang the whole run
+  kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+  started = time.time()
   try:
-    resp = requests.request(
+    resp = session_pool.get_session(url).request(
       method, url, params=params, verify=verify,
       allow_redirects=allow_redirects, **kwargs
     )
+    wall_time = time.time() - started
+    # Failure to read body is failure of request as well
+    response_bytes = len(resp.content)
     # Use real request which was sent by requests lib
     request_headers = resp.request.headers
     request_body = resp.request.body
   except:
+    request_timings.add(RequestTiming(
+      get_current_test(), method, endpoint_template(url), None,
+      wall_time=time.time() - started, ttfb=None,
+      request_bytes=0, response_bytes=0, handler_time=None, rpc_time=None,
+      rpc_calls=None
+    ))
     # Ok. Attempt to recover request which was tried to be sent by requests lib
     request_headers = kwargs.get("headers")
     if "data" in kwargs and verbosity > 2:
@@ -78,54 +711,132 @@ def hawkeye_request(method, url, params=None, verbosity=3, verify=False,
       request_body = "LOGGING STUB: Files are here"
     else:
       request_body = None
+    if traffic_capture.file_name:
+      failed_request = _failed_request(method, url, params, kwargs)
+      if failed_request is not None:
+        _capture_request(started, failed_request, None, None)
     raise
   finally:
     # Anyway log request
     _log_request(method, url, request_headers, request_body, verbosity)
+  # Bookkeeping is done outside of try, so every request
+  # gets exactly one timing record
+  handler_time, rpc_time, rpc_calls = parse_server_timing(resp.headers)
+  request_timings.add(RequestTiming(
+    get_current_test(), method, endpoint_template(url), resp.status_code,
+    wall_time=wall_time, ttfb=resp.elapsed.total_seconds(),
+    request_bytes=_body_length(resp.request.body),
+    response_bytes=response_bytes, handler_time=handler_time,
+    rpc_time=rpc_time, rpc_calls=rpc_calls
+  ))
+  if traffic_capture.file_name:
+    _capture_request(started, resp.request, resp.status_code,
+                     resp.elapsed.total_seconds())
   _log_response(resp.status_code, url, resp.headers, resp.content, verbosity)
   return resp
 
 
+def _capture_request(started, request, status, ttfb):
+  """
+  Puts request which was sent (as prepared by requests lib) and its
+  timing to traffic_capture, so it can be replayed by hawkeye_replay.py.
+
+  Args:
+    started: A timestamp when request was sent.
+    request: A requests.PreparedRequest object.
+    status: An integer - response status (None if request failed).
+    ttfb: A number - seconds until response headers were received
+      (None if request failed).
+  """
+  body_fields = {}
+  body = request.body
+  if isinstance(body, unicode):
+    body = body.encode("utf-8")
+  if isinstance(body, str):
+    try:
+      body_fields["body"] = body.decode("utf-8")
+    except UnicodeDecodeError:
+      body_fields["body_base64"] = base64.b64encode(body)
+  elif body is not None:
+    # Streamed body can't be captured
+    body_fields["body_omitted"] = True
+  traffic_capture.emit(
+    "request", started=started, test=get_current_test(),
+    method=request.method, url=request.url, headers=dict(request.headers),
+    status=status, wall_time=time.time() - started, ttfb=ttfb,
+    **body_fields
+  )
+
+
+def _failed_request(method, url, params, kwargs):
+  """
+  Recovers request which failed to be sent or to get response.
+
+  Args:
+    method: A string name of http method.
+    url: A string URL.
+    params: A dict with query-string params.
+    kwargs: keyword arguments passed to hawkeye_request.
+  Returns:
+    A requests.PreparedRequest object (or None if request is invalid).
+  """
+  request = getattr(sys.exc_info()[1], "request", None)
+  if isinstance(request, requests.PreparedRequest):
+    return request
+  try:
+    return requests.Request(
+      method, url, params=params, headers=kwargs.get("headers"),
+      data=kwargs.get("data"), json=kwargs.get("json")
+    ).prepare()
+  except Exception:
+    return None
+
+
+class _HttpLogMessage(object):
+  """
+  Message of request or response log record. Headers and body are
+  rendered only when record is formatted by log handler (in background
+  thread), so building the message doesn't slow down the test.
+  """
+
+  def __init__(self, first_line, headers, body, verbosity):
+    """
+    Args:
+      first_line: A string (e.g. 'Request: GET http://...').
+      headers: A dict-like object with headers (or None).
+      body: A string - body of request or response (or None).
+      verbosity: An integer (see hawkeye_request).
+    """
+    self.first_line = first_line
+    self.headers = headers
+    self.body = body
+    self.verbosity = verbosity
+
+  def __str__(self):
+    if self.verbosity == 1:
+      return self.first_line
+    # More verbose message will contain headers
+    header_lines = _headers_to_log_string(self.headers)
+    if self.verbosity == 2:
+      return "{first_line}\n{headers}".format(
+        first_line=self.first_line, headers=header_lines)
+    body = _body_to_log_string(self.body, self.verbosity)
+    return "{first_line}\n{headers}\n\n{body}".format(
+      first_line=self.first_line, headers=header_lines, body=body)
+
+
 def _log_request(method, url, headers, body, verbosity):
   if verbosity < 1:
     return
-  if verbosity == 1:
-    return logger.info(
-      "Request: {method} {url}".format(method=method.upper(), url=url)
-    )
-  # More verbose message will contain headers
-  header_lines = _headers_to_log_string(headers)
-  if verbosity == 2:
-    return logger.info(
-      "Request: {method} {url}\n{headers}"
-      .format(method=method.upper(), url=url, headers=header_lines)
-    )
-  body = _body_to_log_string(body, verbosity)
-  logger.info(
-    "Request: {method} {url}\n{headers}\n\n{body}"
-    .format(method=method.upper(), url=url, headers=header_lines, body=body)
-  )
+  first_line = "Request: {method} {url}".format(method=method.upper(), url=url)
+  logger.info(_HttpLogMessage(first_line, headers, body, verbosity))
 
 
 def _log_response(status, url, headers, body, verbosity):
   if verbosity < 1:
     return
-  if verbosity == 1:
-    return logger.info(
-      "Response: {status} {url}".format(status=status, url=url)
-    )
-  # More verbose message will contain headers
-  header_lines = _headers_to_log_string(headers)
-  if verbosity == 2:
-    return logger.info(
-      "Response: {status} {url}\n{headers}"
-      .format(status=status, url=url, headers=header_lines)
-    )
-  body = _body_to_log_string(body, verbosity)
-  logger.info(
-    "Response: {status} {url}\n{headers}\n\n{body}"
-    .format(status=status, url=url, headers=header_lines, body=body)
-  )
+  first_line = "Response: {status} {url}".format(status=status, url=url)
+  logger.info(_HttpLogMessage(first_line, headers, body, verbosity))
 
 
 def _headers_to_log_string(headers):
@@ -147,10 +858,176 @@ def _body_to_log_string(body, verbosity):
   return body
 
 
-def configure_hawkeye_logging(hawkeye_logs_dir, language):
+# Short name of suite which is run by the thread. Threads running tests
+# (and sending requests for them) inherit suite from thread which has
+# started them, so late records of abandoned tests go to the right file.
+_current_suite = threading.local()
+
+
+def set_current_suite(suite_short_name):
+  """
+  Sets suite which log records of the current thread are written to
+  per-suite log file.
+
+  Args:
+    suite_short_name: A string - short name of suite or None.
+  """
+  _current_suite.name = suite_short_name
+
+
+def get_current_suite():
+  """
+  Returns:
+    A string - short name of suite run by the current thread (or None).
+  """
+  return getattr(_current_suite, "name", None)
+
+
+class AsyncLogHandler(logging.Handler):
+  """
+  Log handler which puts records to a queue. Records are formatted and
+  written by background thread to a log file of suite they were emitted
+  in (or to the main log file if no suite is running). Forked worker
+  process starts its own writer thread.
+  """
+
+  # Control messages of writer thread
+  _STOP = "stop"
+  _CLOSE_SUITE = "close-suite"
+
+  def __init__(self, logs_dir, language, compress=False):
+    """
+    Args:
+      logs_dir: A string - path to hawkeye logs directory.
+      language: A string - name of currently testing language.
+      compress: A boolean - whether log files should be gzipped.
+    """
+    super(AsyncLogHandler, self).__init__()
+    self.logs_dir = logs_dir
+    self.language = language
+    self.compress = compress
+    # All log files of a run (including worker processes) share timestamp
+    self.started = datetime.now()
+    self.main_log_name = (
+      "{lang}-detailed {dt:%Y-%m-%d %H-%M-%S}.log"
+      .format(lang=language, dt=self.started)
+    )
+    self._pid = None
+    self._main_pid = os.getpid()
+    self._queue = None
+    self._writer = None
+    self._start_lock = threading.Lock()
+
+  def emit(self, record):
+    record.suite = get_current_suite()
+    self._ensure_writer().put(record)
+
+  def flush(self):
+    """
+    Blocks until all queued records are written.
+    """
+    if self._queue is not None and self._pid == os.getpid():
+      self._queue.join()
+
+  def close_suite(self, suite_short_name):
+    """
+    Closes log file of suite (after all its records are written).
+    Compressed log file is complete only after it's closed.
+
+    Args:
+      suite_short_name: A string - short name of suite.
+    """
+    self._ensure_writer().put((self._CLOSE_SUITE, suite_short_name))
+    self.flush()
+
+  def close(self):
+    if self._writer is not None and self._pid == os.getpid():
+      self._queue.put((self._STOP, None))
+      self._writer.join()
+      self._writer = None
+      self._queue = None
+    super(AsyncLogHandler, self).close()
+
+  def _ensure_writer(self):
+    """
+    Starts writer thread if it's not started in current process yet.
+
+    Returns:
+      A Queue.Queue to put records to.
+    """
+    if self._pid != os.getpid():
+      with self._start_lock:
+        if self._pid != os.getpid():
+          self._queue = Queue.Queue()
+          self._writer = threading.Thread(target=self._write_records,
+                                          args=(self._queue,))
+          self._writer.daemon = True
+          self._writer.start()
+          self._pid = os.getpid()
+    return self._queue
+
+  def _log_path(self, suite_short_name):
+    if suite_short_name:
+      file_name = "{suite}-{lang}-detailed {dt:%Y-%m-%d %H-%M-%S}.log".format(
+        suite=suite_short_name, lang=self.language, dt=self.started)
+    elif os.getpid() == self._main_pid:
+      file_name = self.main_log_name
+    else:
+      # Worker processes must not write to file opened by parent
+      file_name = "{lang}-detailed-{pid}.log".format(
+        lang=self.language, pid=os.getpid())
+    if self.compress:
+      file_name += ".gz"
+    return os.path.join(self.logs_dir, file_name)
+
+  def _open_log(self, suite_short_name):
+    path = self._log_path(suite_short_name)
+    if self.compress:
+      return gzip.open(path, "ab")
+    return open(path, "a")
+
+  def _write_records(self, records_queue):
+    """
+    Writer thread. Formats records and writes them to log files.
+
+    Args:
+      records_queue: A Queue.Queue with records and control messages.
+    """
+    log_files = {}
+    stop = False
+    while not stop:
+      item = records_queue.get()
+      try:
+        if isinstance(item, tuple):
+          command, suite_short_name = item
+          if command == self._STOP:
+            stop = True
+          else:
+            log_file = log_files.pop(suite_short_name, None)
+            if log_file:
+              log_file.close()
+          continue
+        if item.suite not in log_files:
+          log_files[item.suite] = self._open_log(item.suite)
+        log_file = log_files[item.suite]
+        log_file.write(self.format(item) + "\n")
+        if not self.compress:
+          log_file.flush()
+      except Exception:
+        self.handleError(item)
+      finally:
+        records_queue.task_done()
+    for log_file in log_files.itervalues():
+      log_file.close()
+
+
+def configure_hawkeye_logging(hawkeye_logs_dir, language, compress=False):
   """
   This function configures hawkeye logger and loggers of some libraries
-  to write relevant logs to specific log file located in hawkeye_logs_dir.
+  to write relevant logs to log files located in hawkeye_logs_dir.
+  Records are written asynchronously to per-suite log files
+  (<suite>-<lang>-detailed <datetime>.log) and records emitted outside
+  of suites go to <lang>-detailed <datetime>.log.
   Hawkeye logs written by logging framework in contrast to those logs
   which are written manually to report files are aimed to collect debug
   information which can help to understand unexpected failure of testcase.
@@ -158,17 +1035,14 @@ def configure_hawkeye_logging(hawkeye_logs_dir, language):
   Args:
     hawkeye_logs_dir: A string - path to hawkeye logs directory.
     language: A string - name of currently testing language.
+    compress: A boolean - whether log files should be gzipped.
   """
+  global log_handler
   # Configure simple formatter
   formatter = logging.Formatter("%(levelname)s %(name)s %(message)s")
 
-  # Configure file handler
-  file_name = (
-    "{lang}-detailed {dt:%Y-%m-%d %H-%M-%S}.log"
-    .format(lang=language, dt=datetime.now())
-  )
-  file_path = os.path.join(hawkeye_logs_dir, file_name)
-  handler = logging.FileHandler(file_path)
+  # Configure asynchronous handler
+  handler = AsyncLogHandler(hawkeye_logs_dir, language, compress)
   handler.setFormatter(formatter)
   handler.setLevel(logging.DEBUG)
 
@@ -181,6 +1055,43 @@ def configure_hawkeye_logging(hawkeye_logs_dir, language):
   requests_logger.addHandler(handler)
   requests_logger.setLevel(logging.WARN)
   requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+  log_handler = handler
+
+
+def start_suite_logs(suite_short_name):
+  """
+  Directs log records of current thread (and threads of tests it starts)
+  to log file of suite.
+
+  Args:
+    suite_short_name: A string - short name of suite.
+  """
+  set_current_suite(suite_short_name)
+
+
+def finish_suite_logs(suite_short_name):
+  """
+  Writes all queued log records of suite and closes its log file.
+
+  Args:
+    suite_short_name: A string - short name of suite.
+  """
+  set_current_suite(None)
+  if log_handler:
+    log_handler.close_suite(suite_short_name)
+
+
+def close_logs():
+  """
+  Writes all queued log records and closes log files.
+  """
+  if log_handler:
+    log_handler.close()
 
 
 logger = logging.getLogger("hawkeye")
+session_pool = SessionPool()
+request_timings = RequestTimings()
+events = EventsStream()
+traffic_capture = EventsStream()
+log_handler = None
@@ -1,7 +1,6 @@
 from hawkeye_utils import HawkeyeConstants
 from hawkeye_test_runner import HawkeyeTestSuite, DeprecatedHawkeyeTestCase
 import json
-from time import sleep
 import uuid
 
 __author__ = 'hiranya'
@@ -72,7 +71,15 @@ class SimpleKindAwareInsertTest(DeprecatedHawkeyeTestCase):
     ALL_PROJECTS[HawkeyeConstants.PROJECT_HADOOP] = project_id
 
     # Allow some time to eventual consistency to run its course
-    sleep(5)
+    def projects_visible():
+      response = self.http_get('/async_datastore/project')
+      if response.status != 200:
+        return False
+      visible = set(entry['project_id']
+                    for entry in json.loads(response.payload))
+      return visible.issuperset(ALL_PROJECTS.values())
+    self.wait_until(projects_visible, timeout=30,
+                    message='inserted projects are visible')
 
 class KindAwareInsertWithParentTest(DeprecatedHawkeyeTestCase):
   def run_hawkeye_test(self):
@@ -468,7 +475,8 @@ class CountQueryTest(DeprecatedHawkeyeTestCase):
     self.assertEquals(response.status, 200)
 
 def suite(lang, app):
-  suite = HawkeyeTestSuite('Asynchronous Datastore Test Suite', 'async_datastore')
+  suite = HawkeyeTestSuite('Asynchronous Datastore Test Suite',
+                           'async_datastore', serial_group='datastore')
   suite.addTests(DataStoreCleanupTest.all_cases(app))
   suite.addTests(PutAndGetMultipleItemsTest.all_cases(app))
   suite.addTests(SimpleKindAwareInsertTest.all_cases(app))
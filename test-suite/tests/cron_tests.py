@@ -1,37 +1,22 @@
-import datetime
-import time
-
 from hawkeye_test_runner import (HawkeyeTestCase, HawkeyeTestSuite,
-                                 DeprecatedHawkeyeTestCase)
+                                 DeprecatedHawkeyeTestCase, Backoff)
 
 __author__ = 'jovan'
 
+# Cron jobs run once a minute, so there is no point in polling too often
+CRON_BACKOFF = Backoff(initial=1, maximum=5, factor=2, jitter=0.2)
+
 class CronTest(DeprecatedHawkeyeTestCase):
   def run_hawkeye_test(self):
-    time_start = datetime.datetime.now()
-    success = False
-    while True:
-      response = self.http_get('/cron?query=True')
-      if response.status == 200:
-        success = True
-        break
-      time_now = datetime.datetime.now()
-      time_delta = time_now - time_start
-      seconds = time_delta.seconds
-      if(seconds > 120):
-        break
-      time.sleep(5)
-    self.assertEquals(success, True)
+    self.wait_until(lambda: self.http_get('/cron?query=True').status == 200,
+                    timeout=120, message='cron job ran', backoff=CRON_BACKOFF)
 
 
 class CronTargetTest(HawkeyeTestCase):
   def test_cron_target(self):
-    deadline = time.time() + 120
-    while True:
-      self.assertLess(time.time(), deadline)
-      response = self.app.get('/{lang}/cron-target')
-      if response.status_code == 200:
-        break
+    self.wait_until(
+      lambda: self.app.get('/{lang}/cron-target').status_code == 200,
+      timeout=120, message='cron job ran on target', backoff=CRON_BACKOFF)
 
 
 def suite(lang, app):
@@ -1,17 +1,9 @@
 import base64
 import json
-import Queue
-import ssl
-import time
 import urllib
-import urllib2
 import uuid
 import random
 import string
-from threading import Thread
-from time import sleep
-
-from concurrent.futures import ThreadPoolExecutor
 
 from hawkeye_test_runner import (HawkeyeTestCase, HawkeyeTestSuite,
                                  DeprecatedHawkeyeTestCase)
@@ -22,6 +14,12 @@ __author__ = 'hiranya'
 ALL_PROJECTS = {}
 SYNAPSE_MODULES = {}
 
+# RPC budgets of handlers which resolve parent project by a GQL query:
+# the lookup and the main query or put (plus one for an extra result batch).
+# Kindless key queries may look the parent up twice.
+PARENT_LOOKUP_RPCS = {'datastore_v3': 3}
+KINDLESS_QUERY_RPCS = {'datastore_v3': 4}
+
 
 class DataStoreCleanupTest(DeprecatedHawkeyeTestCase):
   def run_hawkeye_test(self):
@@ -66,7 +64,15 @@ class SimpleKindAwareInsertTest(DeprecatedHawkeyeTestCase):
     ALL_PROJECTS[HawkeyeConstants.PROJECT_HADOOP] = project_id
 
     # Allow some time to eventual consistency to run its course
-    sleep(5)
+    def projects_visible():
+      response = self.http_get('/datastore/project')
+      if response.status != 200:
+        return False
+      visible = set(entry['project_id']
+                    for entry in json.loads(response.payload))
+      return visible.issuperset(ALL_PROJECTS.values())
+    self.wait_until(projects_visible, timeout=30,
+                    message='inserted projects are visible')
 
 
 class KindAwareInsertWithParentTest(DeprecatedHawkeyeTestCase):
@@ -74,7 +80,8 @@ class KindAwareInsertWithParentTest(DeprecatedHawkeyeTestCase):
     response = self.http_post('/datastore/module',
       'name={0}&description=A Mediation Core&project_id={1}'.format(
         HawkeyeConstants.MOD_CORE,
-        ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
+        ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]),
+      max_rpcs=PARENT_LOOKUP_RPCS)
     mod_info = json.loads(response.payload)
     self.assertEquals(response.status, 201)
     self.assertTrue(mod_info['success'])
@@ -85,7 +92,8 @@ class KindAwareInsertWithParentTest(DeprecatedHawkeyeTestCase):
     response = self.http_post('/datastore/module',
       'name={0}&description=Z NIO HTTP transport&project_id={1}'.format(
         HawkeyeConstants.MOD_NHTTP,
-        ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
+        ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]),
+      max_rpcs=PARENT_LOOKUP_RPCS)
     mod_info = json.loads(response.payload)
     self.assertEquals(response.status, 201)
     self.assertTrue(mod_info['success'])
@@ -124,7 +132,8 @@ class ZigZagQueryTest(DeprecatedHawkeyeTestCase):
 class AncestorQueryTest(DeprecatedHawkeyeTestCase):
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/datastore/project_modules?' \
-      'project_id={0}'.format(ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
+      'project_id={0}'.format(ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]),
+      max_rpcs=PARENT_LOOKUP_RPCS)
     modules = []
     for entity in entity_list:
       if entity['type'] == 'module':
@@ -139,7 +148,8 @@ class OrderedKindAncestorQueryTest(DeprecatedHawkeyeTestCase):
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/datastore/project_modules?' \
       'project_id={0}&order=module_id'.format(\
-                    ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
+                    ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]),
+      max_rpcs=PARENT_LOOKUP_RPCS)
     modules = []
     for entity in entity_list:
       if entity['type'] == 'module':
@@ -147,7 +157,8 @@ class OrderedKindAncestorQueryTest(DeprecatedHawkeyeTestCase):
 
     entity_list = self.assert_and_get_list('/datastore/project_modules?' \
       'project_id={0}&order=description'.format(\
-                    ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
+                    ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]),
+      max_rpcs=PARENT_LOOKUP_RPCS)
     modules = []
     for entity in entity_list:
       if entity['type'] == 'module':
@@ -155,7 +166,8 @@ class OrderedKindAncestorQueryTest(DeprecatedHawkeyeTestCase):
 
     entity_list = self.assert_and_get_list('/datastore/project_modules?' \
       'project_id={0}&order=name'.format(\
-                    ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
+                    ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]),
+      max_rpcs=PARENT_LOOKUP_RPCS)
     modules = []
     for entity in entity_list:
       if entity['type'] == 'module':
@@ -169,14 +181,16 @@ class KindlessQueryTest(DeprecatedHawkeyeTestCase):
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list(
       '/datastore/project_keys?comparator=gt&project_id={0}'.format(
-        ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
+        ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]),
+      max_rpcs=KINDLESS_QUERY_RPCS)
     self.assertTrue(len(entity_list) == 3 or len(entity_list) == 4)
     for entity in entity_list:
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_SYNAPSE)
 
     entity_list = self.assert_and_get_list(
       '/datastore/project_keys?comparator=ge&project_id={0}'.format(
-        ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
+        ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]),
+      max_rpcs=KINDLESS_QUERY_RPCS)
     self.assertTrue(len(entity_list) == 4 or len(entity_list) == 5)
     project_seen = False
     for entity in entity_list:
@@ -190,7 +204,8 @@ class KindlessAncestorQueryTest(DeprecatedHawkeyeTestCase):
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list(
       '/datastore/project_keys?ancestor=true&comparator=gt&project_id={0}'.
-      format(ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
+      format(ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]),
+      max_rpcs=KINDLESS_QUERY_RPCS)
     self.assertTrue(len(entity_list) == 1 or len(entity_list) == 2)
     for entity in entity_list:
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_SYNAPSE)
@@ -199,7 +214,8 @@ class KindlessAncestorQueryTest(DeprecatedHawkeyeTestCase):
 
     entity_list = self.assert_and_get_list(
       '/datastore/project_keys?ancestor=true&comparator=ge&project_id={0}'.
-      format(ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
+      format(ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]),
+      max_rpcs=KINDLESS_QUERY_RPCS)
     self.assertTrue(len(entity_list) == 2 or len(entity_list) == 3)
     project_seen = False
     for entity in entity_list:
@@ -580,7 +596,6 @@ class QueryLimitTest(DeprecatedHawkeyeTestCase):
 
 class LongTxRead(DeprecatedHawkeyeTestCase):
   ID = 'long-tx-test'
-  RESPONSES = Queue.Queue()
 
   def tearDown(self):
     self.http_delete('/datastore/long_tx_read?id={}'.format(self.ID))
@@ -589,26 +604,10 @@ class LongTxRead(DeprecatedHawkeyeTestCase):
     self.http_post('/datastore/long_tx_read', 'id={}'.format(self.ID))
 
   def run_hawkeye_test(self):
-    def fetch_succeeded(url):
-      try:
-        urllib2.urlopen(url)
-        self.RESPONSES.put(True)
-      except urllib2.HTTPError:
-        self.RESPONSES.put(False)
-
-    url = self.app.build_url(
-      '/python/datastore/long_tx_read?id={}'.format(self.ID), https=False
-    )
-    thread1 = Thread(target=fetch_succeeded, args=(url,))
-    thread2 = Thread(target=fetch_succeeded, args=(url,))
-
-    thread1.start()
-    thread2.start()
-    thread1.join()
-    thread2.join()
-
-    self.assertTrue(self.RESPONSES.get())
-    self.assertTrue(self.RESPONSES.get())
+    path = '/python/datastore/long_tx_read?id={}'.format(self.ID)
+    responses = self.app.map('GET', path, [{}, {}], barrier=True)
+    for response in responses:
+      self.assertEqual(response.status_code, 200)
 
 
 class NonAsciiEntityKeys(DeprecatedHawkeyeTestCase):
@@ -657,34 +656,23 @@ class CursorWithRepeatedProp(DeprecatedHawkeyeTestCase):
 
 class TxInvalidation(DeprecatedHawkeyeTestCase):
   KEY = 'tx-invalidation-test'
-  RESPONSE = None
 
   def tearDown(self):
     self.http_delete('/datastore/tx_invalidation?key={}'.format(self.KEY))
 
   def run_hawkeye_test(self):
-    context = ssl._create_unverified_context()
-
-    def tx_succeeded(url, payload):
-      response = urllib2.urlopen(url, payload, context=context)
-      self.RESPONSE = response.read()
-
-    url = self.app.build_url('/python/datastore/tx_invalidation')
-
-    tx_payload = urllib.urlencode({'key': self.KEY, 'txn': True})
-    thread = Thread(target=tx_succeeded, args=(url, tx_payload))
-    thread.start()
-
-    # The tx_payload request sleeps for 1 second between a get and put inside
-    # a transaction. This smaller sleep aims to run a put (from the
-    # non_tx_payload request) between those two calls.
-    time.sleep(.5)
-
-    non_tx_payload = urllib.urlencode({'key': self.KEY, 'txn': False})
-    urllib2.urlopen(url, non_tx_payload, context=context)
-
-    thread.join()
-    response = json.loads(self.RESPONSE)
+    path = '/python/datastore/tx_invalidation'
+    # The transactional request sleeps for 1 second between a get and put
+    # inside a transaction. The delay of the second request aims to run
+    # a put (from the non-transactional request) between those two calls.
+    tx_response, _ = self.app.gather([
+      {'method': 'POST', 'path': path,
+       'data': {'key': self.KEY, 'txn': True}},
+      {'method': 'POST', 'path': path, 'delay': .5,
+       'data': {'key': self.KEY, 'txn': False}},
+    ], https=True, barrier=True)
+
+    response = tx_response.json()
     # The first transaction should be invalidated by the concurrent put.
     self.assertFalse(response['txnSucceeded'])
 
@@ -709,13 +697,14 @@ class ScatterPropTest(HawkeyeTestCase):
   KIND = 'ScatterEntity'
 
   def tearDown(self):
-    self.app.delete('/python/datastore/scatter_prop?kind={}'.format(self.KIND))
+    self.app.delete('/python/datastore/purge?kind={}'.format(self.KIND))
 
   def setUp(self):
-    for type, key_names in self.KEY_NAMES.items():
-      for name in key_names:
-        self.app.post('/python/datastore/scatter_prop',
-                      data={'kind': self.KIND, 'name': name})
+    names = [name for key_names in self.KEY_NAMES.values()
+             for name in key_names]
+    self.app.post('/python/datastore/seed',
+                  json={'kind': self.KIND, 'names': names,
+                        'properties': {'content': {'text': 5}}})
 
   def test_scatter_prop(self):
     response = self.app.get(
@@ -725,6 +714,7 @@ class ScatterPropTest(HawkeyeTestCase):
 
 
 class SinglePropKeyInequality(HawkeyeTestCase):
+  CONCURRENCY_SAFE = True
   KIND = 'KeyInequality'
   NAMES = ['test1', 'test2', 'test3', 'test4', 'test5']
   PROPERTY = 'content'
@@ -852,6 +842,8 @@ class MergeJoinWithKey(HawkeyeTestCase):
     self.assertEqual(len(entities), 0)
 
 class TestMoreResults(HawkeyeTestCase):
+  CONCURRENCY_SAFE = True
+  CONCURRENCY_KEY = 'BatchResult'
   KEYS = ['a', 'b', 'c', 'd', 'e']
   KIND = 'BatchResult'
 
@@ -899,6 +891,8 @@ class TestMoreResults(HawkeyeTestCase):
 
 
 class TestBatchQueries(HawkeyeTestCase):
+  CONCURRENCY_SAFE = True
+  CONCURRENCY_KEY = 'BatchResult'
   KEYS = ['a', 'b', 'c', 'd', 'e']
   KIND = 'BatchResult'
 
@@ -970,17 +964,17 @@ class QueryInTransaction(HawkeyeTestCase):
     url = '/{lang}/datastore/query_in_transaction'
 
     # Transactions that take place in separate entity groups should succeed.
-    thread_pool = ThreadPoolExecutor(2)
     query_1_info = {'parent': self.PARENT_1, 'kind': self.CHILDREN_1[0][0],
                     'waitTime': self.WAIT_TIME, 'putParent': self.PARENT_1,
                     'putKind': self.CHILDREN_1[0][0]}
     query_2_info = {'parent': self.PARENT_2, 'kind': self.CHILDREN_2[0][0],
                     'waitTime': self.WAIT_TIME, 'putParent': self.PARENT_2,
                     'putKind': self.CHILDREN_2[0][0]}
-    future_1 = thread_pool.submit(self.app.post, url, json=query_1_info)
-    future_2 = thread_pool.submit(self.app.post, url, json=query_2_info)
-    self.assertEqual(future_1.result().status_code, 200)
-    self.assertEqual(future_2.result().status_code, 200)
+    responses = self.app.map('POST', url, [{'json': query_1_info},
+                                           {'json': query_2_info}],
+                             barrier=True)
+    self.assertEqual(responses[0].status_code, 200)
+    self.assertEqual(responses[1].status_code, 200)
 
     # Transactions that query the same group and have a side effect should
     # not both succeed.
@@ -990,15 +984,16 @@ class QueryInTransaction(HawkeyeTestCase):
     query_2_info = {'parent': self.PARENT_1, 'kind': self.CHILDREN_1[0][0],
                     'waitTime': self.WAIT_TIME, 'putParent': self.PARENT_1,
                     'putKind': self.CHILDREN_1[0][0]}
-    future_1 = thread_pool.submit(self.app.post, url, json=query_1_info)
-    future_2 = thread_pool.submit(self.app.post, url, json=query_2_info)
-    status_codes = [future.result().status_code
-                    for future in [future_1, future_2]]
+    responses = self.app.map('POST', url, [{'json': query_1_info},
+                                           {'json': query_2_info}],
+                             barrier=True)
+    status_codes = [response.status_code for response in responses]
     self.assertEqual(len([code for code in status_codes if code == 200]), 1)
 
 
 def suite(lang, app):
-  suite = HawkeyeTestSuite('Datastore Test Suite', 'datastore')
+  suite = HawkeyeTestSuite('Datastore Test Suite', 'datastore',
+                           serial_group='datastore')
   suite.addTests(DataStoreCleanupTest.all_cases(app))
   suite.addTests(SimpleKindAwareInsertTest.all_cases(app))
   suite.addTests(KindAwareInsertWithParentTest.all_cases(app))
@@ -1,6 +1,5 @@
 import json
 from PIL import Image
-from time import sleep
 import StringIO
 
 import hawkeye_test_runner
@@ -26,7 +25,10 @@ class ImageUploadTest(HawkeyeTestCase):
     self.assertTrue(project_info['success'])
     self.assertIsNotNone(project_info['project_id'])
     PROJECTS['appscale'] = project_info['project_id']
-    sleep(5)
+    self.wait_until(
+      lambda: self.app.get('/{lang}/images/logo', params={
+        'project_id': PROJECTS['appscale']}).status_code == 200,
+      timeout=30, message='uploaded logo is visible')
 
 class ImageLoadTest(DeprecatedHawkeyeTestCase):
   def run_hawkeye_test(self):
@@ -1,5 +1,4 @@
 import json
-from time import sleep
 import uuid
 import urllib
 from hawkeye_test_runner import (HawkeyeTestCase, HawkeyeTestSuite,
@@ -66,30 +65,26 @@ class MemcacheSetTest(DeprecatedHawkeyeTestCase):
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
-    response = self.http_post('/memcache',
-      'key={0}&value={1}&update=true'.format(key, value))
-    self.assertEquals(response.status, 200)
-    entry_info = json.loads(response.payload)
-    self.assertTrue(entry_info['success'])
-
-    response = self.http_get('/memcache?key={0}'.format(key))
-    self.assertEquals(response.status, 200)
-    entry_info = json.loads(response.payload)
-    self.assertEquals(entry_info['value'], value)
-
-    response = self.http_post('/memcache',
-      'key={0}&value=foo&update=true'.format(key))
-    self.assertEquals(response.status, 200)
-    entry_info = json.loads(response.payload)
-    self.assertTrue(entry_info['success'])
-
-    response = self.http_get('/memcache?key={0}'.format(key))
-    self.assertEquals(response.status, 200)
-    entry_info = json.loads(response.payload)
-    self.assertEquals(entry_info['value'], 'foo')
+    # Sub-requests are handled in order in a single round trip
+    responses = self.app.batch([
+      {'method': 'POST', 'path': '/{lang}/memcache',
+       'data': {'key': key, 'value': value, 'update': 'true'}},
+      {'path': '/{lang}/memcache', 'params': {'key': key}},
+      {'method': 'POST', 'path': '/{lang}/memcache',
+       'data': {'key': key, 'value': 'foo', 'update': 'true'}},
+      {'path': '/{lang}/memcache', 'params': {'key': key}},
+    ])
+    for response in responses:
+      self.assertEquals(response.status_code, 200)
+    self.assertTrue(responses[0].json()['success'])
+    self.assertEquals(responses[1].json()['value'], value)
+    self.assertTrue(responses[2].json()['success'])
+    self.assertEquals(responses[3].json()['value'], 'foo')
 
 
 class MemcacheKeyExpiryTest(DeprecatedHawkeyeTestCase):
+  CONCURRENCY_SAFE = True
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -104,9 +99,9 @@ class MemcacheKeyExpiryTest(DeprecatedHawkeyeTestCase):
     entry_info = json.loads(response.payload)
     self.assertEquals(entry_info['value'], value)
 
-    sleep(8)
-    response = self.http_get('/memcache?key={0}'.format(key))
-    self.assertEquals(response.status, 404)
+    self.wait_until(
+      lambda: self.http_get('/memcache?key={0}'.format(key)).status == 404,
+      timeout=8, message='memcache key expired')
 
 
 class MemcacheAsyncAddTest(DeprecatedHawkeyeTestCase):
@@ -164,6 +159,8 @@ class MemcacheAsyncSetTest(DeprecatedHawkeyeTestCase):
 
 
 class MemcacheAsyncKeyExpiryTest(DeprecatedHawkeyeTestCase):
+  CONCURRENCY_SAFE = True
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -178,9 +175,9 @@ class MemcacheAsyncKeyExpiryTest(DeprecatedHawkeyeTestCase):
     entry_info = json.loads(response.payload)
     self.assertEquals(entry_info['value'], value)
 
-    sleep(8)
-    response = self.http_get('/memcache?key={0}&async=true'.format(key))
-    self.assertEquals(response.status, 404)
+    self.wait_until(
+      lambda: self.http_get('/memcache?key={0}&async=true'.format(key)).status == 404,
+      timeout=8, message='memcache key expired')
 
 
 class MemcacheDeleteTest(DeprecatedHawkeyeTestCase):
@@ -457,6 +454,8 @@ class SimpleJCacheTest(DeprecatedHawkeyeTestCase):
 
 
 class JCacheExpiryTest(DeprecatedHawkeyeTestCase):
+  CONCURRENCY_SAFE = True
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -471,9 +470,9 @@ class JCacheExpiryTest(DeprecatedHawkeyeTestCase):
     entry_info = json.loads(response.payload)
     self.assertEquals(entry_info[key], value)
 
-    sleep(8)
-    response = self.http_get('/memcache/jcache?key={0}&cache=expiring'.format(key))
-    self.assertEquals(response.status, 404)
+    self.wait_until(
+      lambda: self.http_get('/memcache/jcache?key={0}&cache=expiring'.format(key)).status == 404,
+      timeout=8, message='memcache key expired')
 
 
 class JCacheAddPolicyTest(DeprecatedHawkeyeTestCase):
@@ -1,4 +1,3 @@
-import time
 import uuid
 from collections import OrderedDict
 
@@ -168,17 +167,15 @@ class TestTaskTargets(HawkeyeTestCase):
                            'queue': 'queue-for-module-a'})
 
   def test_task_targets(self):
-    deadline = time.time() + TASK_EXECUTION_WAIT
-    while True:
-      assert time.time() < deadline
+    def entities_created():
       response = self.app.get('/modules/get-entities',
                               params={'id': self.entity_ids.values()})
       if (response.status_code == requests.codes.ok and
           all(response.json()['entities'])):
-        break
-      else:
-        time.sleep(1)
-        continue
+        return response
+      return None
+    response = self.wait_until(entities_created, timeout=TASK_EXECUTION_WAIT,
+                               message='deferred tasks created entities')
 
     entities = zip(self.entity_ids.keys(), response.json()['entities'])
 
@@ -211,7 +208,9 @@ class TestTaskTargets(HawkeyeTestCase):
 
 
 def suite(lang, app):
-  suite = HawkeyeTestSuite('Modules API Test Suite', 'modules')
+  suite = HawkeyeTestSuite('Modules API Test Suite', 'modules',
+                           serial_group='taskqueue',
+                           required_modules=('default', 'module-a'))
   suite.addTests(TestVersionDetails.all_cases(app))
   suite.addTests(TestCreatingAndGettingEntity.all_cases(app))
   suite.addTests(TestTaskTargets.all_cases(app))
@@ -1,7 +1,6 @@
 from hawkeye_utils import HawkeyeConstants
 from hawkeye_test_runner import HawkeyeTestSuite, DeprecatedHawkeyeTestCase
 import json
-from time import sleep
 import uuid
 
 __author__ = 'hiranya'
@@ -51,7 +50,15 @@ class SimpleKindAwareNDBInsertTest(DeprecatedHawkeyeTestCase):
     NDB_ALL_PROJECTS[HawkeyeConstants.PROJECT_HADOOP] = project_id
 
     # Allow some time to eventual consistency to run its course
-    sleep(2)
+    def projects_visible():
+      response = self.http_get('/ndb/project')
+      if response.status != 200:
+        return False
+      visible = set(entry['project_id']
+                    for entry in json.loads(response.payload))
+      return visible.issuperset(NDB_ALL_PROJECTS.values())
+    self.wait_until(projects_visible, timeout=30,
+                    message='inserted projects are visible')
 
 class KindAwareNDBInsertWithParentTest(DeprecatedHawkeyeTestCase):
   def run_hawkeye_test(self):
@@ -1,11 +1,13 @@
-import time
 import itertools
 from collections import Counter
 
 from hawkeye_test_runner import HawkeyeTestCase, HawkeyeTestSuite
 
 # GAE uses eventual consistency for SearchAPI
-CONSISTENCY_WAIT_TIME = 0.5
+CONSISTENCY_WAIT_TIMEOUT = 10
+
+# Max number of documents returned by search query (SearchAPI limit)
+MAX_SEARCH_LIMIT = 1000
 
 field_lookup = ["id", "title", "author", "price"]
 facet_lookup = ["type", "format", "publisher", "rating"]
@@ -189,6 +191,51 @@ class SearchTestCase(HawkeyeTestCase):
     """
     self.app.post("/python/search/clean-up", json=self.document_ids)
 
+  def wait_for_documents(self, index, document_ids):
+    """
+    Accounts for 'eventual consistency' of the SearchAPI by waiting until
+    all specified documents are returned by get-range request.
+
+    Args:
+      index: A string - name of index.
+      document_ids: A list of document IDs which should become visible.
+    """
+    def documents_visible():
+      response = self.app.post(
+        "/python/search/get-range",
+        json={"index": index, "start_id": min(document_ids),
+              "limit": len(document_ids)}
+      )
+      if response.status_code != 200:
+        return False
+      visible = set(doc["id"] for doc in response.json()["documents"])
+      return visible.issuperset(document_ids)
+    self.wait_until(documents_visible, timeout=CONSISTENCY_WAIT_TIMEOUT,
+                    message="search documents are visible")
+
+  def wait_for_search(self, index, document_ids):
+    """
+    Waits until all specified documents are found by search query
+    (empty query matches all documents). Documents returned by get-range
+    request can be not searchable yet, so tests which query index
+    should wait for this instead.
+
+    Args:
+      index: A string - name of index.
+      document_ids: A list of document IDs which should become searchable.
+    """
+    def documents_searchable():
+      response = self.app.post(
+        "/python/search/search",
+        json={"index": index, "query": "", "limit": MAX_SEARCH_LIMIT}
+      )
+      if response.status_code != 200:
+        return False
+      found = set(doc["id"] for doc in response.json()["documents"])
+      return found.issuperset(document_ids)
+    self.wait_until(documents_searchable, timeout=CONSISTENCY_WAIT_TIMEOUT,
+                    message="search documents are searchable")
+
 
 class PutTest(SearchTestCase):
 
@@ -196,17 +243,14 @@ class PutTest(SearchTestCase):
     response = self.app.post("/python/search/put", json=default_documents)
     self.assertEquals(response.status_code, 200)
 
-    # Account for 'eventual consistency' of the SearchAPI
-    # by allowing time for the document to propagate through
-    # the system
-    time.sleep(CONSISTENCY_WAIT_TIME)
+    self.wait_for_documents(**self.document_ids)
 
 
 class GetTest(SearchTestCase):
 
   def setUp(self):
     self.app.post("/python/search/put", json=default_documents)
-    time.sleep(CONSISTENCY_WAIT_TIME)
+    self.wait_for_documents(**self.document_ids)
 
   def test_search_get(self):
     response = self.app.post(
@@ -225,7 +269,7 @@ class GetRangeTest(SearchTestCase):
 
   def setUp(self):
     self.app.post("/python/search/put", json=default_documents)
-    time.sleep(CONSISTENCY_WAIT_TIME)
+    self.wait_for_documents(**self.document_ids)
 
   def test_get_range_three_documents_from_a(self):
     """
@@ -274,7 +318,9 @@ class GetRangeTest(SearchTestCase):
     """
     response = self.app.post(
       "/python/search/get-range",
-      json={"index": "index-1", "start_id": "a", "limit": 100}
+      json={"index": "index-1", "start_id": "a", "limit": 100},
+      # The whole range is expected to be fetched by a single RPC
+      max_rpcs={"search": 1}
     )
     self.assertEquals(response.status_code, 200)
 
@@ -286,7 +332,7 @@ class SearchTest(SearchTestCase):
 
   def setUp(self):
     self.app.post("/python/search/put", json=default_documents)
-    time.sleep(CONSISTENCY_WAIT_TIME)
+    self.wait_for_search(**self.document_ids)
 
   def test_search_simple_query(self):
     """
@@ -294,7 +340,8 @@ class SearchTest(SearchTestCase):
     """
     response = self.app.post(
       "/python/search/search",
-      json={"index": "index-1", "query": "hello"}
+      json={"index": "index-1", "query": "hello"},
+      max_rpcs={"search": 1}
     )
     self.assertEquals(response.status_code, 200)
     response_json = response.json()
@@ -669,7 +716,7 @@ class FacetedSearch(SearchTestCase):
   def setUp(self):
     self.app.post("/python/search/put",
                   json=construct_faceted_dict("books", faceted_docs))
-    time.sleep(CONSISTENCY_WAIT_TIME)
+    self.wait_for_search(**self.faceted_doc_ids)
 
   def tearDown(self):
     """
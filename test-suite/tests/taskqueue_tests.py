@@ -1,6 +1,5 @@
 import datetime
 import json
-import time
 import uuid
 from time import sleep
 
@@ -44,27 +43,22 @@ class PushQueueTest(DeprecatedHawkeyeTestCase):
     obtain the counter value from GAE datastore API. The returned value
     will be asserted against the provided expected value. This method
     is blocking in that it blocks until a valid response is received from
-    the backend service. If a valid response is not received within 10
-    minutes, this method will force the parent test case to fail.
+    the backend service. If a valid response is not received within 60
+    seconds, this method will force the parent test case to fail.
 
     Args:
       key A datastore key string
       expected  Expected integer value
     """
-    start = datetime.datetime.now()
-    end = start + datetime.timedelta(0, 60)
-    while True:
+    def counter_reached():
       response = self.http_get('/taskqueue/counter?key={0}'.format(key))
       self.assertTrue(response.status == 200 or response.status == 404)
       if response.status == 200:
         task_info = json.loads(response.payload)
-        if task_info[key] == expected:
-          break
-
-      if datetime.datetime.now() > end:
-        self.fail('Push queue deadline exceeded with no result')
-      else:
-        sleep(2)
+        return task_info[key] == expected
+      return False
+    self.wait_until(counter_reached, timeout=60,
+                    message='push queue counter reached expected value')
 
 
 class DeferredTaskTest(PushQueueTest):
@@ -198,39 +192,27 @@ class PullQueueTest(DeprecatedHawkeyeTestCase):
 
   def run_lease_and_delete_test(self):
     # Lease and delete.
-    start = datetime.datetime.now()
-    end = start + datetime.timedelta(0, 30)
-    while True:
-      response = self.http_get('/taskqueue/pull?action=lease')
+    def task_leased():
+      # Leasing the only task and deleting it
+      response = self.http_get('/taskqueue/pull?action=lease',
+                               max_rpcs={'taskqueue': 2})
       self.assertEquals(response.status, 200)
       task_info = json.loads(response.payload)
-
-      if len(task_info['tasks']) == 1 and self.key in task_info['tasks']:
-        break
-
-      if datetime.datetime.now() > end:
-        self.fail('Pull queue lease_tasks operation deadline exceeded with no '
-                  'result')
-      else:
-        sleep(2)
+      return len(task_info['tasks']) == 1 and self.key in task_info['tasks']
+    self.wait_until(task_leased, timeout=30,
+                    message='pull queue lease_tasks returned the task')
 
   def run_lease_by_tag_and_delete_test(self):
     # Lease by tag and delete by name.
-    start = datetime.datetime.now()
-    end = start + datetime.timedelta(0, 30)
-    while True:
-      response = self.http_get('/taskqueue/pull?action=lease_by_tag&tag=newest')
+    def task_leased():
+      response = self.http_get('/taskqueue/pull?action=lease_by_tag&tag=newest',
+                               max_rpcs={'taskqueue': 2})
       self.assertEquals(response.status, 200)
       task_info = json.loads(response.payload)
-
-      if len(task_info['tasks']) == 1 and self.key_async in task_info['tasks']:
-        break
-
-      if datetime.datetime.now() > end:
-        self.fail('Pull queue lease_by_tag operation deadline exceeded with no '
-                  'result')
-      else:
-        sleep(2)
+      return (len(task_info['tasks']) == 1 and
+              self.key_async in task_info['tasks'])
+    self.wait_until(task_leased, timeout=30,
+                    message='pull queue lease_by_tag returned the task')
 
 
 class LeaseModificationTest(DeprecatedHawkeyeTestCase):
@@ -422,20 +404,11 @@ class TransactionalTaskTest(DeprecatedHawkeyeTestCase):
     value = json.loads(response.payload)['value']
     self.assertEquals('TXN_UPDATE', value)
 
-    start = datetime.datetime.now()
-    end = start + datetime.timedelta(0, 5)
-    while True:
+    def task_ran():
       response = self.http_get('/taskqueue/trans?key={0}'.format(key))
       self.assertEquals(response.status, 200)
-      value = json.loads(response.payload)['value']
-
-      if value == 'TQ_UPDATE':
-        break
-
-      if datetime.datetime.now() > end:
-        self.fail('Transactional task did not run')
-      else:
-        sleep(1)
+      return json.loads(response.payload)['value'] == 'TQ_UPDATE'
+    self.wait_until(task_ran, timeout=5, message='transactional task ran')
 
 
 class TransactionalFailedTaskTest(DeprecatedHawkeyeTestCase):
@@ -470,14 +443,8 @@ class PushHeadersTest(HawkeyeTestCase):
     task_name = response.text
 
     url = '/{{lang}}/taskqueue/name?taskName={}'.format(task_name)
-    deadline = time.time() + TASK_EXECUTION_WAIT
-    while True:
-      self.assertLess(time.time(), deadline)
-      response = self.app.get(url)
-      if response.text == 'complete':
-        break
-
-      time.sleep(1)
+    self.wait_until(lambda: self.app.get(url).text == 'complete',
+                    timeout=TASK_EXECUTION_WAIT, message='named task completed')
 
     self.app.delete(url)
 
@@ -491,17 +458,14 @@ class TaskExistsTest(HawkeyeTestCase):
     args = {'queueName': self.QUEUE, 'taskId': task_id}
     self.app.post('/{lang}/taskqueue/task', data=args)
 
-    deadline = time.time() + TASK_EXECUTION_WAIT
-    while True:
-      self.assertLess(time.time(), deadline)
-
+    def task_completed():
       response = self.app.post('/{lang}/taskqueue/task', data=args)
       if response.json()['error'] == 'InvalidTaskError':
-        break
-      else:
-        self.assertEqual(response.json()['error'], 'TaskAlreadyExistsError')
-
-      time.sleep(1)
+        return True
+      self.assertEqual(response.json()['error'], 'TaskAlreadyExistsError')
+      return False
+    self.wait_until(task_completed, timeout=TASK_EXECUTION_WAIT,
+                    message='task completed and its name is tombstoned')
 
   def test_adding_enqueued_task(self):
     task_id = uuid.uuid4().hex
@@ -555,20 +519,18 @@ class AdminWorkerTest(HawkeyeTestCase):
   def test_admin_worker(self):
     response = self.app.post('/{lang}/taskqueue/admin_manager')
     self.assertEqual(response.status_code, 200)
-    deadline = time.time() + 10
-    while True:
-      self.assertLess(time.time(), deadline)
+    def worker_ran():
       response = self.app.get('/{lang}/taskqueue/admin_manager')
       if response.status_code == 404:
-        time.sleep(1)
-        continue
-
+        return False
       self.assertEqual(response.status_code, 200)
-      break
+      return True
+    self.wait_until(worker_ran, timeout=10, message='admin worker task ran')
 
 
 def suite(lang, app):
-  suite = HawkeyeTestSuite('Task Queue Test Suite', 'taskqueue')
+  suite = HawkeyeTestSuite('Task Queue Test Suite', 'taskqueue',
+                           serial_group='taskqueue')
   suite.addTests(QueueExistsTest.all_cases(app))
   suite.addTests(PushQueueTest.all_cases(app))
   suite.addTests(DeferredTaskTest.all_cases(app))
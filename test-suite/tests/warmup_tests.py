@@ -11,6 +11,7 @@ class WarmupRequestRanTest(HawkeyeTestCase):
     self.assertTrue(actual['success'])
 
 def suite(lang, app):
-  suite = HawkeyeTestSuite('Warmup inbound_services Test Suite', 'warmup')
+  suite = HawkeyeTestSuite('Warmup inbound_services Test Suite', 'warmup',
+                           required_modules=('warmup',))
   suite.addTests(WarmupRequestRanTest.all_cases(app))
   return suite
@@ -1,5 +1,4 @@
 import json
-import time
 
 from hawkeye_test_runner import HawkeyeTestSuite, DeprecatedHawkeyeTestCase
 
@@ -38,18 +37,14 @@ class SendAndReceiveTest(DeprecatedHawkeyeTestCase):
     self.assertEquals(xmpp_info['state'], 'message sent!')
 
     # Ensure the XMPP message has been received by the application.
-    message_received = False
-    for _ in range(5):
+    def message_received():
       response = self.http_get('/xmpp')
       xmpp_info = json.loads(response.payload)
       self.assertEquals(response.status, 200)
       self.assertTrue(xmpp_info['status'])
-      if xmpp_info['state'] == 'message received!':
-        message_received = True
-        break
-      time.sleep(1)
-
-    self.assertTrue(message_received)
+      return xmpp_info['state'] == 'message received!'
+    self.wait_until(message_received, timeout=5,
+                    message='XMPP message received')
 
     # finally, clean up the mess we made for this test
     response = self.http_delete('/xmpp')